@@ -2,5 +2,6 @@ cd client
 call npm run build
 cd ../
 cd server
+call python staticAssets.py
 call python server.py
 cd ../
@@ -4,5 +4,6 @@ call npm run build
 cd ../
 cd server
 call pip install -r requirements.txt
+call python staticAssets.py
 call python server.py
 cd ../
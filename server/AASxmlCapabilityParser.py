@@ -1,8 +1,9 @@
-import io
-import xml.etree.ElementTree as ET
 import json
 from pathlib import Path
 
+from serverMetrics import timed
+from xmlInput import parse_xml
+
 # Pfade zu den hochgeladenen Dateien
 files = [
     "../AAS/HC10.xml",
@@ -10,9 +11,10 @@ files = [
     "../AAS/HC30.xml"
 ]
 
+@timed("aas_parse")
 def parse_capabilities_robust_from_bytes(file_content_bytes):
-    
-    tree = ET.parse(io.BytesIO(file_content_bytes))
+    """Accepts a path, an open binary file or a bytes-like object such as an mmap."""
+    tree = parse_xml(file_content_bytes)
     root = tree.getroot()
 
     ns = {'aas': 'https://admin-shell.io/aas/3/0'}
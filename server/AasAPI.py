@@ -1,19 +1,31 @@
 from flask import Blueprint, request, make_response, flash
-import xml.etree.ElementTree as ET
-from aas_compliance_tool import compliance_check_aasx
-from aas_compliance_tool import compliance_check_xml as compliance_tool_xml, \
-    compliance_check_json as compliance_tool_json, compliance_check_aasx as compliance_tool_aasx
-from basyx.aas.adapter.json import write_aas_json_file
-from basyx.aas.adapter.xml import write_aas_xml_file
-from basyx.aas.adapter.aasx import AASXReader, DictSupplementaryFileContainer
-from basyx.aas.examples.data import create_example, create_example_aas_binding, TEST_PDF_FILE
-from aas_compliance_tool.state_manager import ComplianceToolStateManager, Status
-from basyx.aas.model import DictObjectStore
+import importlib
 import tempfile
-import os
+
+from admissionControl import admission_class
+from AASxmlCapabilityParser import parse_capabilities_robust_from_bytes
+from jobQueue import BATCH_JOB_PRIORITY, background_job, run_in_job_process
+from serverMetrics import observe_duration, timed
+from streamingUploads import streamed_upload, upload_path
+from xmlInput import mapped_file, parse_xml
+
+# Imported by warm_up; the endpoints import them on first use.
+WARM_UP_MODULES = (
+  "basyx.aas.adapter.aasx",
+  "basyx.aas.adapter.xml",
+  "basyx.aas.model",
+  "aas_compliance_tool.compliance_check_aasx",
+  "aas_compliance_tool.compliance_check_xml",
+  "aas_compliance_tool.state_manager",
+)
+
+def warm_up():
+  """Imports the basyx SDK and the AAS compliance tool ahead of the first AAS request."""
+  for module in WARM_UP_MODULES:
+      importlib.import_module(module)
 
 def get_aasx_id(file_content):
-  root = ET.fromstring(file_content)
+  root = parse_xml(file_content).getroot()
   #the tag name has a namespace "<aas:capability>"
   #therefore we need to take the namespace definiton from the first lines of the xml
   #xmlns:aas='{http://www.admin-shell.io/aas/2/0}'
@@ -23,8 +35,26 @@ def get_aasx_id(file_content):
       aasids.append(aas.find(ns+'identification').text)
   return aasids
 
+def get_aas_ids(file_content):
+  """Identifiers of all shells in an AAS XML file, in AAS v2 and v3 serialisation."""
+  root = parse_xml(file_content).getroot()
+  aasids = []
+  for ns, id_tag in (('{http://www.admin-shell.io/aas/2/0}', 'identification'), ('{https://admin-shell.io/aas/3/0}', 'id')):
+      for aas in root.iter(ns+'assetAdministrationShell'):
+          identifier = aas.find(ns+id_tag)
+          if identifier is not None and identifier.text:
+              aasids.append(identifier.text.strip())
+  return aasids
+
+def describe_aas_file(aas_path):
+  """Catalogue metadata of a stored AAS XML file."""
+  with mapped_file(aas_path) as content:
+      capabilities = parse_capabilities_robust_from_bytes(content) or get_all_aas_capabilities(content)
+      return {"aas_ids": get_aas_ids(content), "capability_count": len(capabilities)}
+
+@timed("aas_parse")
 def get_all_aas_capabilities(file_content):
-  root = ET.fromstring(file_content)
+  root = parse_xml(file_content).getroot()
   capabilities = []
   #the tag name has a namespace "<aas:capability>"
   #therefore we need to take the namespace definiton from the first lines of the xml
@@ -38,9 +68,10 @@ def get_all_aas_capabilities(file_content):
                           })
   return capabilities
 
+@timed("aas_parse")
 def parse_aas_equipment_info(file_content):
     """Extract equipment information from AAS file for PropertyWindow display"""
-    root = ET.fromstring(file_content)
+    root = parse_xml(file_content).getroot()
     ns = '{http://www.admin-shell.io/aas/2/0}'
     
     equipment_info = {
@@ -145,9 +176,18 @@ def get_all_aasx_capabilities(file_contents):
     with tempfile.NamedTemporaryFile(mode='wb+', delete=False) as temp_file:
         temp_file.write(file_contents)
         temp_file_path = temp_file.name
+    return get_aasx_file_capabilities(temp_file_path)
+
+@timed("aasx_read")
+def get_aasx_file_capabilities(aasx_path):
+    """Capabilities of the AASX package stored at aasx_path."""
+    from basyx.aas.adapter.aasx import AASXReader, DictSupplementaryFileContainer
+    from basyx.aas.adapter.xml import write_aas_xml_file
+    from basyx.aas.model import DictObjectStore
+
     objects = DictObjectStore()
     files = DictSupplementaryFileContainer()
-    with AASXReader(temp_file_path) as reader:
+    with AASXReader(str(aasx_path)) as reader:
         meta_data = reader.get_core_properties()
         reader.read_into(objects, files)
         with tempfile.NamedTemporaryFile(mode='wb+', delete=False) as temp_file:
@@ -162,6 +202,8 @@ def get_all_aasx_capabilities(file_contents):
 aas_api = Blueprint('aas_api', __name__)
 
 @aas_api.route('/AASX/capabilities', methods=['POST'])
+@admission_class("parse")
+@streamed_upload()
 def get_aasx_capabilities():
     """Endpoint to get availible Capabilities from a AASX.
     ---
@@ -184,11 +226,13 @@ def get_aasx_capabilities():
       flash('No file part')
       return make_response(request.url, 400)
     file = request.files['file']
-    file_content = file.read()
-    capabilities = get_all_aasx_capabilities(file_content)
+    with upload_path(file) as file_path:
+        capabilities = get_aasx_file_capabilities(file_path)
     return capabilities
   
 @aas_api.route('/AAS/capabilities', methods=['POST'])
+@admission_class("parse")
+@streamed_upload()
 def get_aas_capabilities():
     """Endpoint to get availible Capabilities from a AASX.
     ---
@@ -211,11 +255,27 @@ def get_aas_capabilities():
       flash('No file part')
       return make_response(request.url, 400)
     file = request.files['file']
-    file_content = file.read()
-    capabilities = get_all_aasx_capabilities(file_content)
+    with upload_path(file) as file_path:
+        capabilities = get_aasx_file_capabilities(file_path)
     return capabilities
   
+def check_aas_compliance(kind, file_path):
+    """Runs the compliance tool's schema check of an AASX ("aasx") or AAS XML ("xml") file
+    and returns its error, or None if the file is valid. Module-level so it can run on a process pool."""
+    from aas_compliance_tool import compliance_check_aasx, compliance_check_xml
+    from aas_compliance_tool.state_manager import ComplianceToolStateManager
+    check_schema = compliance_check_aasx.check_schema if kind == "aasx" else compliance_check_xml.check_schema
+    try:
+        check_schema(file_path, ComplianceToolStateManager())
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        return str(e)
+    return None
+
 @aas_api.route('/AASX/validate', methods=['POST'])
+@admission_class("validate")
+@background_job(priority=BATCH_JOB_PRIORITY)
+@streamed_upload()
 def validate_aasx():
     """Endpoint to validate a AASX.
     ---
@@ -237,25 +297,18 @@ def validate_aasx():
       flash('No file part')
       return make_response(request.url, 400)
     file = request.files['file']
-    file_content = file.read()
-    stateManager = ComplianceToolStateManager()
-    
-    with tempfile.NamedTemporaryFile(mode='wb+', delete=False) as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
-    try:
-        compliance_tool_aasx.check_schema(temp_file_path, stateManager) 
-    except Exception as e:
-      # Handle the exception here
-      print(f"An error occurred: {e}")
-      # You can also log the error or take any other appropriate action
-      return make_response(str(e), 400)
-    finally:
-        # Clean up: delete the temporary file
-        os.remove(temp_file_path) 
+    # the compliance tool reads the uploaded file from disk where it was spooled to
+    with upload_path(file) as file_path:
+      with observe_duration("aas_compliance_check"):
+          error = run_in_job_process(check_aas_compliance, "aasx", str(file_path))
+    if error is not None:
+      return make_response(error, 400)
     return make_response("True", 200)
     
 @aas_api.route('/AAS/validate', methods=['POST'])
+@admission_class("validate")
+@background_job(priority=BATCH_JOB_PRIORITY)
+@streamed_upload()
 def validate_aas():
     """Endpoint to validate a AAS.
     ---
@@ -277,21 +330,11 @@ def validate_aas():
       flash('No file part')
       return make_response(request.url, 400)
     file = request.files['file']
-    file_content = file.read()
-    stateManager = ComplianceToolStateManager()
-    
-    with tempfile.NamedTemporaryFile(mode='wb+', delete=False) as temp_file:
-        temp_file.write(file_content)
-        temp_file_path = temp_file.name
-    try:
-        compliance_tool_xml.check_schema(temp_file_path, stateManager) 
-    except Exception as e:
-      # Handle the exception here
-      print(f"An error occurred: {e}")
-      # You can also log the error or take any other appropriate action
-      return make_response(str(e), 400)
-    finally:
-        # Clean up: delete the temporary file
-        os.remove(temp_file_path) 
+    # the compliance tool reads the uploaded file from disk where it was spooled to
+    with upload_path(file) as file_path:
+      with observe_duration("aas_compliance_check"):
+          error = run_in_job_process(check_aas_compliance, "xml", str(file_path))
+    if error is not None:
+      return make_response(error, 400)
     return make_response("True", 200)
  
@@ -3,6 +3,9 @@ from pathlib import Path
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
+from blobStore import BLOB_DIRECTORY, BlobStore
+from streamingUploads import SpooledUpload
+
 
 ALLOWED_EXTENSIONS = {"owl", "aasx", "xml", "mtp", "aml"}
 
@@ -13,12 +16,19 @@ def allowed_file(filename, allowed_extensions=None):
 
 
 def save_uploaded_file(file_storage: FileStorage, target_directory, filename: str | None = None) -> Path:
+    """Stores an upload under its name in the directory's content-addressed blob store."""
     target_dir = Path(target_directory)
     target_dir.mkdir(parents=True, exist_ok=True)
 
     final_name = filename or secure_filename(file_storage.filename)
-    final_path = target_dir / final_name
-    file_storage.save(final_path)
+    store = BlobStore(target_dir)
+    stream = file_storage.stream
+    if isinstance(stream, SpooledUpload) and stream.hexdigest() is not None:
+        # Already on disk and hashed while it was received.
+        digest = stream.hexdigest()
+        final_path, _ = store.add_file(stream.claim(), final_name, digest)
+    else:
+        final_path, _ = store.save(stream, final_name)
     return final_path
 
 
@@ -27,7 +37,7 @@ def resolve_safe_file_path(target_directory, filename: str) -> Path:
     target_dir.mkdir(parents=True, exist_ok=True)
 
     candidate = (target_dir / Path(filename).name).resolve()
-    if candidate.parent != target_dir:
+    if candidate.parent != target_dir or candidate.name == BLOB_DIRECTORY:
         raise FileNotFoundError(filename)
     return candidate
 
@@ -37,4 +47,5 @@ def delete_uploaded_file(target_directory, filename: str) -> Path:
     if not file_path.exists():
         raise FileNotFoundError(filename)
     file_path.unlink()
+    BlobStore(file_path.parent).forget(file_path.name)
     return file_path
@@ -1,6 +1,10 @@
-from io import BytesIO
-from defusedxml.ElementTree import parse
+from types import MappingProxyType
+from defusedxml.ElementTree import fromstring, parse
 import os
+import threading
+
+from serverMetrics import timed
+from xmlInput import parse_xml
 
 ### static variables
 TESTMTP1 = r".\upload\mtp\2025-11-10-Zenon_HC10_MTP_V1.0.0.aml"
@@ -11,7 +15,99 @@ NAMESPACE = "{http://www.dke.de/CAEX}"
 
 
 ### classes
+# Type of every parameter element a data assembly instance can expose. The table is
+# shared by all instances; each instance only stores the elements that are populated.
+PARAM_ELEM_TYPES = MappingProxyType({
+    'WQC': 'BYTE',
+    'OSLevel': 'BYTE',
+    'CommandInfo': 'DWORD',
+    'CommandOp': 'DWORD',
+    'CommandInt': 'DWORD',
+    'CommandExt': 'DWORD',
+    'ProcedureOp': 'DWORD',
+    'ProcedureInt': 'DWORD',
+    'ProcedureExt': 'BYTE',
+    'StateCur': 'DWORD',
+    'CommandEn': 'DWORD',
+    'ProcedureCur': 'DWORD',
+    'ProcedureReq': 'DWORD',
+    'Pos': 'REAL',
+    'PosTextID': 'DWORD',
+    'InteractQuestionID': 'DWORD',
+    'InteractAnswerID': 'DWORD',
+    'InteractAddInfo': 'STRING',
+    'ApplyEn': 'BOOL',
+    'ApplyExt': 'BOOL',
+    'ApplyOp': 'BOOL',
+    'ApplyInt': 'BOOL',
+    'Sync': 'BOOL',
+    'StateChannel': 'BOOL',
+    'StateOffAut': 'BOOL',
+    'StateOpAut': 'BOOL',
+    'StateAutAut': 'BOOL',
+    'StateOffOp': 'BOOL',
+    'StateOpOp': 'BOOL',
+    'StateAutOp': 'BOOL',
+    'StateOpAct': 'BOOL',
+    'StateAutAct': 'BOOL',
+    'StateOffAct': 'BOOL',
+    'SrcChannel': 'BOOL',
+    'SrcExtAut': 'BOOL',
+    'SrcIntAut': 'BOOL',
+    'SrcIntOp': 'BOOL',
+    'SrcExtOp': 'BOOL',
+    'SrcIntAct': 'BOOL',
+    'SrcExtAct': 'BOOL',
+    'ProcParamApplyEn': 'BOOL',
+    'ProcParamApplyExt': 'BOOL',
+    'ProcParamApplyOp': 'BOOL',
+    'ProcParamApplyInt': 'BOOL',
+    'ConfigParamApplyEn': 'BOOL',
+    'ConfigParamApplyExt': 'BOOL',
+    'ConfigParamApplyOp': 'BOOL',
+    'ConfigParamApplyInt': 'BOOL',
+    'ReportValueFreeze': 'BOOL',
+    'Ctrl': 'REAL',
+    'V': 'REAL',
+    'VExt': 'REAL',
+    'VOp': 'REAL',
+    'VInt': 'REAL',
+    'VReq': 'REAL',
+    'VOut': 'REAL',
+    'VFbk': 'REAL',
+    'VSclMin': 'REAL',
+    'VSclMax': 'REAL',
+    'VUnit': 'INT',
+    'VMin': 'REAL',
+    'VMax': 'REAL',
+})
+
+
+# Categories of data assembly instances, see classify_instances.
+CATEGORY_PARAMETER = "parameter"
+CATEGORY_SERVICE_OWNED = "service-owned"
+CATEGORY_SENSOR = "sensor"
+CATEGORY_ACTUATOR = "actuator"
+INSTANCE_CATEGORIES = (CATEGORY_PARAMETER, CATEGORY_SERVICE_OWNED, CATEGORY_SENSOR, CATEGORY_ACTUATOR)
+PEA_INFORMATION_LABELS = frozenset({"PeaInformationLabel", "PeaInforamtionLabel"})
+# The only instance name parse_mtp_aml has ever left out of sensacts, misspelling included.
+SENSACTS_EXCLUDED_LABEL = "PeaInforamtionLabel"
+# How classify_instances tells sensors from actuators, by the param elems an instance
+# links to an interface. The first row with any param elem the instance has decides:
+#   Pos/Ctrl  a position or controller output, i.e. a valve or controlled drive. It
+#             comes first, as actuators report their value (V/VOut) as feedback too.
+#   V/VOut    a value without position or controller output: indicators and process values.
+# Instances that link other param elems only, such as the state elems of binary
+# drives, are actuators; those that link none at all get no category.
+SENSACT_CATEGORY_RULES = (
+    (("Pos", "Ctrl"), CATEGORY_ACTUATOR),
+    (("V", "VOut"), CATEGORY_SENSOR),
+)
+SENSACT_FALLBACK_CATEGORY = CATEGORY_ACTUATOR
+
 class Instance:
+    __slots__ = ("name", "id", "refid", "min", "max", "default", "unit", "category", "_paramValues")
+
     def __init__(self, name, id):
         self.name = name # name of the instance
         self.id = id # ID of the instance
@@ -20,69 +116,18 @@ class Instance:
         self.max = None # maximal value of the instance
         self.default = None # default value of the instance
         self.unit = None # unit of the instance
-        self.paramElem = {'WQC': {'Type': 'BYTE', 'ID': None, 'Default': None},
-                          'OSLevel': {'Type': 'BYTE', 'ID': None, 'Default': None},
-                          'CommandInfo': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'CommandOp': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'CommandInt': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'CommandExt': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'ProcedureOp': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'ProcedureInt': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'ProcedureExt': {'Type': 'BYTE', 'ID': None, 'Default': None},
-                          'StateCur': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'CommandEn': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'ProcedureCur': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'ProcedureReq': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'Pos': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'PosTextID': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'InteractQuestionID': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'InteractAnswerID': {'Type': 'DWORD', 'ID': None, 'Default': None},
-                          'InteractAddInfo': {'Type': 'STRING', 'ID': None, 'Default': None},
-                          'OSLevel': {'Type': 'BYTE', 'ID': None, 'Default': None},
-                          'ApplyEn': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ApplyExt': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ApplyOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ApplyInt': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'Sync': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateChannel': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateOffAut': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateOpAut': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateAutAut': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateOffOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateOpOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateAutOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateOpAct': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateAutAct': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'StateOffAct': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcChannel': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcExtAut': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcIntAut': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcIntOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcExtOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcIntAct': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'SrcExtAct': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ProcParamApplyEn': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ProcParamApplyExt': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ProcParamApplyOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ProcParamApplyInt': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ConfigParamApplyEn': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ConfigParamApplyExt': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ConfigParamApplyOp': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ConfigParamApplyInt': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'ReportValueFreeze': {'Type': 'BOOL', 'ID': None, 'Default': None},
-                          'Ctrl': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'V': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VExt': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VOp': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VInt': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VReq': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VOut': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VFbk': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VSclMin': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VSclMax': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VUnit': {'Type': 'INT', 'ID': None, 'Default': None},
-                          'VMin': {'Type': 'REAL', 'ID': None, 'Default': None},
-                          'VMax': {'Type': 'REAL', 'ID': None, 'Default': None}}
+        self.category = None # one of INSTANCE_CATEGORIES, set by classify_instances
+        self._paramValues = None # populated param elems as name -> (ID, Default), allocated on first use
+
+    @property
+    def paramElem(self) -> dict:
+        """Returns all param elems with their Type, ID and Default, in PARAM_ELEM_TYPES order"""
+        values = self._paramValues or {}
+        paramElem = {}
+        for name, paramType in PARAM_ELEM_TYPES.items():
+            interfaceId, default = values.get(name, (None, None))
+            paramElem[name] = {'Type': paramType, 'ID': interfaceId, 'Default': default}
+        return paramElem
 
     def __str__(self):
         descr = f"NAME: {self.name}, ID={self.id}"
@@ -109,6 +154,33 @@ class Instance:
         """Returns the name of the instance"""
         return self.name
 
+    def setParamElem(self, name:str, interfaceId:str, default) -> None:
+        """Stores the ID and default value of a param elem"""
+        if self._paramValues is None:
+            self._paramValues = {}
+        self._paramValues[name] = (interfaceId, default)
+
+    def getParamId(self, name:str):
+        """Returns the ID of a param elem or None if it is not populated"""
+        if self._paramValues is None or name not in self._paramValues:
+            return None
+        return self._paramValues[name][0]
+
+    def getPopulatedParamElems(self) -> dict:
+        """Returns the param elems with an ID or Default as name -> (ID, Default), in PARAM_ELEM_TYPES order"""
+        if not self._paramValues:
+            return {}
+        return {
+            name: self._paramValues[name]
+            for name in PARAM_ELEM_TYPES
+            if self._paramValues.get(name, (None, None)) != (None, None)
+        }
+
+    def getParamElem(self, name:str) -> dict:
+        """Returns a single param elem as a dict with Type, ID and Default"""
+        interfaceId, default = (self._paramValues or {}).get(name, (None, None))
+        return {'Type': PARAM_ELEM_TYPES[name], 'ID': interfaceId, 'Default': default}
+
 class Procedure:
     def __init__(self, name:str, id:str):
         self.name = name # name of the procedure
@@ -161,6 +233,7 @@ class Pea:
         self.url = "" # address of the opc ua server
         self.ns = "" # namespace of the opc ua server
         self.nsid = None # index of the opc namespace
+        self.processIndex = None # lookup structure for the per-process endpoints, built on first use
 
     def __str__(self):
         descr = f"{self.name}\nInstances:"
@@ -244,6 +317,138 @@ class Pea:
                     return True
         return False
 
+    def getProcessIndex(self) -> "ProcessIndex":
+        """Returns the process index of the mtp, building it on first use."""
+        if self.processIndex is None:
+            self.processIndex = ProcessIndex(self)
+        return self.processIndex
+
+# Keyword heuristics of the per-process equipment endpoints.
+EQUIPMENT_TYPES = ('tank', 'heater', 'agitator', 'pump', 'valve', 'sensor')
+PROCESS_MARKERS = ('dosing', 'heating', 'stirring')
+EQUIPMENT_UNIT_TYPES = ('tank', 'vessel', 'reactor')
+SENSOR_TYPES = ('_t', '_l', '_f', '_p', '_s', '_w', '_d')
+SERVICE_MARKERS = ('dosing', 'heating')
+CONDITION_SENSORS = ('hc10_t', 'hc10_l', 'hc10_f', 'hc10_p', 'hc10_s', 'hc10_w', 'hc10_d')
+
+class ProcessIndex:
+    """Precomputed lookups for the per-process equipment endpoints of one PEA.
+
+    Procedures are resolved by lowercase exact name, then by substring through a
+    trigram index; in both cases the first procedure in service order wins. Instance
+    selections are stored as positions into pea.insts and memoized per procedure.
+    """
+    NGRAM_SIZE = 3
+    MAX_FILTERED_ENTRIES = 128
+
+    def __init__(self, pea:Pea):
+        self.insts = pea.insts
+        self.instNames = [inst.name.lower() for inst in pea.insts]
+        self.entries = [] # (service, procedure) in service order
+        self.exact = {} # lowercase procedure name -> first entry position
+        self.ngrams = {} # trigram of a lowercase procedure name -> entry positions
+        for service in pea.servs:
+            for procedure in service.procs:
+                position = len(self.entries)
+                name = procedure.name.lower()
+                self.entries.append((service, procedure))
+                self.exact.setdefault(name, position)
+                for ngram in self.iterNgrams(name):
+                    self.ngrams.setdefault(ngram, set()).add(position)
+
+        # instances picked by the equipment-type heuristic, with the process markers in their name
+        self.equipmentMarkers = {}
+        for position, name in enumerate(self.instNames):
+            if any(equipment_type in name for equipment_type in EQUIPMENT_TYPES):
+                self.equipmentMarkers[position] = frozenset(marker for marker in PROCESS_MARKERS if marker in name)
+
+        self.parameters = {} # entry position -> positions of the procedure's parameter instances
+        self.masterRecipe = {} # entry position -> (parameter, equipment, condition sensor) positions
+        self.filtered = {} # (entry position, process keywords) -> relevant instance positions
+        self.filteredLock = threading.Lock()
+
+    @classmethod
+    def iterNgrams(cls, name:str):
+        return {name[i:i + cls.NGRAM_SIZE] for i in range(len(name) - cls.NGRAM_SIZE + 1)}
+
+    def find(self, processName:str):
+        """Returns the entry position of the procedure matching a process name, or None."""
+        name = processName.lower()
+        position = self.exact.get(name)
+        if position is None:
+            if len(name) >= self.NGRAM_SIZE:
+                candidates = None
+                for ngram in self.iterNgrams(name):
+                    matches = self.ngrams.get(ngram)
+                    if not matches:
+                        candidates = ()
+                        break
+                    candidates = matches if candidates is None else candidates & matches
+                candidates = sorted(candidates)
+            else:
+                candidates = range(len(self.entries))
+            position = next((c for c in candidates if name in self.entries[c][1].name.lower()), None)
+        return position
+
+    def getEntry(self, position):
+        """Returns (service, procedure) at an entry position, or (None, None) for no match."""
+        if position is None:
+            return None, None
+        return self.entries[position]
+
+    def getParameterPositions(self, position:int) -> frozenset:
+        """Positions of the instances that are parameters of the procedure, matched by id or name."""
+        parameters = self.parameters.get(position)
+        if parameters is None:
+            procedure = self.entries[position][1]
+            paramIds = {param.id for param in procedure.params}
+            paramNames = {param.name for param in procedure.params}
+            parameters = frozenset(
+                i for i, inst in enumerate(self.insts) if inst.id in paramIds or inst.name in paramNames
+            )
+            self.parameters[position] = parameters
+        return parameters
+
+    def getRelevantPositions(self, position:int, processKeywords:tuple) -> list:
+        """Positions of the instances get_filtered_equipment_info reports for a procedure."""
+        key = (position, processKeywords)
+        relevant = self.filtered.get(key)
+        if relevant is None:
+            parameters = self.getParameterPositions(position)
+            keywords = frozenset(processKeywords)
+            relevant = [
+                i for i, name in enumerate(self.instNames)
+                if i in parameters
+                or any(keyword in name for keyword in processKeywords)
+                or (i in self.equipmentMarkers and self.equipmentMarkers[i] <= keywords)
+            ]
+            with self.filteredLock:
+                if len(self.filtered) >= self.MAX_FILTERED_ENTRIES:
+                    self.filtered.pop(next(iter(self.filtered)))
+                self.filtered[key] = relevant
+        return relevant
+
+    def getMasterRecipePositions(self, position:int) -> tuple:
+        """(parameter, equipment, condition sensor) instance positions for a procedure."""
+        selection = self.masterRecipe.get(position)
+        if selection is None:
+            parameters = self.getParameterPositions(position)
+            serviceName = self.entries[position][0].name.lower()
+            recipeParameters, equipment, sensors = [], [], []
+            for i, name in enumerate(self.instNames):
+                if i in parameters:
+                    recipeParameters.append(i)
+                elif any(unit_type in name for unit_type in EQUIPMENT_UNIT_TYPES):
+                    if not name.startswith('procval_') and 'param_' not in name:
+                        equipment.append(i)
+                elif any(sensor_type in name for sensor_type in SENSOR_TYPES):
+                    if not any(marker in name for marker in SERVICE_MARKERS if marker not in serviceName):
+                        if any(sensor in name for sensor in CONDITION_SENSORS):
+                            sensors.append(i)
+            selection = (recipeParameters, equipment, sensors)
+            self.masterRecipe[position] = selection
+        return selection
+
 ### functions
 def getUnit(unitNr: int) -> str:
     """Returns the unit corresponding to the identifier"""
@@ -1486,8 +1691,8 @@ def getUnit(unitNr: int) -> str:
             return "spezial"
         
 
-def instance_to_dict(inst: Instance):
-    return {
+def instance_to_dict(inst: Instance, include_category: bool = False):
+    result = {
         "name": inst.name,
         "id": inst.id,
         "default": inst.default,
@@ -1497,27 +1702,44 @@ def instance_to_dict(inst: Instance):
         "max": inst.max,
         "refid": inst.refid,
     }
+    if include_category:
+        result["category"] = inst.category
+    return result
 
-def procedure_to_dict(proc: Procedure):
+def procedure_to_dict(proc: Procedure, include_categories: bool = False):
     return {
         "name": proc.name,
         "id": proc.id,
-        "params": [instance_to_dict(p) for p in proc.params],
+        "params": [instance_to_dict(p, include_categories) for p in proc.params],
         "selfCompleting": proc.compl,
         "procId": proc.procId,
         "serviceId": proc.serviceId,
     }
 
-def service_to_dict(serv: Service):
+def service_to_dict(serv: Service, include_categories: bool = False):
     return {
         "name": serv.name,
         "id": serv.id,
         "refid": serv.refid,
         "paramElem": serv.paramElem,
-        "procs": [procedure_to_dict(p) for p in serv.procs],
+        "procs": [procedure_to_dict(p, include_categories) for p in serv.procs],
+    }
+
+def sensact_to_dict(sa: Instance, include_category: bool = False):
+    result = {
+        "name": sa.name,
+        "paramElem": sa.paramElem,
+        "V_ID": sa.getParamId("V"),
+        "VOut_ID": sa.getParamId("VOut"),
+        "Pos_ID": sa.getParamId("Pos"),
+        "Ctrl_ID": sa.getParamId("Ctrl"),
     }
+    if include_category:
+        result["category"] = sa.category
+    return result
 
-def pea_to_dict(pea: Pea):
+def pea_to_dict(pea: Pea, include_categories: bool = False):
+    """Serialises a PEA; include_categories adds each instance's category tag."""
     return {
         "name": pea.name,
         "url": pea.url,
@@ -1526,51 +1748,109 @@ def pea_to_dict(pea: Pea):
             "mtp_name": pea.name,
             "opc_ua_url": pea.url,
             "namespace": pea.ns,
-            "instances": [instance_to_dict(inst) for inst in pea.insts],
-            "services": [service_to_dict(serv) for serv in pea.servs],
-            "procedures": [procedure_to_dict(proc) for proc in pea.procs]
+            "instances": [instance_to_dict(inst, include_categories) for inst in pea.insts],
+            "services": [service_to_dict(serv, include_categories) for serv in pea.servs],
+            "procedures": [procedure_to_dict(proc, include_categories) for proc in pea.procs]
         },
-        "sensacts": [
-            {
-                "name": sa.name,
-                "paramElem": sa.paramElem,
-                "V_ID": sa.paramElem["V"]["ID"],
-                "VOut_ID": sa.paramElem["VOut"]["ID"],
-                "Pos_ID": sa.paramElem["Pos"]["ID"],
-                "Ctrl_ID": sa.paramElem["Ctrl"]["ID"],
-            }
-            for sa in pea.sensacts
-        ],
-        "procs": [procedure_to_dict(p) for p in pea.procs],
-        "servs": [service_to_dict(s) for s in pea.servs],
+        "sensacts": [sensact_to_dict(sa, include_categories) for sa in pea.sensacts],
+        "procs": [procedure_to_dict(p, include_categories) for p in pea.procs],
+        "servs": [service_to_dict(s, include_categories) for s in pea.servs],
     }
 
+def normalized_keys(objs: list, prefix: str) -> dict:
+    """Maps each object to its id, or to prefix:position if the id is missing or not unique."""
+    seen = {}
+    for obj in objs:
+        seen[obj.id] = seen.get(obj.id, 0) + 1
+    return {
+        id(obj): obj.id if obj.id is not None and seen[obj.id] == 1 else f"{prefix}:{position}"
+        for position, obj in enumerate(objs)
+    }
+
+def sparse_param_elem(paramElem: dict) -> dict:
+    """Drops the Type and every param elem without an ID or Default; Types are in paramElemTypes."""
+    return {
+        name: {"ID": elem["ID"], "Default": elem["Default"]}
+        for name, elem in paramElem.items()
+        if elem["ID"] is not None or elem["Default"] is not None
+    }
+
+def pea_to_normalized_dict(pea: Pea, include_categories: bool = False):
+    """Serialises a PEA with every instance, procedure and service once, keyed by id.
+
+    Objects refer to each other by these keys, and the *Ids lists keep the PEA order.
+    Param elems only list populated entries; their Types are shared in paramElemTypes.
+    """
+    inst_keys = normalized_keys(pea.insts, "instance")
+    proc_keys = normalized_keys(pea.procs, "procedure")
+    serv_keys = normalized_keys(pea.servs, "service")
+
+    instances = {}
+    for inst in pea.insts:
+        inst_dict = {
+            "name": inst.name,
+            "id": inst.id,
+            "default": inst.default,
+            "unit": inst.unit,
+            "paramElem": {
+                name: {"ID": interfaceId, "Default": default}
+                for name, (interfaceId, default) in inst.getPopulatedParamElems().items()
+            },
+            "min": inst.min,
+            "max": inst.max,
+            "refid": inst.refid,
+        }
+        if include_categories:
+            inst_dict["category"] = inst.category
+        instances[inst_keys[id(inst)]] = inst_dict
+
+    procedures = {
+        proc_keys[id(proc)]: {
+            "name": proc.name,
+            "id": proc.id,
+            "params": [inst_keys.get(id(p)) for p in proc.params],
+            "selfCompleting": proc.compl,
+            "procId": proc.procId,
+            "serviceId": proc.serviceId,
+        }
+        for proc in pea.procs
+    }
+    services = {
+        serv_keys[id(serv)]: {
+            "name": serv.name,
+            "id": serv.id,
+            "refid": serv.refid,
+            "paramElem": sparse_param_elem(serv.paramElem),
+            "procs": [proc_keys.get(id(p)) for p in serv.procs],
+        }
+        for serv in pea.servs
+    }
+
+    return {
+        "format": "normalized",
+        "name": pea.name,
+        "url": pea.url,
+        "ns": pea.ns,
+        "paramElemTypes": dict(PARAM_ELEM_TYPES),
+        "instances": instances,
+        "procedures": procedures,
+        "services": services,
+        "instanceIds": [inst_keys[id(inst)] for inst in pea.insts],
+        "procedureIds": [proc_keys[id(proc)] for proc in pea.procs],
+        "serviceIds": [serv_keys[id(serv)] for serv in pea.servs],
+        "sensacts": [inst_keys[id(sa)] for sa in pea.sensacts],
+    }
+
+def parse_mtp_file_to_dict(mtp_path, include_categories: bool = False) -> dict:
+    """pea_to_dict of an MTP file; module-level so it can run on a process pool."""
+    return pea_to_dict(parse_mtp_aml(mtp_path), include_categories=include_categories)
+
 def get_filtered_equipment_info(pea: Pea, process_name: str):
     """Get equipment information filtered by a specific process name"""
-    # Find the specific procedure
-    target_procedure = None
-    target_service = None
-    
-    # Look for the procedure in all services
-    for service in pea.servs:
-        for procedure in service.procs:
-            if procedure.name.lower() == process_name.lower():
-                target_procedure = procedure
-                target_service = service
-                break
-        if target_procedure:
-            break
-    
-    if not target_procedure:
-        # If no exact match, try partial matching
-        for service in pea.servs:
-            for procedure in service.procs:
-                if process_name.lower() in procedure.name.lower():
-                    target_procedure = procedure
-                    target_service = service
-                    break
-            if target_procedure:
-                break
+    # Find the specific procedure: exact name first, then partial matching
+    index = pea.getProcessIndex()
+    position = index.find(process_name)
+    target_service, target_procedure = index.getEntry(position)
     
     # Filter instances based on the process
     relevant_instances = []
@@ -1580,35 +1860,12 @@ def get_filtered_equipment_info(pea: Pea, process_name: str):
         # Add the target service
         relevant_services.append(service_to_dict(target_service))
         
-        # Add instances that are related to this process
-        # This is a heuristic - we'll include instances that have similar names
-        process_keywords = process_name.lower().split()
-        
-        for instance in pea.insts:
-            instance_name = instance.name.lower()
-            
-            # Check if instance name contains process keywords
-            is_relevant = False
-            for keyword in process_keywords:
-                if keyword in instance_name:
-                    is_relevant = True
-                    break
-            
-            # Also check if it's a parameter for this process
-            if target_procedure.params:
-                for param in target_procedure.params:
-                    if param.id == instance.id or param.name == instance.name:
-                        is_relevant = True
-                        break
-            
-            # Include common equipment types that are likely relevant
-            if any(equipment_type in instance_name for equipment_type in ['tank', 'heater', 'agitator', 'pump', 'valve', 'sensor']):
-                # Only include if it's not clearly from a different process
-                if not any(other_process in instance_name for other_process in ['dosing', 'heating', 'stirring'] if other_process not in process_keywords):
-                    is_relevant = True
-            
-            if is_relevant:
-                relevant_instances.append(instance_to_dict(instance))
+        # Instances whose name contains a process keyword, parameters of this process and
+        # common equipment types that are not clearly from a different process
+        process_keywords = tuple(process_name.lower().split())
+        relevant_instances = [
+            instance_to_dict(pea.insts[i]) for i in index.getRelevantPositions(position, process_keywords)
+        ]
     
     return {
         "mtp_name": pea.name,
@@ -1620,41 +1877,38 @@ def get_filtered_equipment_info(pea: Pea, process_name: str):
         "target_service": target_service.name if target_service else None
     }
 
-def parse_mtp_aml(file_content) -> Pea:
-    if isinstance(file_content, bytes):
-        file_obj = BytesIO(file_content)
-    else:
-        file_obj = file_content
+def build_external_interface_index(root) -> dict:
+    """Maps the ID of every ExternalInterface to the value of its Identifier attribute.
 
-    tree = parse(file_obj)
+    Like the former per-reference `root.find`, the first interface with a given ID wins,
+    and interfaces without an Identifier resolve to None.
+    """
+    index = {}
+    for interface_elem in root.iter(f"{NAMESPACE}ExternalInterface"):
+        interface_id = interface_elem.get("ID")
+        if interface_id is None or interface_id in index:
+            continue
+        index[interface_id] = interface_elem.findtext(f"{NAMESPACE}Attribute[@Name='Identifier']/{NAMESPACE}Value")
+    return index
+
+@timed("mtp_parse")
+def parse_mtp_aml(file_content) -> Pea:
+    """Parses an MTP from a path, its XML text, an open binary file or a bytes-like object such as an mmap."""
+    tree = parse_xml(file_content, parse, fromstring)
     root = tree.getroot()
 
     mtp = Pea()
 
-    # Cache external interface lookups to avoid repeated XML searches
-    external_interface_cache = {}
-    
-    def get_external_interface_id(interface_ref):
-        if interface_ref in external_interface_cache:
-            return external_interface_cache[interface_ref]
-        
-        # Find the external interface and cache the result
-        interface_elem = root.find(f".//{NAMESPACE}ExternalInterface[@ID='{interface_ref}']")
-        if interface_elem is not None:
-            identifier_elem = interface_elem.find(f"{NAMESPACE}Attribute[@Name='Identifier']/{NAMESPACE}Value")
-            if identifier_elem is not None:
-                external_interface_cache[interface_ref] = identifier_elem.text
-                return identifier_elem.text
-        return None
+    # Resolve every ExternalInterface reference against a map built in a single pass
+    external_interface_index = build_external_interface_index(root)
 
     # Optimized attribute processing function
     def process_instance_attribute(inst, attr_name, attr_node):
         elem_node = attr_node.findtext(f"{NAMESPACE}Value")
         if elem_node:
-            interface_id = get_external_interface_id(elem_node)
-            if interface_id and attr_name in inst.paramElem:
-                inst.paramElem[attr_name]['ID'] = interface_id
-                inst.paramElem[attr_name]['Default'] = attr_node.findtext(f"{NAMESPACE}DefaultValue")
+            interface_id = external_interface_index.get(elem_node)
+            if interface_id and attr_name in PARAM_ELEM_TYPES:
+                inst.setParamElem(attr_name, interface_id, attr_node.findtext(f"{NAMESPACE}DefaultValue"))
 
     # parse mtp
     for child in root:
@@ -1677,7 +1931,7 @@ def parse_mtp_aml(file_content) -> Pea:
                                     attr_name = attrNode.get("Name")
                                     if attr_name == "RefID":
                                         inst.addRefId(attrNode.findtext(f"{NAMESPACE}Value"))
-                                    elif attr_name in inst.paramElem:
+                                    elif attr_name in PARAM_ELEM_TYPES:
                                         process_instance_attribute(inst, attr_name, attrNode)
                                 
                                 # Extract min/max values from related attributes
@@ -1773,7 +2027,7 @@ def parse_mtp_aml(file_content) -> Pea:
                     serv.id = gchild.get("ID") # id of the service
                     serv.refid = gchild.findtext(f"./{NAMESPACE}Attribute[@Name='RefID']/{NAMESPACE}Value")
                     for key in keys:
-                        serv.paramElem[key] = inst.paramElem[key]
+                        serv.paramElem[key] = inst.getParamElem(key)
                     mtp.addService(serv)
 
                     # get procedures
@@ -1802,11 +2056,47 @@ def parse_mtp_aml(file_content) -> Pea:
 
 
     # get sensors and actuators
+    classify_instances(mtp)
+    return mtp
+
+def classify_instances(mtp: Pea) -> None:
+    """Sets the category of every instance and collects the sensors and actuators in one pass.
+
+    Procedure parameters come first, then instances owned by a service or procedure
+    (matched by ID or RefID, like getInstance). PEA information labels get no category,
+    and the remaining instances are categorised by sensact_category.
+
+    sensacts keep their former membership, which is not derived from the categories:
+    every instance except procedure parameters, procedures and services matched by ID
+    alone, and the label named SENSACTS_EXCLUDED_LABEL.
+    """
+    parameterIds = {param.id for proc in mtp.procs for param in proc.params}
+    ownerIds = {proc.id for proc in mtp.procs}
+    ownerIds.update(s.id for s in mtp.servs)
+    ownerIds.update(s.refid for s in mtp.servs)
+    ownerIds.discard(None)
+
+    mtp.sensacts = []
     for i in mtp.insts:
-        if not (mtp.hasParameter(i.id) or mtp.hasProcedure(i.id) or mtp.hasService(i.id) or i.name == "PeaInforamtionLabel"):
+        if i.id in parameterIds:
+            i.category = CATEGORY_PARAMETER
+        elif i.id in ownerIds or i.refid in ownerIds:
+            i.category = CATEGORY_SERVICE_OWNED
+        elif i.name in PEA_INFORMATION_LABELS:
+            i.category = None
+        else:
+            i.category = sensact_category(i)
+        if not (i.id in parameterIds or i.id in ownerIds or i.name == SENSACTS_EXCLUDED_LABEL):
             mtp.sensacts.append(i)
 
-        return mtp
+def sensact_category(inst: Instance) -> str | None:
+    """Sensor or actuator, by the first row of SENSACT_CATEGORY_RULES that matches inst."""
+    if not inst.getPopulatedParamElems():
+        return None
+    for paramElems, category in SENSACT_CATEGORY_RULES:
+        if any(inst.getParamId(name) is not None for name in paramElems):
+            return category
+    return SENSACT_FALLBACK_CATEGORY
 
 
 # mtp = parse_mtp_aml(TESTMTP1)
@@ -1837,30 +2127,10 @@ def parse_mtp_aml(file_content) -> Pea:
 
 def get_master_recipe_equipment_info(pea: Pea, process_name: str):
     """Get equipment information specifically formatted for master recipe creation"""
-    # Find the specific procedure
-    target_procedure = None
-    target_service = None
-    
-    # Look for the procedure in all services
-    for service in pea.servs:
-        for procedure in service.procs:
-            if procedure.name.lower() == process_name.lower():
-                target_procedure = procedure
-                target_service = service
-                break
-        if target_procedure:
-            break
-    
-    if not target_procedure:
-        # If no exact match, try partial matching
-        for service in pea.servs:
-            for procedure in service.procs:
-                if process_name.lower() in procedure.name.lower():
-                    target_procedure = procedure
-                    target_service = service
-                    break
-            if target_procedure:
-                break
+    # Find the specific procedure: exact name first, then partial matching
+    index = pea.getProcessIndex()
+    position = index.find(process_name)
+    target_service, target_procedure = index.getEntry(position)
     
     # Function to extract sensor keyword from name
     def extract_sensor_keyword(sensor_name):
@@ -1896,38 +2166,16 @@ def get_master_recipe_equipment_info(pea: Pea, process_name: str):
     condition_sensors = []
     
     if target_procedure and target_service:
-        for instance in pea.insts:
-            instance_name = instance.name.lower()
-            
-            # 1. RECIPE PARAMETERS: Only actual parameters of this procedure
-            is_parameter = False
-            if target_procedure.params:
-                for param in target_procedure.params:
-                    if param.id == instance.id or param.name == instance.name:
-                        is_parameter = True
-                        break
-            
-            if is_parameter:
-                recipe_parameters.append(instance_to_dict(instance))
-            
-            # 2. EQUIPMENT REQUIREMENTS: Only main equipment unit (tank, vessel)
-            elif any(unit_type in instance_name for unit_type in ['tank', 'vessel', 'reactor']):
-                # Only include the main equipment, not process values
-                if not instance_name.startswith('procval_') and not 'param_' in instance_name:
-                    equipment_requirements.append(instance_to_dict(instance))
-            
-            # 3. CONDITION SENSORS: Only sensors that could be used in transition conditions
-            elif any(sensor_type in instance_name for sensor_type in ['_t', '_l', '_f', '_p', '_s', '_w', '_d']):
-                # Only include if it's a general sensor (temperature, level, flow)
-                # and not from a different service
-                service_name = target_service.name.lower()
-                if not any(other_service in instance_name for other_service in ['dosing', 'heating'] if other_service not in service_name):
-                    # Only include if it's a basic sensor that could be used in conditions
-                    if any(sensor in instance_name for sensor in ['hc10_t', 'hc10_l', 'hc10_f', 'hc10_p', 'hc10_s', 'hc10_w', 'hc10_d']):
-                        sensor_dict = instance_to_dict(instance)
-                        # Add sensor keyword information
-                        sensor_dict['sensor_keyword'] = extract_sensor_keyword(instance.name)
-                        condition_sensors.append(sensor_dict)
+        # 1. recipe parameters of this procedure, 2. main equipment units (tank, vessel),
+        # 3. basic sensors that could be used in transition conditions
+        parameter_positions, equipment_positions, sensor_positions = index.getMasterRecipePositions(position)
+        recipe_parameters = [instance_to_dict(pea.insts[i]) for i in parameter_positions]
+        equipment_requirements = [instance_to_dict(pea.insts[i]) for i in equipment_positions]
+        for i in sensor_positions:
+            sensor_dict = instance_to_dict(pea.insts[i])
+            # Add sensor keyword information
+            sensor_dict['sensor_keyword'] = extract_sensor_keyword(pea.insts[i].name)
+            condition_sensors.append(sensor_dict)
     
     return {
         "service_info": {
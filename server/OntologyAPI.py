@@ -13,6 +13,9 @@ from ontologyService import (
     resolve_ontology_path,
     upload_ontology,
 )
+from admissionControl import admission_class
+from jobQueue import BATCH_JOB_PRIORITY, background_job
+from uploadCatalogue import listing_response, parse_listing_args
 
 
 mimetypes.add_type("application/javascript", ".js")
@@ -27,6 +30,8 @@ def build_error_response(exc: OntologyServiceError):
 
 
 @ontology_api.route("/onto/<category>", methods=["POST"])
+@admission_class("convert")
+@background_job(priority=BATCH_JOB_PRIORITY)
 def upload_onto(category):
     try:
         result = upload_ontology(
@@ -49,10 +54,14 @@ def upload_onto(category):
 @ontology_api.route("/onto/<category>", methods=["GET"])
 def get_onto(category):
     try:
-        ontologies = list_ontologies(current_app.config, category, current_app.logger)
+        query = parse_listing_args(request.args, default_equals={"status": "ok"})
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    try:
+        entries, total = list_ontologies(current_app.config, category, current_app.logger, query)
     except OntologyServiceError as exc:
         return build_error_response(exc)
-    return jsonify(ontologies)
+    return listing_response(entries, total, query)
 
 
 @ontology_api.route("/onto/<category>/<filename>/classes", methods=["GET"])
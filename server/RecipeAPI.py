@@ -1,8 +1,9 @@
 from flask import Blueprint, request, make_response, flash, jsonify
 import xml.etree.ElementTree as ET
-from lxml import etree
-from django.utils.encoding import iri_to_uri, uri_to_iri
 import json
+import hashlib
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from xml.sax.saxutils import escape
 try:
@@ -13,8 +14,87 @@ except ImportError:
         return "<xml>dicttoxml not available</xml>"
 from typing import Tuple
 
+from admissionControl import admission_class
+from jobQueue import background_job
+from serverMetrics import timed
+
 recipe_api = Blueprint('recipe_api', __name__)
 
+VALIDATION_CACHE_MAX_ENTRIES = 256
+# Django's uri_to_iri, see get_uri_to_iri.
+_uri_to_iri = None
+# Schemas compiled by warm_up, relative to this file.
+RECIPE_SCHEMAS = (
+    "batchml_schemas/schemas/BatchML-GeneralRecipe.xsd",
+    "batchml_schemas/schemas/B2MML-Material.xsd",
+    "batchml_schemas/schemas/BatchML-BatchInformation.xsd",
+)
+
+
+class ValidationResultCache:
+    """Bounded LRU cache of XSD validation verdicts.
+
+    Entries are keyed by (kind, SHA-256, schema id, schema mtime), so editing an XSD
+    on disk invalidates its verdicts. Every verdict is cached under the hash of the
+    document's raw bytes, which is checked before the document is even parsed. Valid
+    verdicts are also cached under the hash of the canonical form, which equivalent
+    documents share; invalid ones are not, as their error names the lines of the
+    document it was found in.
+    """
+
+    def __init__(self, max_entries: int = VALIDATION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, count_miss: bool = True) -> Tuple[bool, str] | None:
+        with self._lock:
+            verdict = self._entries.get(key)
+            if verdict is None:
+                self.misses += count_miss
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def put(self, key, verdict: Tuple[bool, str]) -> None:
+        with self._lock:
+            self._entries[key] = verdict
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hitRatio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+validation_cache = ValidationResultCache()
+
+# Compiled schemas keyed by (xsd path, mtime); lxml validators keep their error
+# log on the schema object, so each one gets its own lock.
+_compiled_schemas = {}
+_compiled_schemas_lock = threading.Lock()
+
 
 def build_error_xml(message: str) -> str:
     safe_message = escape(message or "")
@@ -23,33 +103,101 @@ def build_error_xml(message: str) -> str:
         f"<Error><Message>{safe_message}</Message></Error>"
     )
 
+def load_schema(xsd_path: Path, mtime_ns: int):
+    from lxml import etree
+
+    key = (str(xsd_path), mtime_ns)
+    with _compiled_schemas_lock:
+        cached = _compiled_schemas.get(key)
+    if cached is not None:
+        return cached
+
+    # Parse via a normalized file URI so nested includes/imports resolve
+    schema_doc = etree.parse(xsd_path.as_uri())
+    compiled = (etree.XMLSchema(schema_doc), threading.Lock())
+    with _compiled_schemas_lock:
+        for stale_key in [k for k in _compiled_schemas if k[0] == key[0]]:
+            del _compiled_schemas[stale_key]
+        _compiled_schemas[key] = compiled
+    return compiled
+
+
+def build_raw_validation_cache_key(xml_bytes: bytes, xsd_relpath: str, mtime_ns: int):
+    return "raw", hashlib.sha256(xml_bytes).hexdigest(), xsd_relpath, mtime_ns
+
+
+def build_validation_cache_key(xml_doc, xsd_relpath: str, mtime_ns: int):
+    from lxml import etree
+
+    # C14N makes the hash independent of attribute order, quoting and the XML declaration.
+    canonical_bytes = etree.tostring(xml_doc, method="c14n", with_comments=False)
+    return "c14n", hashlib.sha256(canonical_bytes).hexdigest(), xsd_relpath, mtime_ns
+
+
+@timed("xsd_validation")
 def validate(xml_string: str, xsd_relpath: str) -> Tuple[bool, str]:
+    from lxml import etree
+
     # 1) Locate the XSD file next to this .py
     here = Path(__file__).resolve().parent
     xsd_path = (here / xsd_relpath).resolve()
 
-    # 2) Load/compile the schema
+    # 2) Load/compile the schema (compiled schemas are reused until the XSD changes)
     try:
-        # Parse via a normalized file URI so nested includes/imports resolve
-        schema_doc = etree.parse(xsd_path.as_uri())
-        schema     = etree.XMLSchema(schema_doc)
+        mtime_ns = xsd_path.stat().st_mtime_ns
+        schema, schema_lock = load_schema(xsd_path, mtime_ns)
     except Exception as e:
         return False, f"XSD load/compile error: {e}"
-    # 3) Parse your XML payload
+    # 3) Reuse the verdict of the same bytes validated before, without parsing them
+    xml_bytes = xml_string.encode('utf-8')
+    raw_key = build_raw_validation_cache_key(xml_bytes, xsd_relpath, mtime_ns)
+    cached = validation_cache.get(raw_key, count_miss=False)
+    if cached is not None:
+        return cached
+
+    # 4) Parse your XML payload
     try:
-        xml_doc = etree.fromstring(xml_string.encode('utf-8'))
+        xml_doc = etree.fromstring(xml_bytes)
     except Exception as e:
         return False, f"XML parse error: {e}"
 
-    # 4) Validate against the schema
+    # 5) Reuse the verdict of an equivalent valid document validated before
+    cache_key = build_validation_cache_key(xml_doc, xsd_relpath, mtime_ns)
+    cached = validation_cache.get(cache_key)
+    if cached is not None:
+        validation_cache.put(raw_key, cached)
+        return cached
+
+    # 6) Validate against the schema
     try:
-        schema.assertValid(xml_doc)
-        return True, ""
+        with schema_lock:
+            schema.assertValid(xml_doc)
+        verdict = (True, "")
+        validation_cache.put(cache_key, verdict)
     except etree.DocumentInvalid as e:
         # This exception's message includes line numbers & failure reasons
-        return False, str(e)
+        verdict = (False, str(e))
+    validation_cache.put(raw_key, verdict)
+    return verdict
+
+def warm_up():
+    """Imports lxml and Django and compiles the recipe schemas ahead of the first validation."""
+    get_uri_to_iri()
+    here = Path(__file__).resolve().parent
+    for xsd_relpath in RECIPE_SCHEMAS:
+        xsd_path = (here / xsd_relpath).resolve()
+        load_schema(xsd_path, xsd_path.stat().st_mtime_ns)
+
+def get_uri_to_iri():
+    """Django's uri_to_iri, imported on first use as importing Django is slow."""
+    global _uri_to_iri
+    if _uri_to_iri is None:
+        from django.utils.encoding import uri_to_iri
+        _uri_to_iri = uri_to_iri
+    return _uri_to_iri
 
 def get_all_recipe_capabilities(file_content):
+  uri_to_iri = get_uri_to_iri()
   root = ET.fromstring(file_content)
   capabilities = []
   #the tag name has a namespace "<aas:capability>"
@@ -77,6 +225,8 @@ def get_all_recipe_capabilities(file_content):
   return capabilities
 
 @recipe_api.route('/grecipe/validate')
+@admission_class("validate")
+@background_job()
 def validate_batchml():
     """Endpoint to validate a xml string against BatchML xsd schema.
     ---
@@ -113,6 +263,7 @@ def validate_batchml():
         response = make_response(error, 400)
         return response
 @recipe_api.route('/material/validate')
+@admission_class("validate")
 def validate_material_information():
     """Endpoint to validate a xml string against B2MML Material schema.
     ---
@@ -147,6 +298,8 @@ def validate_material_information():
         return response
       
 @recipe_api.route('/mrecipe/validate', methods=['POST'])
+@admission_class("validate")
+@background_job()
 def validate_mrecipe_post():
     """
     Validate a Master-Recipe JSON payload by converting to XML and validating against the BatchInformation XSD.
@@ -194,6 +347,7 @@ def validate_mrecipe_post():
         return make_response(f"Internal error: {str(e)}", 500)
 
 @recipe_api.route('/mrecipe/validate')
+@admission_class("validate")
 def validate_mrecipe():
     """
     Validate a Master-Recipe XML string against the BatchInformation XSD.
@@ -230,7 +384,21 @@ def validate_mrecipe():
     else:
         return make_response(err, 400)
 
+@recipe_api.route('/validate/cache', methods=['GET'])
+def get_validation_cache_stats():
+    """
+    Report hit metrics of the shared validation result cache.
+    ---
+    tags:
+      - Recipes
+    responses:
+      "200":
+        description: Hits, misses, evictions, size and hit ratio of the cache.
+    """
+    return jsonify(validation_cache.stats())
+
 @recipe_api.route('/recipes/capabilities', methods=['POST']) 
+@admission_class("match")
 def get_recipe_capabilities():
     """Endpoint to get capabilitys form a server.
     ---
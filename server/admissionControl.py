@@ -0,0 +1,187 @@
+"""Admission control for CPU-heavy endpoints.
+
+Views decorated with @admission_class belong to one of the work classes "parse",
+"validate", "convert" or "match". Each class has a gate admitting at most
+``concurrency`` of its requests at a time; up to ``queue`` more wait for a slot for at
+most ``timeout`` seconds. Requests finding the queue full, or still waiting when the
+timeout runs out, are answered with 503 and a Retry-After header instead of adding
+to the load, so a burst of parses or conversions cannot slow down static files, the
+editors' cheap endpoints or the other work classes.
+
+The limits are set per class in the app config's ADMISSION_LIMITS. Requests
+re-dispatched by the background job queue wait for a slot without a queue or time
+limit, as the job queue bounds them already. Time spent waiting and rejected requests
+are reported on ``/metrics``. Every server process has its own gates; the production
+server divides the limits between its worker processes.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+
+from jobQueue import JOB_ENVIRON_KEY
+from serverMetrics import REGISTRY, Gauge
+
+
+WORK_CLASSES = ("parse", "validate", "convert", "match")
+
+ADMISSION_WAIT = REGISTRY.histogram(
+    "recipe_editor_admission_wait_seconds",
+    "Time requests of a work class waited for a slot, by outcome (admitted or rejected).",
+    ("class", "outcome"),
+)
+ADMISSION_REJECTED = REGISTRY.counter(
+    "recipe_editor_admission_rejected_total",
+    "Requests of a work class answered with 503 because its queue was full or the wait timed out.",
+    ("class", "reason"),
+)
+
+
+def default_admission_limits(cpu_count: int | None = None) -> dict:
+    """Limits sized to the machine: a slot per core, conversions (which start a JVM) at half that."""
+    cpus = cpu_count or os.cpu_count() or 1
+    return {
+        "parse": {"concurrency": cpus, "queue": 2 * cpus, "timeout": 10, "retry_after": 2},
+        "validate": {"concurrency": cpus, "queue": 2 * cpus, "timeout": 10, "retry_after": 2},
+        "convert": {"concurrency": max(1, cpus // 2), "queue": cpus, "timeout": 30, "retry_after": 10},
+        "match": {"concurrency": cpus, "queue": 2 * cpus, "timeout": 10, "retry_after": 2},
+    }
+
+
+def divide_admission_limits(limits: dict, processes: int) -> dict:
+    """Each process's share of limits sized for the whole machine, keeping at least one slot and waiter per class."""
+    return {
+        name: {
+            **class_limits,
+            "concurrency": max(1, class_limits["concurrency"] // processes),
+            "queue": max(1, class_limits["queue"] // processes),
+        }
+        for name, class_limits in limits.items()
+    }
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, gate: "AdmissionGate", reason: str):
+        super().__init__(f"{gate.name} work is at capacity ({reason})")
+        self.gate = gate
+        self.reason = reason
+
+
+class AdmissionGate:
+    """A counting semaphore with a bounded number of waiters and a wait timeout."""
+
+    def __init__(self, name: str, concurrency: int, queue: int, timeout: float, retry_after: int = 1):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, bounded: bool = True) -> float:
+        """Takes a slot, waiting for one if none is free, and returns the time waited.
+
+        Raises AdmissionRejected when the queue is full or the timeout runs out; with
+        bounded=False, waits as long as it takes.
+        """
+        started = time.perf_counter()
+        with self._condition:
+            if self.active < self.concurrency and self.waiting == 0:
+                self.active += 1
+                return 0.0
+            if bounded and self.waiting >= self.queue:
+                raise AdmissionRejected(self, "queue_full")
+            deadline = started + self.timeout if bounded else None
+            self.waiting += 1
+            try:
+                while self.active >= self.concurrency:
+                    remaining = None if deadline is None else deadline - time.perf_counter()
+                    if remaining is not None and remaining <= 0:
+                        raise AdmissionRejected(self, "timeout")
+                    self._condition.wait(remaining)
+                self.active += 1
+            finally:
+                self.waiting -= 1
+        return time.perf_counter() - started
+
+    def release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+
+def build_admission_gates(limits: dict) -> dict:
+    return {name: AdmissionGate(name, **limits[name]) for name in WORK_CLASSES}
+
+
+def admission_class(work_class: str):
+    """Puts the decorated view into a work class, whose gate admits its requests."""
+    if work_class not in WORK_CLASSES:
+        raise ValueError(f"Unknown work class '{work_class}', expected one of {', '.join(WORK_CLASSES)}")
+
+    def decorator(view):
+        view.admission_class = work_class
+        return view
+    return decorator
+
+
+def admit_request():
+    if request.endpoint is None:
+        return None
+    work_class = getattr(current_app.view_functions[request.endpoint], "admission_class", None)
+    if work_class is None:
+        return None
+    gate = current_app.extensions["admission_gates"][work_class]
+    started = time.perf_counter()
+    try:
+        waited = gate.acquire(bounded=not request.environ.get(JOB_ENVIRON_KEY, False))
+    except AdmissionRejected as e:
+        ADMISSION_WAIT.observe(time.perf_counter() - started, (work_class, "rejected"))
+        ADMISSION_REJECTED.inc((work_class, e.reason))
+        response = jsonify({"error": f"The server is busy with {work_class} requests, try again later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(gate.retry_after)
+        return response
+    ADMISSION_WAIT.observe(waited, (work_class, "admitted"))
+    g.admission_gate = gate
+    return None
+
+
+def hold_admission_while_streaming(response):
+    # The request context ends before a streamed body is generated; keep the slot until it is sent.
+    if response.is_streamed:
+        gate = g.pop("admission_gate", None)
+        if gate is not None:
+            response.call_on_close(gate.release)
+    return response
+
+
+def release_admission(exc):
+    gate = g.pop("admission_gate", None)
+    if gate is not None:
+        gate.release()
+
+
+def collect_admission_metrics(gates: dict) -> list:
+    active = Gauge("recipe_editor_admission_active", "Requests of a work class holding a slot.", ("class",))
+    waiting = Gauge("recipe_editor_admission_waiting", "Requests of a work class waiting for a slot.", ("class",))
+    capacity = Gauge("recipe_editor_admission_concurrency", "Slots of a work class.", ("class",))
+    for name, gate in gates.items():
+        active.set(gate.active, (name,))
+        waiting.set(gate.waiting, (name,))
+        capacity.set(gate.concurrency, (name,))
+    return [active, waiting, capacity]
+
+
+def install_admission_control(app) -> None:
+    """Creates the gates from ADMISSION_LIMITS and registers the hooks. Installed after the
+    background job hook, so queueing a job with ?async=1 does not take a slot."""
+    app.extensions["admission_gates"] = build_admission_gates(app.config["ADMISSION_LIMITS"])
+    app.before_request(admit_request)
+    app.after_request(hold_admission_while_streaming)
+    app.teardown_request(release_admission)
@@ -0,0 +1,96 @@
+"""Compares ExternalInterface resolution strategies on the bundled HC10/HC20/HC30 MTPs.
+
+The legacy strategy resolves each reference with a full-document
+`root.find(".//ExternalInterface[@ID='...']")` and caches the result, so every
+first lookup rescans the document. The indexed strategy builds the
+ID -> Identifier map once via `build_external_interface_index`.
+
+Run from the server directory:
+
+    python -m benchmarks.external_interface_index [--repeat 5]
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+from io import BytesIO
+from pathlib import Path
+
+from defusedxml.ElementTree import parse
+
+from MtpApi import NAMESPACE, PARAM_ELEM_TYPES, build_external_interface_index, parse_mtp_aml
+
+
+SERVER_ROOT = Path(__file__).resolve().parent.parent
+BUNDLED_MTPS = (
+    SERVER_ROOT / "upload" / "mtp" / "2025-11-10-Zenon_HC10_MTP_V1.0.0.aml",
+    SERVER_ROOT / "upload" / "mtp" / "2025-11-10-HC20-Zenon_v1.0.0.aml",
+    SERVER_ROOT / "upload" / "mtp" / "2025-11-05-HC30.aml",
+)
+
+
+def collect_interface_references(root) -> list[str]:
+    """Returns the ExternalInterface references parse_mtp_aml resolves, in document order."""
+    references = []
+    for attr_node in root.iter(f"{NAMESPACE}Attribute"):
+        if attr_node.get("Name") in PARAM_ELEM_TYPES:
+            reference = attr_node.findtext(f"{NAMESPACE}Value")
+            if reference:
+                references.append(reference)
+    return references
+
+
+def resolve_with_find(root, references: list[str]) -> dict:
+    cache = {}
+    for reference in references:
+        if reference in cache:
+            continue
+        interface_elem = root.find(f".//{NAMESPACE}ExternalInterface[@ID='{reference}']")
+        if interface_elem is not None:
+            identifier = interface_elem.find(f"{NAMESPACE}Attribute[@Name='Identifier']/{NAMESPACE}Value")
+            if identifier is not None:
+                cache[reference] = identifier.text
+    return cache
+
+
+def resolve_with_index(root, references: list[str]) -> dict:
+    index = build_external_interface_index(root)
+    return {reference: index.get(reference) for reference in references}
+
+
+def time_call(func, *args, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per measurement, the median is reported")
+    args = parser.parse_args()
+
+    header = f"{'file':<42} {'refs':>6} {'find (ms)':>11} {'index (ms)':>11} {'speedup':>8} {'parse (ms)':>11}"
+    print(header)
+    print("-" * len(header))
+    for mtp_path in BUNDLED_MTPS:
+        content = mtp_path.read_bytes()
+        root = parse(BytesIO(content)).getroot()
+        references = collect_interface_references(root)
+
+        find_seconds = time_call(resolve_with_find, root, references, repeat=args.repeat)
+        index_seconds = time_call(resolve_with_index, root, references, repeat=args.repeat)
+        parse_seconds = time_call(parse_mtp_aml, content, repeat=args.repeat)
+        speedup = find_seconds / index_seconds if index_seconds else float("inf")
+
+        print(
+            f"{mtp_path.name:<42} {len(references):>6} {find_seconds * 1000:>11.1f} "
+            f"{index_seconds * 1000:>11.1f} {speedup:>7.0f}x {parse_seconds * 1000:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
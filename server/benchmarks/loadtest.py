@@ -0,0 +1,492 @@
+"""Load test driving the Recipe Editor API with mixed editor traffic.
+
+Run from the server directory:
+
+    python -m benchmarks.loadtest [--concurrency 8] [--duration 30] [--workers 1] [--threads 8]
+    python -m benchmarks.loadtest --url http://localhost:8080 --concurrency 32
+
+Without --url the app is started with productionServer (waitress) on localhost, serving
+a temporary copy of the bundled ontologies, MTPs and AAS files plus a generated MTP, so
+the run leaves upload/ untouched. With --url an already running server is driven with
+the ontologies and MTPs it lists.
+
+Every client thread keeps one connection open and sends requests back to back, picking
+a scenario by its weight: listing ontologies and loading class trees, listing, parsing
+and uploading MTPs, reading equipment information, creating and validating master
+recipes and matching recipe capabilities against AAS files. Each scenario runs once
+before the measurement starts, so lazy imports and first-load costs are not part of it.
+The report lists the requests, errors, throughput and p50/p95/p99 latency of every
+scenario; --json also writes it to a file. The exit status is 1 when the share of
+failed requests exceeds --max-error-rate.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from benchmarks.workloads import (
+    build_general_recipe_xml,
+    build_master_recipe_payload,
+    generate_aas_v2_xml,
+    generate_mtp_aml,
+)
+
+
+SERVER_ROOT = Path(__file__).resolve().parent.parent
+UPLOAD_ROOT = SERVER_ROOT / "upload"
+ONTOLOGY_CATEGORIES = ("processes", "materials")
+SERVER_START_TIMEOUT = 120.0
+SERVER_STOP_TIMEOUT = 15.0
+REQUEST_TIMEOUT = 120.0
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class Scenario:
+    name: str
+    weight: int
+    method: str
+    # one is picked at random for every request
+    paths: tuple
+    body: bytes | None = None
+    content_type: str | None = None
+    expected_status: tuple = (200,)
+
+
+@dataclass
+class ScenarioResult:
+    latencies: list = field(default_factory=list)
+    errors: int = 0
+    statuses: dict = field(default_factory=dict)
+
+    def merge(self, other: "ScenarioResult") -> None:
+        self.latencies.extend(other.latencies)
+        self.errors += other.errors
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+
+
+def encode_multipart(files: dict) -> tuple[bytes, str]:
+    """Encodes {field: (filename, content)} as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, (filename, content) in files.items():
+        body.write(f"--{boundary}\r\n".encode())
+        body.write(f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'.encode())
+        body.write(b"Content-Type: application/octet-stream\r\n\r\n")
+        body.write(content)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+def build_aas_zip(files: int, capabilities: int) -> bytes:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        for number in range(1, files + 1):
+            zip_file.writestr(f"aas{number}.xml", generate_aas_v2_xml(capabilities, name=f"GeneratedAAS{number}"))
+    return archive.getvalue()
+
+
+def build_scenarios(ontologies: list, mtp_files: list, mtp_upload: bytes, operations: int = 20) -> list[Scenario]:
+    """The editor's traffic mix for the given (category, filename) ontologies and MTP filenames."""
+    scenarios = [
+        Scenario("ontology_list", 2, "GET", tuple(f"/onto/{category}" for category in ONTOLOGY_CATEGORIES)),
+        Scenario("mtp_list", 1, "GET", ("/mtp",)),
+    ]
+    if ontologies:
+        scenarios.append(Scenario(
+            "ontology_class_tree",
+            3,
+            "GET",
+            tuple(f"/onto/{category}/{quote(filename)}/class-tree" for category, filename in ontologies),
+        ))
+    if mtp_files:
+        scenarios.append(Scenario("mtp_parse", 2, "GET", tuple(f"/mtp/{quote(name)}/parse" for name in mtp_files)))
+        scenarios.append(Scenario(
+            "mtp_equipment_info", 3, "GET", tuple(f"/mtp/{quote(name)}/equipment-info" for name in mtp_files)
+        ))
+    body, content_type = encode_multipart({"file": ("generated.aml", mtp_upload)})
+    scenarios.append(Scenario("mtp_parse_upload", 1, "POST", ("/parse-mtp",), body, content_type))
+    scenarios.append(Scenario(
+        "master_recipe_create",
+        2,
+        "POST",
+        ("/api/recipe/master",),
+        json.dumps(build_master_recipe_payload(operations)).encode(),
+        "application/json",
+    ))
+    scenarios.append(Scenario(
+        "master_recipe_validate",
+        2,
+        "POST",
+        ("/mrecipe/validate",),
+        json.dumps(build_master_recipe_payload(operations, data_type="Measure")).encode(),
+        "application/json",
+    ))
+    body, content_type = encode_multipart({
+        "aas": ("aas.zip", build_aas_zip(files=5, capabilities=50)),
+        "recipe": ("recipe.xml", build_general_recipe_xml(operations).encode()),
+    })
+    scenarios.append(Scenario("capability_matching", 1, "POST", ("/CapabilityMatching/AAS",), body, content_type))
+    return scenarios
+
+
+class Client:
+    """One keep-alive connection to the server, reopened after a failure. Like a browser,
+    it accepts compressed responses unless compressed is False."""
+
+    def __init__(self, base_url: str, timeout: float = REQUEST_TIMEOUT, compressed: bool = True):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self.compressed = compressed
+        self.connection = None
+
+    def request(self, method: str, path: str, body: bytes | None = None, content_type: str | None = None) -> tuple[int, bytes]:
+        headers = {"Accept-Encoding": "gzip" if self.compressed else "identity"}
+        if content_type:
+            headers["Content-Type"] = content_type
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if response.will_close:
+            self.close()
+        return response.status, content
+
+    def close(self) -> None:
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def run_scenario(client: Client, scenario: Scenario, path: str, result: ScenarioResult) -> None:
+    started = time.perf_counter()
+    try:
+        status, _ = client.request(scenario.method, path, scenario.body, scenario.content_type)
+    except (OSError, http.client.HTTPException):
+        status = None
+    result.latencies.append(time.perf_counter() - started)
+    result.statuses[status] = result.statuses.get(status, 0) + 1
+    if status not in scenario.expected_status:
+        result.errors += 1
+
+
+def prime(base_url: str, scenarios: list[Scenario]) -> list[str]:
+    """Runs every request of every scenario once; returns descriptions of the failed ones."""
+    client = Client(base_url)
+    failures = []
+    try:
+        for scenario in scenarios:
+            for path in scenario.paths:
+                result = ScenarioResult()
+                run_scenario(client, scenario, path, result)
+                if result.errors:
+                    failures.append(f"{scenario.method} {path}: status {next(iter(result.statuses))}")
+    finally:
+        client.close()
+    return failures
+
+
+def run_load(base_url: str, scenarios: list[Scenario], concurrency: int, duration: float, seed: int = 0) -> tuple[dict, float]:
+    """Sends requests from concurrency threads for duration seconds.
+
+    Returns {scenario name: ScenarioResult} and the elapsed wall time.
+    """
+    weights = [scenario.weight for scenario in scenarios]
+    thread_results = [{scenario.name: ScenarioResult() for scenario in scenarios} for _ in range(concurrency)]
+    start = threading.Barrier(concurrency + 1)
+    deadline = [0.0]
+
+    def worker(number: int) -> None:
+        rng = random.Random(seed * 1000 + number)
+        client = Client(base_url)
+        results = thread_results[number]
+        start.wait()
+        try:
+            while time.perf_counter() < deadline[0]:
+                scenario = rng.choices(scenarios, weights)[0]
+                run_scenario(client, scenario, rng.choice(scenario.paths), results[scenario.name])
+        finally:
+            client.close()
+
+    threads = [threading.Thread(target=worker, args=(number,), daemon=True) for number in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    deadline[0] = started + duration
+    start.wait()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = {scenario.name: ScenarioResult() for scenario in scenarios}
+    for results in thread_results:
+        for name, result in results.items():
+            merged[name].merge(result)
+    return merged, elapsed
+
+
+def percentile(sorted_values: list, percent: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(result: ScenarioResult, elapsed: float) -> dict:
+    latencies = sorted(result.latencies)
+    summary = {
+        "requests": len(latencies),
+        "errors": result.errors,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+        "max_ms": 1000 * latencies[-1] if latencies else 0.0,
+        "statuses": {str(status): count for status, count in sorted(result.statuses.items(), key=lambda item: str(item[0]))},
+    }
+    for percent in PERCENTILES:
+        summary[f"p{percent}_ms"] = 1000 * percentile(latencies, percent)
+    return summary
+
+
+def build_report(results: dict, elapsed: float) -> dict:
+    total = ScenarioResult()
+    for result in results.values():
+        total.merge(result)
+    return {
+        "elapsed_s": elapsed,
+        "scenarios": {name: summarize(result, elapsed) for name, result in results.items()},
+        "total": summarize(total, elapsed),
+    }
+
+
+def format_report(report: dict) -> str:
+    header = f"{'scenario':<24}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    lines = [header, "-" * len(header)]
+    rows = sorted(report["scenarios"].items()) + [("total", report["total"])]
+    for name, summary in rows:
+        if name == "total":
+            lines.append("-" * len(header))
+        lines.append(
+            f"{name:<24}{summary['requests']:>10}{summary['errors']:>8}{summary['throughput_rps']:>9.1f}"
+            f"{summary['p50_ms']:>10.1f}{summary['p95_ms']:>10.1f}{summary['p99_ms']:>10.1f}{summary['max_ms']:>10.1f}"
+        )
+    return "\n".join(lines)
+
+
+def discover_files(base_url: str) -> tuple[list, list]:
+    """The (category, filename) ontologies and the MTP filenames the server lists."""
+    client = Client(base_url, compressed=False)
+
+    def get_json(path: str) -> list:
+        status, content = client.request("GET", path)
+        return json.loads(content) if status == 200 else []
+
+    try:
+        ontologies = [(category, name) for category in ONTOLOGY_CATEGORIES for name in get_json(f"/onto/{category}")]
+        mtp_files = get_json("/mtp")
+    finally:
+        client.close()
+    return ontologies, mtp_files
+
+
+def data_config(data_dir: Path) -> dict:
+    ontology_root = data_dir / "ontologies"
+    return {
+        "ONTOLOGY_UPLOAD_ROOT": str(ontology_root),
+        "ONTOLOGY_STAGING_ROOT": str(ontology_root / "staging"),
+        "MTP_UPLOAD_ROOT": str(data_dir / "mtp"),
+        "AAS_UPLOAD_ROOT": str(data_dir / "aasx"),
+        "PROFILE_UPLOAD_ROOT": str(data_dir / "profiles"),
+    }
+
+
+def prepare_data_dir(data_dir: Path, mtp_upload: bytes) -> None:
+    """Copies the bundled ontologies, MTPs and AAS files and adds the generated MTP."""
+    shutil.copytree(UPLOAD_ROOT / "ontologies", data_dir / "ontologies", ignore=shutil.ignore_patterns("staging"))
+    shutil.copytree(UPLOAD_ROOT / "mtp", data_dir / "mtp", ignore=lambda directory, names: [
+        name for name in names if not name.endswith(".aml")
+    ])
+    shutil.copytree(UPLOAD_ROOT / "aasx", data_dir / "aasx")
+    (data_dir / "mtp" / "generated.aml").write_bytes(mtp_upload)
+
+
+def serve(data_dir: Path, port: int, threads: int, workers: int) -> None:
+    """Runs the production server on localhost with its upload roots in data_dir."""
+    import productionServer
+
+    args = productionServer.parse_args([
+        "--host", "127.0.0.1", "--port", str(port), "--threads", str(threads), "--workers", str(workers), "--no-apidocs",
+    ])
+    app = productionServer.build_app(args, data_config(data_dir))
+    productionServer.serve_app(app, args)
+
+
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    client = Client(base_url, timeout=5)
+    deadline = time.monotonic() + timeout
+    try:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"The server exited with status {process.returncode} during startup.")
+            try:
+                if client.request("GET", "/mtp")[0] == 200:
+                    return
+            except (OSError, http.client.HTTPException):
+                pass
+            time.sleep(0.2)
+    finally:
+        client.close()
+    raise RuntimeError(f"The server did not answer within {timeout:.0f} s.")
+
+
+def start_server(data_dir: Path, threads: int, workers: int, log_file) -> tuple[subprocess.Popen, str]:
+    port = find_free_port()
+    command = [
+        sys.executable, "-m", "benchmarks.loadtest", "--serve", str(data_dir),
+        "--port", str(port), "--threads", str(threads), "--workers", str(workers),
+    ]
+    process = subprocess.Popen(command, cwd=SERVER_ROOT, stdout=log_file, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url, process, SERVER_START_TIMEOUT)
+    except BaseException:
+        stop_server(process)
+        raise
+    return process, base_url
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    if process.poll() is not None:
+        return
+    # SIGTERM lets the production server stop its workers
+    process.terminate()
+    try:
+        process.wait(SERVER_STOP_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the Recipe Editor API with mixed editor traffic.")
+    parser.add_argument("--url", help="drive this running server instead of starting one")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads sending requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send requests for")
+    parser.add_argument("--threads", type=int, default=8, help="waitress threads of the started server")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes of the started server")
+    parser.add_argument("--mtp-instances", type=int, default=500, help="instances of the generated MTP")
+    parser.add_argument("--operations", type=int, default=20, help="operations of the master and general recipes")
+    parser.add_argument("--scenarios", help="comma-separated scenarios to run, all by default")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="share of failed requests that is tolerated")
+    parser.add_argument("--json", type=Path, help="also write the report to this file")
+    parser.add_argument("--server-log", type=Path, help="file for the output of the started server")
+    # internal: the server process started by the load test
+    parser.add_argument("--serve", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.serve:
+        serve(args.serve, args.port, args.threads, args.workers)
+        return 0
+
+    mtp_upload = generate_mtp_aml(args.mtp_instances, services=max(1, args.mtp_instances // 50), seed=args.seed)
+    with tempfile.TemporaryDirectory(prefix="recipe-editor-loadtest-") as temp_dir:
+        process = None
+        log_path = args.server_log or Path(temp_dir) / "server.log"
+        with open(log_path, "wb") as log_file:
+            try:
+                if args.url:
+                    base_url = args.url.rstrip("/")
+                else:
+                    data_dir = Path(temp_dir) / "data"
+                    prepare_data_dir(data_dir, mtp_upload)
+                    print(f"Starting the server ({args.workers} workers, {args.threads} threads) ...")
+                    process, base_url = start_server(data_dir, args.threads, args.workers, log_file)
+
+                ontologies, mtp_files = discover_files(base_url)
+                scenarios = build_scenarios(ontologies, mtp_files, mtp_upload, args.operations)
+                if args.scenarios:
+                    selected = {name.strip() for name in args.scenarios.split(",")}
+                    scenarios = [scenario for scenario in scenarios if scenario.name in selected]
+                if not scenarios:
+                    print("No scenarios to run.")
+                    return 1
+
+                failures = prime(base_url, scenarios)
+                if failures:
+                    print("These requests failed before the measurement:\n  " + "\n  ".join(failures))
+                    return 1
+
+                print(f"Sending requests from {args.concurrency} threads for {args.duration:.0f} s to {base_url} ...")
+                results, elapsed = run_load(base_url, scenarios, args.concurrency, args.duration, args.seed)
+            except RuntimeError as error:
+                print(error)
+                if not args.server_log:
+                    log_file.flush()
+                    print(Path(log_path).read_text(errors="replace")[-4000:])
+                return 1
+            finally:
+                if process is not None:
+                    stop_server(process)
+
+    report = build_report(results, elapsed)
+    report["config"] = {
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "threads": args.threads,
+        "workers": args.workers,
+        "mtp_instances": args.mtp_instances,
+        "operations": args.operations,
+        "cpu_count": os.cpu_count(),
+    }
+    print(format_report(report))
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+
+    total = report["total"]
+    error_rate = total["errors"] / total["requests"] if total["requests"] else 1.0
+    if error_rate > args.max_error_rate:
+        print(f"\n{total['errors']} of {total['requests']} requests failed ({error_rate:.1%}).")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
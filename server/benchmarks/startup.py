@@ -0,0 +1,105 @@
+"""Reports the cold-start cost of the server and of each subsystem's warm-up.
+
+Every run starts a fresh interpreter with `-X importtime`, imports `server` and
+creates the app. The report lists the median cumulative import time of the
+modules the server imports directly, followed by the time each subsystem's
+`warm_up()` takes when it is triggered afterwards.
+
+Run from the server directory:
+
+    python -m benchmarks.startup [--repeat 5] [--top 15]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+
+SERVER_ROOT = Path(__file__).resolve().parent.parent
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+STARTUP_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.create_app()
+created = time.perf_counter()
+timings = {"import server": imported - started, "create_app": created - imported}
+for name in ("AasAPI", "ontologyService", "RecipeAPI"):
+    warm_started = time.perf_counter()
+    getattr(server, name).warm_up()
+    timings[f"{name}.warm_up"] = time.perf_counter() - warm_started
+print(json.dumps(timings))
+"""
+
+
+def run_startup() -> tuple[dict, dict]:
+    """Returns ({module: cumulative import seconds}, {phase: seconds}) of one cold start."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+        cwd=SERVER_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # importtime prints a module after its own imports; the indentation is its depth.
+    imports = {}
+    server_depth = None
+    pending = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, module = match.groups()
+        depth = len(indent) // 2
+        pending.append((depth, module, int(cumulative_us) / 1e6))
+        if module == "server" and server_depth is None:
+            server_depth = depth
+            imports = {name: seconds for d, name, seconds in pending if d == depth + 1}
+            imports["server (total)"] = int(cumulative_us) / 1e6
+
+    phases = json.loads(completed.stdout.strip().splitlines()[-1])
+    return imports, phases
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="cold starts to run, the median is reported")
+    parser.add_argument("--top", type=int, default=15, help="number of direct imports to list")
+    args = parser.parse_args()
+
+    import_runs = {}
+    phase_runs = {}
+    for _ in range(args.repeat):
+        imports, phases = run_startup()
+        for name, seconds in imports.items():
+            import_runs.setdefault(name, []).append(seconds)
+        for name, seconds in phases.items():
+            phase_runs.setdefault(name, []).append(seconds)
+
+    medians = {name: statistics.median(values) for name, values in import_runs.items()}
+    total = medians.pop("server (total)", 0.0)
+    header = f"{'module imported by server':<42} {'cumulative (ms)':>16}"
+    print(header)
+    print("-" * len(header))
+    for name, seconds in sorted(medians.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{name:<42} {seconds * 1000:>16.1f}")
+    print(f"{'server (total)':<42} {total * 1000:>16.1f}")
+
+    print()
+    header = f"{'phase':<42} {'median (ms)':>16}"
+    print(header)
+    print("-" * len(header))
+    for name, values in phase_runs.items():
+        print(f"{name:<42} {statistics.median(values) * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Benchmark suite for the server's hot paths, with stored baselines.
+
+Every case is timed over --repeat runs after one warm-up run, then run once more under
+tracemalloc to record its peak memory. Results are compared with baselines.json; a case
+whose best time or peak memory exceeds its baseline by more than --threshold is
+reported as a regression and makes the suite exit with status 1. Changes below
+MIN_TIME_DELTA/MIN_MEMORY_DELTA are ignored as noise. Baselines depend on the machine,
+so record them with --save-baseline on the machine that compares them. tracemalloc
+only sees Python allocations, so lxml's memory is not part of the validate peaks.
+
+Run from the server directory:
+
+    python -m benchmarks.suite [--repeat 5] [--filter parse_mtp_aml] [--threshold 0.25] [--save-baseline]
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from AASxmlCapabilityParser import parse_capabilities_robust_from_bytes
+from MtpApi import parse_mtp_aml, pea_to_dict
+import RecipeAPI
+import ontologyService
+
+from benchmarks.workloads import (
+    build_general_recipe_xml,
+    build_master_recipe_payload,
+    build_master_recipe_xml,
+    build_material_information_xml,
+    generate_aas_v3_xml,
+    generate_mtp_aml,
+    scale_mtp_aml,
+)
+
+
+SERVER_ROOT = Path(__file__).resolve().parent.parent
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines.json"
+MTP_ROOT = SERVER_ROOT / "upload" / "mtp"
+BUNDLED_MTPS = {
+    "HC10": MTP_ROOT / "2025-11-10-Zenon_HC10_MTP_V1.0.0.aml",
+    "HC20": MTP_ROOT / "2025-11-10-HC20-Zenon_v1.0.0.aml",
+    "HC30": MTP_ROOT / "2025-11-05-HC30.aml",
+}
+BUNDLED_AAS = {
+    "HC10": SERVER_ROOT / "upload" / "aasx" / "HC10_AAS.xml",
+    "HC20": SERVER_ROOT / "upload" / "aasx" / "HC20.xml",
+    "HC30": SERVER_ROOT / "upload" / "aasx" / "HC30.xml",
+}
+ONTOLOGY_CONFIG = {"ONTOLOGY_UPLOAD_ROOT": str(SERVER_ROOT / "upload" / "ontologies")}
+BUNDLED_ONTOLOGIES = (
+    ("processes", "OntoProCap.owl"),
+    ("materials", "ChEBI-Metal-Recovery-Process.owl"),
+)
+SCALED_MTP_SOURCE = "HC30"
+MTP_SCALE_FACTORS = (10, 100)
+GENERATED_MTP_INSTANCES = (1000,)
+GENERATED_AAS_CAPABILITIES = 200
+RECIPE_SIZES = (10, 200)
+DEFAULT_THRESHOLD = 0.25
+MIN_TIME_DELTA = 0.0005
+MIN_MEMORY_DELTA = 64 * 1024
+
+
+@dataclass
+class BenchmarkCase:
+    name: str
+    # Prepares the inputs and returns the callable that is measured.
+    setup: Callable[[], Callable[[], object]]
+    # Upper bound for --repeat, for cases that take seconds per run.
+    max_repeat: int | None = None
+
+
+def _read_bytes(path: Path) -> Callable[[], bytes]:
+    return lambda: path.read_bytes()
+
+
+def _parse_case(load_content):
+    def setup():
+        content = load_content()
+        return lambda: parse_mtp_aml(content)
+    return setup
+
+
+def _pea_to_dict_case(load_content):
+    def setup():
+        pea = parse_mtp_aml(load_content())
+        return lambda: pea_to_dict(pea)
+    return setup
+
+
+def _validate_case(build_xml, xsd_relpath: str):
+    def setup():
+        xml_string = build_xml()
+        valid, error = RecipeAPI.validate(xml_string, xsd_relpath)
+        if not valid:
+            raise ValueError(f"The generated input is not valid against {xsd_relpath}: {error}")
+
+        def run():
+            # measure the validation itself, not the cached verdict
+            RecipeAPI.validation_cache.clear()
+            return RecipeAPI.validate(xml_string, xsd_relpath)
+        return run
+    return setup
+
+
+def _convert_master_recipe_case(operations: int):
+    def setup():
+        payload = build_master_recipe_payload(operations)
+        return lambda: RecipeAPI.convert_enhanced_json_to_batchml_xml(payload)
+    return setup
+
+
+def _recipe_capabilities_case(process_elements: int):
+    def setup():
+        xml_string = build_general_recipe_xml(process_elements)
+        return lambda: RecipeAPI.get_all_recipe_capabilities(xml_string)
+    return setup
+
+
+def _aas_capabilities_case(load_content):
+    def setup():
+        content = load_content()
+        return lambda: parse_capabilities_robust_from_bytes(content)
+    return setup
+
+
+def _ontology_load_case(category: str, filename: str):
+    def setup():
+        return lambda: ontologyService.load_ontology(ONTOLOGY_CONFIG, category, filename)
+    return setup
+
+
+def _ontology_class_tree_case(category: str, filename: str):
+    def setup():
+        ontology = ontologyService.load_ontology(ONTOLOGY_CONFIG, category, filename)
+        return lambda: ontologyService.build_normalized_ontology_class_graph(ontology)
+    return setup
+
+
+def build_cases() -> list[BenchmarkCase]:
+    cases = []
+    for label, path in BUNDLED_MTPS.items():
+        cases.append(BenchmarkCase(f"parse_mtp_aml[{label}]", _parse_case(_read_bytes(path))))
+    for factor in MTP_SCALE_FACTORS:
+        source = BUNDLED_MTPS[SCALED_MTP_SOURCE]
+        load_scaled = lambda factor=factor: scale_mtp_aml(source.read_bytes(), factor)
+        max_repeat = 1 if factor >= 100 else None
+        cases.append(BenchmarkCase(f"parse_mtp_aml[{SCALED_MTP_SOURCE}x{factor}]", _parse_case(load_scaled), max_repeat))
+    for instances in GENERATED_MTP_INSTANCES:
+        generate = lambda instances=instances: generate_mtp_aml(instances, services=instances // 50)
+        cases.append(BenchmarkCase(f"parse_mtp_aml[generated,{instances}]", _parse_case(generate)))
+    for label, path in BUNDLED_MTPS.items():
+        cases.append(BenchmarkCase(f"pea_to_dict[{label}]", _pea_to_dict_case(_read_bytes(path))))
+    source = BUNDLED_MTPS[SCALED_MTP_SOURCE]
+    cases.append(BenchmarkCase(
+        f"pea_to_dict[{SCALED_MTP_SOURCE}x{MTP_SCALE_FACTORS[0]}]",
+        _pea_to_dict_case(lambda: scale_mtp_aml(source.read_bytes(), MTP_SCALE_FACTORS[0])),
+    ))
+
+    for size in RECIPE_SIZES:
+        cases.append(BenchmarkCase(
+            f"validate[GeneralRecipe,{size}]",
+            _validate_case(lambda size=size: build_general_recipe_xml(size), RecipeAPI.RECIPE_SCHEMAS[0]),
+        ))
+        cases.append(BenchmarkCase(
+            f"validate[Material,{size}]",
+            _validate_case(lambda size=size: build_material_information_xml(size), RecipeAPI.RECIPE_SCHEMAS[1]),
+        ))
+        cases.append(BenchmarkCase(
+            f"validate[BatchInformation,{size}]",
+            _validate_case(lambda size=size: build_master_recipe_xml(size), RecipeAPI.RECIPE_SCHEMAS[2]),
+        ))
+        cases.append(BenchmarkCase(f"convert_enhanced_json_to_batchml_xml[{size}]", _convert_master_recipe_case(size)))
+        cases.append(BenchmarkCase(f"get_all_recipe_capabilities[{size}]", _recipe_capabilities_case(size)))
+
+    for label, path in BUNDLED_AAS.items():
+        cases.append(BenchmarkCase(f"parse_capabilities_robust_from_bytes[{label}]", _aas_capabilities_case(_read_bytes(path))))
+    cases.append(BenchmarkCase(
+        f"parse_capabilities_robust_from_bytes[generated,{GENERATED_AAS_CAPABILITIES}]",
+        _aas_capabilities_case(lambda: generate_aas_v3_xml(GENERATED_AAS_CAPABILITIES)),
+    ))
+    for category, filename in BUNDLED_ONTOLOGIES:
+        cases.append(BenchmarkCase(f"load_ontology[{filename}]", _ontology_load_case(category, filename)))
+        cases.append(BenchmarkCase(
+            f"build_normalized_ontology_class_graph[{filename}]", _ontology_class_tree_case(category, filename)
+        ))
+    return cases
+
+
+def measure(case: BenchmarkCase, repeat: int) -> dict:
+    """Returns the median and minimum time in seconds and the peak traced memory in bytes."""
+    if case.max_repeat is not None:
+        repeat = min(repeat, case.max_repeat)
+    # several of the measured functions print their inputs
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = case.setup()
+        if repeat > 1:
+            run()
+        # like timeit, keep the collector from adding pauses caused by earlier cases
+        gc.collect()
+        gc.disable()
+        try:
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+
+        tracemalloc.start()
+        try:
+            run()
+            _, peak_bytes = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {"median_s": statistics.median(timings), "min_s": min(timings), "peak_bytes": peak_bytes, "repeat": repeat}
+
+
+def relative_change(value: float, baseline: float | None) -> float | None:
+    if not baseline:
+        return None
+    return value / baseline - 1
+
+
+def find_regressions(name: str, result: dict, baseline: dict | None, threshold: float) -> list[str]:
+    if baseline is None:
+        return []
+    regressions = []
+    # the best of the runs is the least disturbed by other load on the machine
+    time_change = relative_change(result["min_s"], baseline.get("min_s"))
+    if time_change is not None and time_change > threshold and result["min_s"] - baseline["min_s"] > MIN_TIME_DELTA:
+        regressions.append(f"{name}: best time {time_change:+.0%} ({baseline['min_s'] * 1000:.1f} -> {result['min_s'] * 1000:.1f} ms)")
+    memory_change = relative_change(result["peak_bytes"], baseline.get("peak_bytes"))
+    if (
+        memory_change is not None
+        and memory_change > threshold
+        and result["peak_bytes"] - baseline["peak_bytes"] > MIN_MEMORY_DELTA
+    ):
+        regressions.append(f"{name}: peak memory {memory_change:+.0%} ({baseline['peak_bytes'] / 2**20:.1f} -> {result['peak_bytes'] / 2**20:.1f} MiB)")
+    return regressions
+
+
+def format_change(change: float | None) -> str:
+    return "n/a" if change is None else f"{change:+.0%}"
+
+
+def load_baselines(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8")).get("results", {})
+
+
+def save_baselines(path: Path, results: dict) -> None:
+    baselines = {}
+    if path.exists():
+        baselines = json.loads(path.read_text(encoding="utf-8")).get("results", {})
+    baselines.update(results)
+    document = {
+        "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+        "python": platform.python_version(),
+        "results": dict(sorted(baselines.items())),
+    }
+    path.write_text(json.dumps(document, indent=2) + "\n", encoding="utf-8")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case, the best one is compared")
+    parser.add_argument("--filter", action="append", default=[], help="only run cases whose name contains this text")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative slowdown or growth")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="baseline file to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baselines")
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in build_cases() if not args.filter or any(text in case.name for text in args.filter)]
+    if args.list:
+        for case in cases:
+            print(case.name)
+        return 0
+
+    baselines = load_baselines(args.baseline)
+    results = {}
+    regressions = []
+    header = f"{'case':<72} {'median ms':>10} {'best ms':>10} {'vs base':>8} {'peak MiB':>9} {'vs base':>8}"
+    print(header)
+    print("-" * len(header))
+    for case in cases:
+        result = measure(case, args.repeat)
+        results[case.name] = {"median_s": result["median_s"], "min_s": result["min_s"], "peak_bytes": result["peak_bytes"]}
+        baseline = baselines.get(case.name)
+        time_change = relative_change(result["min_s"], baseline and baseline.get("min_s"))
+        memory_change = relative_change(result["peak_bytes"], baseline and baseline.get("peak_bytes"))
+        print(
+            f"{case.name:<72} {result['median_s'] * 1000:>10.2f} {result['min_s'] * 1000:>10.2f} {format_change(time_change):>8} "
+            f"{result['peak_bytes'] / 2**20:>9.2f} {format_change(memory_change):>8}",
+            flush=True,
+        )
+        regressions.extend(find_regressions(case.name, result, baseline, args.threshold))
+
+    if args.save_baseline:
+        save_baselines(args.baseline, results)
+        print(f"\nBaselines written to {args.baseline}")
+        return 0
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,516 @@
+"""Scaled and synthetic inputs for the benchmarks and load tests.
+
+MTPs are either scaled by cloning the instances, services and ExternalInterfaces of a
+bundled AML file with suffixed IDs, or generated from scratch with generate_mtp_aml;
+both have the structure parse_mtp_aml expects. AAS v2 and v3 environments are
+generated with a given number of capabilities, and recipes with a given number of
+process elements or operations.
+
+The generators can also be run from the server directory to write files:
+
+    python -m benchmarks.workloads mtp --instances 1000 --services 20 -o generated.aml
+    python -m benchmarks.workloads aas --version 3 --capabilities 200 -o generated_aas.xml
+    python -m benchmarks.workloads grecipe --size 500 -o general_recipe.xml
+    python -m benchmarks.workloads mrecipe --size 100 -o master_recipe.xml
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import copy
+import io
+import random
+import sys
+import uuid
+import xml.etree.ElementTree as ET
+from io import BytesIO
+
+from defusedxml.ElementTree import parse
+
+from MtpApi import NAMESPACE, PEA_INFORMATION_LABELS
+
+
+CAEX_NAMESPACE = NAMESPACE.strip("{}")
+B2MML_NAMESPACE = "http://www.mesa.org/xml/B2MML"
+AAS_V2_NAMESPACE = "http://www.admin-shell.io/aas/2/0"
+AAS_V3_NAMESPACE = "https://admin-shell.io/aas/3/0"
+CAPABILITY_DESCRIPTION = "https://admin-shell.io/idta/CapabilityDescription/"
+CAPABILITY_IRI = "http://www.example.com/capabilities#Capability{number}"
+
+
+def _suffix_references(element, ids: set, suffix: str) -> None:
+    for node in element.iter():
+        node_id = node.get("ID")
+        if node_id in ids:
+            node.set("ID", node_id + suffix)
+        if node.tag == f"{NAMESPACE}Value" and node.text in ids:
+            node.text = node.text + suffix
+
+
+def _append_copies(parent, children: list, ids: set, copies: int) -> None:
+    for copy_number in range(1, copies + 1):
+        suffix = f"_x{copy_number}"
+        for child in children:
+            clone = copy.deepcopy(child)
+            _suffix_references(clone, ids, suffix)
+            if clone.get("Name"):
+                clone.set("Name", clone.get("Name") + suffix)
+            parent.append(clone)
+
+
+def scale_mtp_aml(content: bytes, factor: int) -> bytes:
+    """Returns the AML with its instances (except the PEA information label), services and
+    ExternalInterfaces repeated factor times."""
+    if factor <= 1:
+        return content
+    root = parse(BytesIO(content)).getroot()
+    ids = {node.get("ID") for node in root.iter() if node.get("ID")}
+    # services, procedures and their parameters refer to instances by RefID values as well
+    ids.update(
+        node.findtext(f"{NAMESPACE}Value")
+        for node in root.iter(f"{NAMESPACE}Attribute")
+        if node.get("Name") == "RefID" and node.findtext(f"{NAMESPACE}Value")
+    )
+    copies = factor - 1
+
+    # ExternalInterfaces are collected first, so the cloned instances are not cloned twice.
+    interface_parents = [
+        (parent, [child for child in parent if child.tag == f"{NAMESPACE}ExternalInterface"])
+        for parent in root.iter()
+        if any(child.tag == f"{NAMESPACE}ExternalInterface" for child in parent)
+    ]
+    instance_lists = [
+        node for node in root.iter(f"{NAMESPACE}InternalElement") if node.get("Name") in ("InstanceList", "Instances")
+    ]
+    service_hierarchies = [
+        node for node in root if node.tag == f"{NAMESPACE}InstanceHierarchy" and node.get("Name") == "Services"
+    ]
+
+    for parent, interfaces in interface_parents:
+        _append_copies(parent, interfaces, ids, copies)
+    for instance_list in instance_lists:
+        # a PEA has a single information label
+        instances = [
+            child for child in instance_list
+            if child.tag == f"{NAMESPACE}InternalElement" and child.get("Name") not in PEA_INFORMATION_LABELS
+        ]
+        _append_copies(instance_list, instances, ids, copies)
+    for services in service_hierarchies:
+        _append_copies(services, [child for child in services if child.tag == f"{NAMESPACE}InternalElement"], ids, copies)
+
+    ET.register_namespace("", CAEX_NAMESPACE)
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+# (name prefix, role, populated parameter elements) of the generated sensors and actuators
+SENSOR_ACTUATOR_KINDS = (
+    ("TI", "AnaView", ("V", "VUnit", "VSclMin", "VSclMax")),
+    ("LS", "BinView", ("V",)),
+    ("XV", "AnaVlv", ("Pos", "PosTextID", "VSclMin", "VSclMax")),
+    ("M", "BinDrv", ("Ctrl", "StateChannel")),
+)
+SERVICE_CONTROL_ELEMENTS = ("CommandOp", "CommandEn", "StateCur", "ProcedureCur", "ProcedureReq", "ProcedureOp")
+PROCEDURE_HEALTH_ELEMENTS = ("CommandEn", "ProcedureCur")
+SERVICE_PARAMETER_ELEMENTS = ("VOp", "VOut", "VUnit", "VMin", "VMax", "VReq")
+# fill up instances that need more interfaces than their role populates
+FILLER_ELEMENTS = (
+    "WQC", "OSLevel", "StateOffAut", "StateOpAut", "StateAutAut", "StateOffOp", "StateOpOp", "StateAutOp",
+    "SrcChannel", "SrcExtAut", "SrcIntAut", "SrcIntOp", "SrcExtOp", "SrcIntAct", "SrcExtAct",
+)
+DEFAULT_VALUES = {"VMin": "0", "VSclMin": "0", "VMax": "100", "VSclMax": "100", "VUnit": "1001"}
+SERVICE_NAMES = ("Dosing", "Heating", "Mixing", "Cooling", "Draining", "Filling", "Stirring", "Tempering")
+
+
+def _caex(parent, tag: str, **attributes):
+    return ET.SubElement(parent, f"{NAMESPACE}{tag}", attributes)
+
+
+def _caex_attribute(parent, name: str, value=None, default=None):
+    attribute = _caex(parent, "Attribute", Name=name)
+    if default is not None:
+        ET.SubElement(attribute, f"{NAMESPACE}DefaultValue").text = default
+    if value is not None:
+        ET.SubElement(attribute, f"{NAMESPACE}Value").text = value
+    return attribute
+
+
+def _parameter_elements(populated: tuple, count: int) -> list:
+    names = list(populated)
+    names += [name for name in FILLER_ELEMENTS if name not in names]
+    return names[:max(count, len(populated))]
+
+
+def generate_mtp_aml(
+    instances: int = 100,
+    services: int = 5,
+    procedures_per_service: int = 2,
+    parameters_per_procedure: int = 2,
+    interfaces_per_instance: int = 4,
+    name: str = "GeneratedPEA",
+    seed: int = 0,
+) -> bytes:
+    """Generates an MTP with the given numbers of instances, services and procedures.
+
+    Every service gets a ServiceControl instance, every procedure a ProcedureHealthView
+    and parameters_per_procedure AnaServParam instances; the remaining instances are
+    sensors and actuators of SENSOR_ACTUATOR_KINDS, so there are at least as many
+    instances as the services need. Every instance populates interfaces_per_instance
+    parameter elements (at least those of its role), each backed by an ExternalInterface
+    of the OPC UA server. IDs are derived from seed, so the output is reproducible.
+    """
+    rng = random.Random(seed)
+
+    def new_id() -> str:
+        return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+    root = ET.Element(f"{NAMESPACE}CAEXFile", FileName=f"{name}.aml", SchemaVersion="3.0")
+    package = _caex(root, "InstanceHierarchy", Name="ModuleTypePackage")
+    pea = _caex(package, "InternalElement", Name=name, ID=new_id())
+    communication = _caex(pea, "InternalElement", Name="Communication", ID=new_id())
+    instance_list = _caex(communication, "InternalElement", Name="Instances", ID=new_id())
+    source_list = _caex(communication, "InternalElement", Name="Sources", ID=new_id())
+    server = _caex(source_list, "InternalElement", Name="OPCUAServer", ID=new_id())
+    _caex_attribute(server, "Endpoint", "opc.tcp://localhost:4840")
+    opcua_namespace = f"urn:{name}"
+
+    def add_instance(instance_name: str, role: str, populated: tuple) -> str:
+        instance_id = new_id()
+        instance = _caex(
+            instance_list,
+            "InternalElement",
+            Name=instance_name,
+            ID=instance_id,
+            RefBaseSystemUnitPath=f"MTPDataObjectSUCLib/DataAssembly/{role}",
+        )
+        _caex_attribute(instance, "RefID", new_id())
+        for element in _parameter_elements(populated, interfaces_per_instance):
+            interface_id = new_id()
+            _caex_attribute(instance, element, interface_id, DEFAULT_VALUES.get(element, "0"))
+            interface = _caex(server, "ExternalInterface", Name=f"{instance_name}.{element}", ID=interface_id)
+            _caex_attribute(interface, "Identifier", f"ns=2;s={instance_name}.{element}")
+            _caex_attribute(interface, "Namespace", opcua_namespace)
+        return instance_id
+
+    service_hierarchy = ET.Element(f"{NAMESPACE}InstanceHierarchy", Name="Services")
+    owned_instances = 0
+    for service_number in range(1, services + 1):
+        service_name = f"{SERVICE_NAMES[(service_number - 1) % len(SERVICE_NAMES)]}{service_number:03d}"
+        control_id = add_instance(f"{service_name}_ServiceControl", "ServiceControl", SERVICE_CONTROL_ELEMENTS)
+        service = _caex(service_hierarchy, "InternalElement", Name=service_name, ID=new_id())
+        _caex_attribute(service, "RefID", control_id)
+        owned_instances += 1
+        for procedure_number in range(1, procedures_per_service + 1):
+            procedure_name = f"{service_name}_Procedure{procedure_number}"
+            health_id = add_instance(f"{procedure_name}_HealthView", "ProcedureHealthView", PROCEDURE_HEALTH_ELEMENTS)
+            procedure = _caex(service, "InternalElement", Name=procedure_name, ID=new_id())
+            _caex_attribute(procedure, "RefID", health_id)
+            _caex_attribute(procedure, "IsSelfCompleting", "true" if procedure_number % 2 else "false")
+            _caex_attribute(procedure, "ProcedureID", str(procedure_number))
+            owned_instances += 1
+            for parameter_number in range(1, parameters_per_procedure + 1):
+                parameter_name = f"{procedure_name}_Parameter{parameter_number}"
+                parameter_id = add_instance(parameter_name, "AnaServParam", SERVICE_PARAMETER_ELEMENTS)
+                parameter = _caex(procedure, "InternalElement", Name=parameter_name, ID=new_id())
+                _caex_attribute(parameter, "RefID", parameter_id)
+                owned_instances += 1
+
+    for number in range(1, max(instances - owned_instances, 0) + 1):
+        prefix, role, populated = SENSOR_ACTUATOR_KINDS[(number - 1) % len(SENSOR_ACTUATOR_KINDS)]
+        add_instance(f"{prefix}{number:04d}", role, populated)
+
+    root.append(service_hierarchy)
+    ET.register_namespace("", CAEX_NAMESPACE)
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def _aas(parent, tag: str, text=None, namespace: str = AAS_V3_NAMESPACE, **attributes):
+    element = ET.SubElement(parent, f"{{{namespace}}}{tag}", attributes)
+    if text is not None:
+        element.text = text
+    return element
+
+
+def _aas_v3_reference(parent, tag: str, value: str, reference_type: str = "ExternalReference", key_type: str = "GlobalReference"):
+    reference = _aas(parent, tag)
+    _aas(reference, "type", reference_type)
+    key = _aas(_aas(reference, "keys"), "key")
+    _aas(key, "type", key_type)
+    _aas(key, "value", value)
+    return reference
+
+
+def generate_aas_v2_xml(capabilities: int, name: str = "GeneratedAAS") -> bytes:
+    """An AAS v2 environment with one capability submodel holding the given number of capabilities."""
+    ns = AAS_V2_NAMESPACE
+    root = ET.Element(f"{{{ns}}}aasenv")
+    shell = _aas(_aas(root, "assetAdministrationShells", namespace=ns), "assetAdministrationShell", namespace=ns)
+    _aas(shell, "idShort", name, namespace=ns)
+    _aas(shell, "identification", f"https://example.com/aas/{name}", namespace=ns, idType="IRI")
+    asset = _aas(_aas(root, "assets", namespace=ns), "asset", namespace=ns)
+    _aas(asset, "idShort", f"{name}Asset", namespace=ns)
+    _aas(asset, "identification", f"https://example.com/assets/{name}", namespace=ns, idType="IRI")
+    _aas(asset, "kind", "Instance", namespace=ns)
+    submodel = _aas(_aas(root, "submodels", namespace=ns), "submodel", namespace=ns)
+    _aas(submodel, "idShort", "Capabilities", namespace=ns)
+    _aas(submodel, "identification", f"https://example.com/submodels/{name}/Capabilities", namespace=ns, idType="IRI")
+    elements = _aas(submodel, "submodelElements", namespace=ns)
+    for number in range(1, capabilities + 1):
+        capability = _aas(_aas(elements, "submodelElement", namespace=ns), "capability", namespace=ns)
+        _aas(capability, "idShort", f"Capability{number:04d}", namespace=ns)
+        keys = _aas(_aas(capability, "semanticId", namespace=ns), "keys", namespace=ns)
+        _aas(keys, "key", CAPABILITY_IRI.format(number=number), namespace=ns, type="ConceptDescription", local="false", idType="IRI")
+    ET.register_namespace("aas", ns)
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def generate_aas_v3_xml(capabilities: int, properties_per_capability: int = 2, name: str = "GeneratedAAS") -> bytes:
+    """An AAS v3 environment with a CapabilityDescription submodel, as read by
+    parse_capabilities_robust_from_bytes, holding the given number of capabilities, each
+    with properties_per_capability range properties."""
+    root = ET.Element(f"{{{AAS_V3_NAMESPACE}}}environment")
+    shell = _aas(_aas(root, "assetAdministrationShells"), "assetAdministrationShell")
+    _aas(shell, "idShort", name)
+    _aas(shell, "id", f"https://example.com/aas/{name}")
+    asset_information = _aas(shell, "assetInformation")
+    _aas(asset_information, "assetKind", "Instance")
+    _aas(asset_information, "globalAssetId", f"https://example.com/assets/{name}")
+    submodel_id = f"https://example.com/submodels/{name}/CapabilityDescription"
+    _aas_v3_reference(_aas(shell, "submodels"), "reference", submodel_id, "ModelReference", "Submodel")
+
+    submodel = _aas(_aas(root, "submodels"), "submodel")
+    _aas(submodel, "idShort", "CapabilityDescription")
+    _aas(submodel, "id", submodel_id)
+    # the parser recognises elements by their first value, so semanticIds come first
+    _aas_v3_reference(submodel, "semanticId", f"{CAPABILITY_DESCRIPTION}1/0/Submodel")
+    capability_set = _aas(_aas(submodel, "submodelElements"), "submodelElementCollection")
+    _aas(capability_set, "idShort", "CapabilitySet")
+    _aas_v3_reference(capability_set, "semanticId", f"{CAPABILITY_DESCRIPTION}CapabilitySet/1/0")
+    containers = _aas(capability_set, "value")
+    for number in range(1, capabilities + 1):
+        container = _aas(containers, "submodelElementCollection")
+        _aas(container, "idShort", f"CapabilityContainer{number:04d}")
+        _aas_v3_reference(container, "semanticId", f"{CAPABILITY_DESCRIPTION}CapabilityContainer/1/0")
+        container_value = _aas(container, "value")
+        capability = _aas(container_value, "capability")
+        _aas(capability, "idShort", f"Capability{number:04d}")
+        _aas_v3_reference(capability, "semanticId", f"{CAPABILITY_DESCRIPTION}Capability/1/0")
+        _aas_v3_reference(_aas(capability, "supplementalSemanticIds"), "reference", CAPABILITY_IRI.format(number=number))
+        comment = _aas(container_value, "multiLanguageProperty")
+        _aas(comment, "idShort", "Comment")
+        _aas_v3_reference(comment, "semanticId", f"{CAPABILITY_DESCRIPTION}Comment/1/0")
+        comment_text = _aas(_aas(comment, "value"), "langStringTextType")
+        _aas(comment_text, "language", "en")
+        _aas(comment_text, "text", f"Generated capability {number}")
+        property_set = _aas(container_value, "submodelElementCollection")
+        _aas(property_set, "idShort", "PropertySet")
+        _aas_v3_reference(property_set, "semanticId", f"{CAPABILITY_DESCRIPTION}PropertySet/1/0")
+        property_containers = _aas(property_set, "value")
+        for property_number in range(1, properties_per_capability + 1):
+            property_container = _aas(property_containers, "submodelElementCollection")
+            _aas(property_container, "idShort", f"PropertyContainer{property_number}")
+            _aas_v3_reference(property_container, "semanticId", f"{CAPABILITY_DESCRIPTION}PropertyContainer/1/0")
+            value_range = _aas(_aas(property_container, "value"), "range")
+            _aas(value_range, "idShort", f"Property{property_number}")
+            _aas_v3_reference(
+                _aas(value_range, "supplementalSemanticIds"),
+                "reference",
+                f"http://www.example.com/properties#Property{property_number}",
+            )
+            _aas(value_range, "valueType", "xs:double")
+            _aas(value_range, "min", "0")
+            _aas(value_range, "max", str(10 * property_number))
+    ET.register_namespace("", AAS_V3_NAMESPACE)
+    return ET.tostring(root, encoding="utf-8", xml_declaration=True)
+
+
+def build_general_recipe_xml(process_elements: int) -> str:
+    """A valid General Recipe whose process elements form a chain and carry capability IRIs."""
+    elements = []
+    links = []
+    for number in range(1, process_elements + 1):
+        elements.append(f"""
+    <b2mml:ProcessElement>
+      <b2mml:ID>PE{number:05d}</b2mml:ID>
+      <b2mml:Description>Process step {number}</b2mml:Description>
+      <b2mml:ProcessElementType>Process Operation</b2mml:ProcessElementType>
+      <b2mml:OtherInformation>
+        <b2mml:OtherInfoID>SemanticDescription</b2mml:OtherInfoID>
+        <b2mml:OtherValue>
+          <b2mml:ValueString>{CAPABILITY_IRI.format(number=number % 50)}</b2mml:ValueString>
+        </b2mml:OtherValue>
+      </b2mml:OtherInformation>
+    </b2mml:ProcessElement>""")
+        if number > 1:
+            links.append(f"""
+    <b2mml:DirectedLink>
+      <b2mml:ID>L{number:05d}</b2mml:ID>
+      <b2mml:FromID>PE{number - 1:05d}</b2mml:FromID>
+      <b2mml:ToID>PE{number:05d}</b2mml:ToID>
+    </b2mml:DirectedLink>""")
+    return f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<b2mml:GRecipe xmlns:b2mml="{B2MML_NAMESPACE}">
+  <b2mml:ID>GeneratedRecipe</b2mml:ID>
+  <b2mml:Description>Generated recipe with {process_elements} process elements</b2mml:Description>
+  <b2mml:GRecipeType>General</b2mml:GRecipeType>
+  <b2mml:ProcessProcedure>
+    <b2mml:ID>Procedure1</b2mml:ID>
+    <b2mml:Description>This is the top level ProcessElement</b2mml:Description>
+    <b2mml:ProcessElementType>Process</b2mml:ProcessElementType>{"".join(links)}{"".join(elements)}
+  </b2mml:ProcessProcedure>
+</b2mml:GRecipe>
+"""
+
+
+def build_material_information_xml(materials: int) -> str:
+    definitions = "".join(
+        f"""
+  <b2mml:MaterialDefinition>
+    <b2mml:ID>Material{number:05d}</b2mml:ID>
+    <b2mml:Description>Generated material {number}</b2mml:Description>
+  </b2mml:MaterialDefinition>"""
+        for number in range(1, materials + 1)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<b2mml:MaterialInformation xmlns:b2mml="{B2MML_NAMESPACE}">{definitions}
+</b2mml:MaterialInformation>
+"""
+
+
+def build_master_recipe_payload(operations: int, data_type: str = "temperature") -> dict:
+    """A /api/recipe/master payload with Init, the given number of operations and End, chained by transitions.
+
+    /api/recipe/master maps data types like "temperature" to their BatchML type, while
+    /mrecipe/validate expects a BatchML data type such as "Measure".
+    """
+    step_ids = ["Init"] + [f"{number:03d}:Proc" for number in range(1, operations + 1)] + ["End"]
+    steps = [
+        {"b2mml:ID": f"S{position}", "b2mml:RecipeElementID": element_id, "b2mml:RecipeElementVersion": "", "b2mml:Description": element_id}
+        for position, element_id in enumerate(step_ids, start=1)
+    ]
+    transitions = []
+    links = []
+    for position in range(1, len(step_ids)):
+        transition_id = f"T{position}"
+        transitions.append({"b2mml:ID": transition_id, "b2mml:Condition": "True", "b2mml:Description": "True transition"})
+        for link_number, (from_id, from_type, to_id, to_type) in enumerate(
+            ((f"S{position}", "Step", transition_id, "Transition"), (transition_id, "Transition", f"S{position + 1}", "Step"))
+        ):
+            links.append({
+                "b2mml:ID": f"L{position}_{link_number}",
+                "b2mml:FromID": {"b2mml:FromIDValue": from_id, "b2mml:FromType": from_type, "b2mml:IDScope": "External"},
+                "b2mml:ToID": {"b2mml:ToIDValue": to_id, "b2mml:ToType": to_type, "b2mml:IDScope": "External"},
+                "b2mml:LinkType": "ControlLink",
+                "b2mml:Depiction": "LineAndArrow",
+                "b2mml:EvaluationOrder": "1",
+            })
+    recipe_elements = [{"b2mml:ID": "Init", "b2mml:Description": "Init", "b2mml:RecipeElementType": "Begin"}]
+    recipe_elements += [
+        {
+            "b2mml:ID": element_id,
+            "b2mml:Description": f"Operation {element_id}",
+            "b2mml:RecipeElementType": "Operation",
+            "b2mml:ActualEquipmentID": "EQ-1",
+            "b2mml:Parameter": [
+                {"b2mml:ID": f"{element_id}:Param", "b2mml:Description": "Temperature", "b2mml:ParameterType": "ProcessParameter", "b2mml:ParameterSubType": "ST"}
+            ],
+        }
+        for element_id in step_ids[1:-1]
+    ]
+    recipe_elements.append({"b2mml:ID": "End", "b2mml:Description": "End", "b2mml:RecipeElementType": "End"})
+    return {
+        "listHeader": {"id": "ListHeader001", "createDate": "2026-01-01T00:00:00Z"},
+        "description": "Generated batch information",
+        "masterRecipe": {
+            "id": "MasterRecipe001",
+            "version": "1.0.0",
+            "versionDate": "2026-01-01T00:00:00Z",
+            "description": f"Generated master recipe with {operations} operations",
+            "header": {"productId": "Product001", "productName": "Generated Product"},
+            "formula": {
+                "description": "Formula",
+                "parameter": [
+                    {
+                        "b2mml:ID": f"{element_id}:Param",
+                        "b2mml:Description": "Temperature",
+                        "b2mml:ParameterType": "ProcessParameter",
+                        "b2mml:ParameterSubType": "ST",
+                        "b2mml:Value": {"b2mml:ValueString": "80", "b2mml:DataInterpretation": "Constant", "b2mml:DataType": data_type, "b2mml:UnitOfMeasure": "C"},
+                    }
+                    for element_id in step_ids[1:-1]
+                ],
+                "material": [],
+            },
+            "procedureLogic": {"link": links, "step": steps, "transition": transitions},
+            "recipeElement": recipe_elements,
+        },
+        "equipmentElement": [
+            {
+                "b2mml:ID": "EQ-1",
+                "b2mml:Description": "Generated equipment",
+                "b2mml:EquipmentElementType": "Other",
+                "b2mml:EquipmentElementLevel": "EquipmentModule",
+                "b2mml:EquipmentProceduralElement": [],
+                "b2mml:EquipmentConnection": [],
+            }
+        ],
+    }
+
+
+def build_master_recipe_xml(operations: int) -> str:
+    """The BatchML of build_master_recipe_payload, as created by /api/recipe/master."""
+    from RecipeAPI import convert_enhanced_json_to_batchml_xml
+
+    # the conversion prints its input
+    with contextlib.redirect_stdout(io.StringIO()):
+        return convert_enhanced_json_to_batchml_xml(build_master_recipe_payload(operations))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="kind", required=True)
+    mtp = subparsers.add_parser("mtp", help="an MTP AML file")
+    mtp.add_argument("--instances", type=int, default=100)
+    mtp.add_argument("--services", type=int, default=5)
+    mtp.add_argument("--procedures", type=int, default=2, help="procedures per service")
+    mtp.add_argument("--parameters", type=int, default=2, help="parameters per procedure")
+    mtp.add_argument("--interfaces", type=int, default=4, help="ExternalInterfaces per instance")
+    mtp.add_argument("--name", default="GeneratedPEA")
+    mtp.add_argument("--seed", type=int, default=0)
+    aas = subparsers.add_parser("aas", help="an AAS environment")
+    aas.add_argument("--version", type=int, choices=(2, 3), default=3)
+    aas.add_argument("--capabilities", type=int, default=10)
+    aas.add_argument("--properties", type=int, default=2, help="properties per capability (v3 only)")
+    aas.add_argument("--name", default="GeneratedAAS")
+    for kind, help_text in (("grecipe", "a General Recipe"), ("mrecipe", "a Master Recipe (BatchInformation)")):
+        recipe = subparsers.add_parser(kind, help=help_text)
+        recipe.add_argument("--size", type=int, default=10, help="number of process elements or operations")
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("-o", "--output", help="file to write, standard output by default")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.kind == "mtp":
+        content = generate_mtp_aml(
+            args.instances, args.services, args.procedures, args.parameters, args.interfaces, args.name, args.seed
+        )
+    elif args.kind == "aas":
+        if args.version == 2:
+            content = generate_aas_v2_xml(args.capabilities, args.name)
+        else:
+            content = generate_aas_v3_xml(args.capabilities, args.properties, args.name)
+    elif args.kind == "grecipe":
+        content = build_general_recipe_xml(args.size).encode("utf-8")
+    else:
+        content = build_master_recipe_xml(args.size).encode("utf-8")
+    if args.output:
+        with open(args.output, "wb") as output:
+            output.write(content)
+    else:
+        sys.stdout.buffer.write(content)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Content-addressed storage of uploaded files and of the artifacts derived from them.
+
+Every upload directory keeps its store in a ``.blobs`` subdirectory:
+
+    .blobs/objects/<sha256[:2]>/<sha256>   uploaded contents, named by their SHA-256
+    .blobs/derived/<sha256><suffix>        artifacts derived from a content, such as PEA
+                                           snapshots and ontology class trees
+    .blobs/catalogue.sqlite3               file names, their hashes and the metadata of
+                                           the contents (see uploadCatalogue)
+
+Uploaded files keep their names in the upload directory as hard links to their object
+(copies where hard links are not supported), so identical uploads under different
+names are stored once, and everything derived from them is built once and shared.
+As the names of one content share an inode, objects are made read-only: a name is
+rewritten by storing the new content under it, which replaces the link and leaves
+the other names alone, never by writing into the file.
+Files that got into the directory by other means are hashed on first use and
+catalogued. A catalogue entry is trusted while the file's size and mtime are
+unchanged. An object and its derived artifacts are deleted once no catalogued name
+refers to them any more.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from uploadCatalogue import CatalogueTransaction, UploadCatalogue, utc_timestamp
+
+BLOB_DIRECTORY = ".blobs"
+CATALOGUE_NAME = "catalogue.sqlite3"
+HASH_CHUNK_SIZE = 1024 * 1024
+OBJECT_MODE = 0o444
+
+logger = logging.getLogger(__name__)
+
+# One lock per store directory, shared by all BlobStore objects of that directory.
+# The catalogue's transactions order writers across processes; the lock keeps the
+# threads of one process from racing on the same object and link files.
+_store_locks = {}
+_store_locks_lock = threading.Lock()
+# Directories whose catalogue a background thread of this process is refreshing.
+_refreshing = {}
+
+
+def hash_file(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_signature(stat_result) -> dict:
+    return {"size": stat_result.st_size, "mtime_ns": stat_result.st_mtime_ns}
+
+
+class BlobStore:
+    """The store of one upload directory."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory).resolve()
+        self.root = self.directory / BLOB_DIRECTORY
+        self.catalogue = UploadCatalogue(self.root / CATALOGUE_NAME)
+        with _store_locks_lock:
+            self._lock = _store_locks.setdefault(str(self.directory), threading.RLock())
+
+    @classmethod
+    def for_file(cls, path) -> "BlobStore":
+        return cls(Path(path).resolve().parent)
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def derived_path(self, digest: str, suffix: str) -> Path:
+        return self.root / "derived" / f"{digest}{suffix}"
+
+    def save(self, stream, name: str) -> tuple[Path, str]:
+        """Stores the contents of a binary stream under name, hashing it while writing."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".upload")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while chunk := stream.read(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+            return self._commit(Path(temp_path), digest.hexdigest(), name)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    def add_file(self, source_path, name: str, digest: str | None = None) -> tuple[Path, str]:
+        """Moves a file that is already on disk into the store under name.
+
+        digest is the file's SHA-256 if the caller knows it already, e.g. from hashing it while receiving it.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        digest = digest or hash_file(source_path)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".upload")
+        os.close(fd)
+        try:
+            shutil.move(os.fspath(source_path), temp_path)
+            return self._commit(Path(temp_path), digest, name)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+
+    def content_hash(self, path) -> str:
+        """SHA-256 of a file in the upload directory, from the catalogue while it is current."""
+        path = Path(path)
+        stat_result = os.stat(path)
+        entry = self.catalogue.file(path.name)
+        if entry is not None and entry["size"] == stat_result.st_size and entry["mtime_ns"] == stat_result.st_mtime_ns:
+            return entry["hash"]
+
+        digest = hash_file(path)
+        with self._lock, self.catalogue.transaction() as tx:
+            previous = tx.file(path.name)
+            tx.put_file(path.name, digest, stat_result)
+            if previous is not None and previous["hash"] != digest:
+                self._collect(tx, previous["hash"])
+        return digest
+
+    def lookup(self, name: str) -> str | None:
+        """The catalogued hash of name, without checking or hashing the file."""
+        entry = self.catalogue.file(name)
+        return entry["hash"] if entry is not None else None
+
+    def describe(self, path, describe, force: bool = False) -> None:
+        """Records the metadata describe(path) extracts from a file's content in the catalogue.
+
+        Contents that are described already are skipped unless force is set. An exception
+        raised by describe marks the content as failing to parse.
+        """
+        digest = self.content_hash(path)
+        if not force and self.catalogue.is_described(digest):
+            return
+        try:
+            metadata = {"parse_status": "ok", **describe(path)}
+        except Exception as exc:
+            metadata = {"parse_status": "error", "parse_error": str(exc)}
+        self.catalogue.describe(digest, metadata)
+
+    def refresh_in_background(self, suffixes: tuple, describe) -> bool:
+        """Runs refresh on a daemon thread, unless one is already running for this directory.
+
+        Listings call this and answer from the catalogue right away, so a request never
+        waits for files to be hashed or parsed; files show up once scanned, with the parse
+        status "pending" until they are described. Returns whether a thread was started.
+        """
+        key = str(self.directory)
+
+        def run():
+            try:
+                self.refresh(suffixes, describe)
+            except Exception:
+                logger.exception("Refreshing the catalogue of %s failed", self.directory)
+            finally:
+                with _store_locks_lock:
+                    _refreshing.pop(key, None)
+
+        with _store_locks_lock:
+            if key in _refreshing:
+                return False
+            thread = _refreshing[key] = threading.Thread(
+                target=run, name=f"catalogue-refresh-{self.directory.name}", daemon=True
+            )
+            thread.start()
+        return True
+
+    def wait_for_refresh(self, timeout: float | None = None) -> None:
+        """Waits for the background refresh of this directory, if one is running."""
+        with _store_locks_lock:
+            thread = _refreshing.get(str(self.directory))
+        if thread is not None:
+            thread.join(timeout)
+
+    def refresh(self, suffixes: tuple, describe) -> None:
+        """Brings the catalogue up to date with the directory, at startup or in the background.
+
+        The directory is only rescanned when its mtime has changed since the last scan;
+        files that are not catalogued yet are hashed and described, and names whose
+        files have gone are forgotten.
+        """
+        directory_mtime = os.stat(self.directory).st_mtime_ns
+        if self.catalogue.get_state("scanned_mtime_ns") != directory_mtime:
+            on_disk = {entry.name for entry in os.scandir(self.directory) if entry.is_file()}
+            catalogued = self.catalogue.names()
+            for name in catalogued - on_disk:
+                self.forget(name)
+            for name in sorted(on_disk - catalogued):
+                if name.endswith(suffixes) and not name.startswith("."):
+                    try:
+                        self.content_hash(self.directory / name)
+                    except FileNotFoundError:
+                        pass
+            self.catalogue.set_state("scanned_mtime_ns", directory_mtime)
+
+        for name in self.catalogue.undescribed(suffixes):
+            try:
+                self.describe(self.directory / name, describe)
+            except FileNotFoundError:
+                self.forget(name)
+
+    def write_derived(self, digest: str, suffix: str, data: bytes) -> Path:
+        path = self.derived_path(digest, suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            Path(temp_path).unlink(missing_ok=True)
+            raise
+        return path
+
+    def forget(self, name: str) -> None:
+        """Removes name from the catalogue, deleting its object and derived artifacts if unused."""
+        with self._lock, self.catalogue.transaction() as tx:
+            digest = tx.remove_file(name)
+            if digest is not None:
+                self._collect(tx, digest)
+
+    def _commit(self, temp_path: Path, digest: str, name: str) -> tuple[Path, str]:
+        object_path = self.object_path(digest)
+        object_path.parent.mkdir(parents=True, exist_ok=True)
+        target = self.directory / name
+        with self._lock, self.catalogue.transaction() as tx:
+            recorded = tx.object_signature(digest)
+            if object_path.exists() and self._object_is_intact(object_path, digest, recorded):
+                temp_path.unlink()
+            else:
+                os.replace(temp_path, object_path)
+            if object_path.stat().st_mode & 0o777 != OBJECT_MODE:
+                os.chmod(object_path, OBJECT_MODE)
+            tx.set_object_signature(digest, object_path.stat())
+
+            link_path = target.with_name(f".{target.name}.{os.getpid()}.link")
+            try:
+                os.link(object_path, link_path)
+            except OSError:
+                shutil.copyfile(object_path, link_path)
+            os.replace(link_path, target)
+
+            previous = tx.file(name)
+            tx.put_file(name, digest, target.stat(), uploaded=utc_timestamp())
+            if previous is not None and previous["hash"] != digest:
+                self._collect(tx, previous["hash"])
+        return target, digest
+
+    def _object_is_intact(self, object_path: Path, digest: str, recorded: dict | None) -> bool:
+        # Objects are read-only, but a process that may ignore that (such as root) can
+        # still write into a named file in place, and so into its object.
+        if recorded is not None and recorded == _file_signature(object_path.stat()):
+            return True
+        return hash_file(object_path) == digest
+
+    def _collect(self, tx: CatalogueTransaction, digest: str) -> None:
+        if tx.is_referenced(digest):
+            return
+        tx.remove_content(digest)
+        self.object_path(digest).unlink(missing_ok=True)
+        derived_dir = self.root / "derived"
+        if derived_dir.is_dir():
+            for path in derived_dir.glob(f"{digest}*"):
+                path.unlink(missing_ok=True)
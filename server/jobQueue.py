@@ -0,0 +1,555 @@
+"""Background jobs for requests that take too long to wait for.
+
+Ontology conversion, AAS compliance checks, large MTP parses, batch parsing and
+recipe validation run inline in the request thread. Views decorated with
+@background_job can instead be called with ``?async=1``: the request body is spooled
+to a temporary file, the request is queued as a job, and the client gets
+``202 Accepted`` with the job's URL in Location. A worker thread later dispatches the
+request through the app as if it had just arrived, and keeps the response:
+
+    GET    /jobs                all jobs, newest first
+    GET    /jobs/<id>           status of a job
+    GET    /jobs/<id>/result    the response of a finished job, as the endpoint sent it
+    DELETE /jobs/<id>           cancels a job
+
+The queue is bounded by JOB_QUEUE_MAX_SIZE (a full queue answers 503) and ordered by
+priority, lowest first, then by submission, and run on JOB_THREAD_WORKERS threads.
+A re-dispatched request needs the app and so runs on its thread, but the views hand
+their CPU-bound, picklable work to the process pool given to install_background_jobs
+with run_in_job_process, so that jobs do not compete for the GIL of the process
+serving requests. Picklable functions can also be queued to run there directly with
+submit(..., executor="process").
+Finished jobs and their results are dropped JOB_RESULT_TTL_SECONDS after they
+finished.
+
+A job runs in the server process that accepted it, but its status and response are
+kept in an SQLite store in JOB_ROOT, next to the spooled request bodies. When the
+production server runs several worker processes sharing one socket, a client polling
+/jobs/<id> can therefore reach any of them. Jobs of a worker process that exited are
+reported as failed.
+"""
+from __future__ import annotations
+
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+from urllib.parse import parse_qsl, urlencode
+import atexit
+import heapq
+import itertools
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from flask import current_app, jsonify, request, url_for
+
+from streamingUploads import limit_request_body
+
+
+JOB_QUEUE_MAX_SIZE = 64
+JOB_THREAD_WORKERS = 2
+JOB_RESULT_TTL_SECONDS = 600
+DEFAULT_JOB_PRIORITY = 10
+BATCH_JOB_PRIORITY = 20
+JOB_RETRY_AFTER_SECONDS = 5
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATUSES = (DONE, FAILED, CANCELLED)
+
+# Request headers that would make the stored response depend on the client fetching it.
+DROPPED_REQUEST_HEADERS = ("HTTP_ACCEPT_ENCODING", "HTTP_IF_NONE_MATCH", "HTTP_IF_MODIFIED_SINCE", "HTTP_TRANSFER_ENCODING")
+# Response headers not replayed from a stored response.
+DROPPED_RESPONSE_HEADERS = {"content-length", "transfer-encoding", "connection"}
+SPOOL_CHUNK_SIZE = 1024 * 1024
+JOB_STORE_NAME = "jobs.sqlite3"
+JOB_SPOOL_SUFFIX = ".request"
+# Set in the WSGI environ of requests dispatched by a job worker.
+JOB_ENVIRON_KEY = "recipe_editor.background_job"
+
+logger = logging.getLogger(__name__)
+
+
+JOB_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    owner_pid INTEGER NOT NULL,
+    submitted REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    response_status INTEGER,
+    response_headers TEXT,
+    response_body BLOB
+);
+CREATE INDEX IF NOT EXISTS jobs_by_finished ON jobs (finished);
+"""
+_initialised = set()
+_initialised_lock = threading.Lock()
+JOB_COLUMNS = "id, name, priority, status, submitted, started, finished, cancel_requested, error, response_status"
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+@dataclass
+class StoredResponse:
+    status: int
+    headers: list
+    body: bytes
+
+
+@dataclass(frozen=True)
+class Job:
+    """A job's state, as kept in the job store."""
+
+    id: str
+    name: str
+    priority: int
+    status: str
+    submitted: float
+    started: float | None = None
+    finished: float | None = None
+    cancel_requested: bool = False
+    error: str | None = None
+    response_status: int | None = None
+
+    def to_dict(self) -> dict:
+        job = {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "priority": self.priority,
+            "submitted": _timestamp(self.submitted),
+            "started": _timestamp(self.started),
+            "finished": _timestamp(self.finished),
+        }
+        if self.cancel_requested and self.status == RUNNING:
+            job["cancel_requested"] = True
+        if self.error is not None:
+            job["error"] = self.error
+        if self.response_status is not None:
+            job["response_status"] = self.response_status
+        return job
+
+
+@dataclass(eq=False)
+class PendingJob:
+    """A job waiting in the queue of the process that accepted it."""
+
+    id: str
+    function: Callable
+    args: tuple
+    cleanup: Callable | None
+    executor: str = "thread"
+
+
+def _timestamp(seconds: float | None) -> str | None:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat() if seconds is not None else None
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite store of the status and responses of jobs, shared by the server's processes."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def add(self, job_id: str, name: str, priority: int) -> Job:
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO jobs (id, name, priority, status, owner_pid, submitted) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, name, priority, QUEUED, os.getpid(), time.time()),
+            )
+            return self._get(db, job_id)
+
+    def start(self, job_id: str) -> bool:
+        """Marks a queued job as running; False if it has been cancelled meanwhile."""
+        with self._transaction() as db:
+            cursor = db.execute(
+                "UPDATE jobs SET status = ?, started = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED),
+            )
+            return cursor.rowcount == 1
+
+    def finish(self, job_id: str, response: StoredResponse | None, error: str | None) -> None:
+        """Records the outcome of a running job; the outcome of a cancelled one is discarded."""
+        with self._transaction() as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            if row["cancel_requested"]:
+                status, response, error = CANCELLED, None, None
+            else:
+                status = FAILED if error is not None else DONE
+            db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ?, response_status = ?, response_headers = ?,"
+                " response_body = ? WHERE id = ?",
+                (
+                    status,
+                    time.time(),
+                    error,
+                    response.status if response is not None else None,
+                    json.dumps(response.headers) if response is not None else None,
+                    response.body if response is not None else None,
+                    job_id,
+                ),
+            )
+
+    def cancel(self, job_id: str) -> Job | None:
+        """Cancels a queued job right away; a running job is flagged to have its result discarded."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, finished = ?, cancel_requested = 1 WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+            db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+            return self._get(db, job_id)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._transaction(write=False) as db:
+            return self._get(db, job_id)
+
+    def jobs(self) -> list[Job]:
+        """All jobs, newest first."""
+        with self._transaction(write=False) as db:
+            rows = db.execute(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY submitted DESC").fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def response(self, job_id: str) -> StoredResponse | None:
+        with self._transaction(write=False) as db:
+            row = db.execute(
+                "SELECT response_status, response_headers, response_body FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None or row["response_status"] is None:
+            return None
+        return StoredResponse(
+            row["response_status"], [tuple(header) for header in json.loads(row["response_headers"])],
+            row["response_body"],
+        )
+
+    def expire(self, finished_before: float) -> None:
+        """Drops jobs finished before the given time, and fails the unfinished jobs of exited processes."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM jobs WHERE finished < ?", (finished_before,))
+            owners = [row["owner_pid"] for row in db.execute(
+                "SELECT DISTINCT owner_pid FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            )]
+            for pid in owners:
+                if pid != os.getpid() and not _is_process_alive(pid):
+                    db.execute(
+                        "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE owner_pid = ? AND status IN (?, ?)",
+                        (FAILED, time.time(), "The server process running the job exited", pid, QUEUED, RUNNING),
+                    )
+
+    def _get(self, db, job_id: str) -> Job | None:
+        row = db.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_from_row(row) if row is not None else None
+
+    @contextmanager
+    def _transaction(self, write: bool = True):
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        key = str(self.path)
+        fresh = key not in _initialised or not self.path.exists()
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        if fresh:
+            with _initialised_lock:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(JOB_SCHEMA)
+                _initialised.add(key)
+        return connection
+
+
+def _job_from_row(row) -> Job:
+    return Job(**{**dict(row), "cancel_requested": bool(row["cancel_requested"])})
+
+
+class JobQueue:
+    """A bounded priority queue of this process's jobs, run by worker threads started on
+    first use. Their state is kept in store, where every process can read and cancel it."""
+
+    def __init__(self, store: JobStore, max_size=JOB_QUEUE_MAX_SIZE, thread_workers=JOB_THREAD_WORKERS,
+                 result_ttl=JOB_RESULT_TTL_SECONDS, process_pool: Callable[[], Executor] | None = None):
+        self.store = store
+        self.max_size = max_size
+        self.thread_workers = thread_workers
+        self.result_ttl = result_ttl
+        self.process_pool = process_pool
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._closed = False
+
+    def submit(self, function: Callable, *args, name: str | None = None, priority: int = DEFAULT_JOB_PRIORITY,
+               executor: str = "thread", cleanup: Callable | None = None) -> Job:
+        """Queues function(*args), whose StoredResponse is kept; other return values are not.
+        With executor="process", the call runs on the process pool and function and args
+        must be picklable. cleanup() is called once the job has finished or was cancelled.
+        Raises JobQueueFull when max_size jobs are waiting in this process."""
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+        if executor == "process" and self.process_pool is None:
+            raise ValueError("The job queue has no process pool")
+        self._expire()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The job queue has been shut down")
+            if len(self._heap) >= self.max_size:
+                raise JobQueueFull()
+            job = self.store.add(uuid.uuid4().hex, name or getattr(function, "__name__", "job"), priority)
+            pending = PendingJob(job.id, function, args, cleanup, executor)
+            heapq.heappush(self._heap, (priority, next(self._sequence), pending))
+            self._start_workers()
+            self._condition.notify()
+            return job
+
+    def get(self, job_id: str) -> Job | None:
+        self._expire()
+        return self.store.get(job_id)
+
+    def jobs(self) -> list[Job]:
+        """All jobs of all processes, newest first."""
+        self._expire()
+        return self.store.jobs()
+
+    def response(self, job_id: str) -> StoredResponse | None:
+        return self.store.response(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """Cancels a job. A queued job never runs; the result of a running job is
+        discarded when it finishes, as threads cannot be interrupted."""
+        job = self.store.cancel(job_id)
+        if job is None or job.status != CANCELLED:
+            return job
+        with self._condition:
+            pending = [entry[2] for entry in self._heap if entry[2].id == job_id]
+            if pending:
+                self._heap = [entry for entry in self._heap if entry[2].id != job_id]
+                heapq.heapify(self._heap)
+        for entry in pending:
+            self._clean_up(entry)
+        return job
+
+    def shutdown(self) -> None:
+        """Stops the workers once their current jobs are done; queued jobs are cancelled."""
+        with self._condition:
+            self._closed = True
+            queued = [entry[2] for entry in self._heap]
+            self._heap = []
+            self._condition.notify_all()
+        for pending in queued:
+            self.store.cancel(pending.id)
+            self._clean_up(pending)
+
+    def _start_workers(self) -> None:
+        while len(self._workers) < self.thread_workers:
+            worker = threading.Thread(target=self._work, name=f"job-worker-{len(self._workers)}", daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def _expire(self) -> None:
+        self.store.expire(time.time() - self.result_ttl)
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._heap and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                pending = heapq.heappop(self._heap)[2]
+
+            if self.store.start(pending.id):
+                response = error = None
+                try:
+                    if pending.executor == "process":
+                        response = self.process_pool().submit(pending.function, *pending.args).result()
+                    else:
+                        response = pending.function(*pending.args)
+                    if not isinstance(response, StoredResponse):
+                        response = None
+                except Exception as e:
+                    logger.exception("Job %s failed", pending.id)
+                    error = str(e) or type(e).__name__
+                self.store.finish(pending.id, response, error)
+            self._clean_up(pending)
+
+    def _clean_up(self, pending: PendingJob) -> None:
+        cleanup, pending.cleanup = pending.cleanup, None
+        pending.function = pending.args = None
+        if cleanup is not None:
+            try:
+                cleanup()
+            except OSError:
+                logger.exception("Cleaning up after job %s failed", pending.id)
+
+
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue(app) -> JobQueue:
+    """Returns the app's job queue, creating it on first use."""
+    with _job_queue_lock:
+        queue = app.extensions.get("job_queue")
+        if queue is None:
+            queue = JobQueue(
+                JobStore(Path(app.config["JOB_ROOT"]) / JOB_STORE_NAME),
+                max_size=app.config["JOB_QUEUE_MAX_SIZE"],
+                thread_workers=app.config["JOB_THREAD_WORKERS"],
+                result_ttl=app.config["JOB_RESULT_TTL_SECONDS"],
+                process_pool=app.extensions.get("job_process_pool"),
+            )
+            app.extensions["job_queue"] = queue
+            atexit.register(queue.shutdown)
+        return queue
+
+
+def background_job(priority: int = DEFAULT_JOB_PRIORITY):
+    """Lets the decorated view be run as a background job by calling it with ?async=1."""
+    def decorator(view):
+        view.background_job_priority = priority
+        return view
+    return decorator
+
+
+def is_async_requested() -> bool:
+    return request.args.get("async") in ("1", "true")
+
+
+def is_background_job() -> bool:
+    """Whether the current request is a background job re-dispatched by the job queue."""
+    return request.environ.get(JOB_ENVIRON_KEY, False)
+
+
+def run_in_job_process(function: Callable, *args, **kwargs):
+    """Returns function(*args, **kwargs), computed on the job queue's process pool when the
+    current request is a background job, so the job does not hold this process's GIL.
+    function, its arguments and its result must be picklable."""
+    process_pool = current_app.extensions.get("job_process_pool")
+    if process_pool is None or not is_background_job():
+        return function(*args, **kwargs)
+    return process_pool().submit(function, *args, **kwargs).result()
+
+
+def spool_request(spool_directory) -> tuple[dict, str]:
+    """A copy of the request's WSGI environ without ?async, and its body spooled to a file in spool_directory."""
+    limit_request_body()
+    Path(spool_directory).mkdir(parents=True, exist_ok=True)
+    fd, body_path = tempfile.mkstemp(dir=spool_directory, suffix=JOB_SPOOL_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as body:
+            shutil.copyfileobj(request.stream, body, SPOOL_CHUNK_SIZE)
+            size = body.tell()
+    except BaseException:
+        os.remove(body_path)
+        raise
+    environ = {
+        key: value for key, value in request.environ.items()
+        if isinstance(value, (str, bool, int, tuple)) and key not in DROPPED_REQUEST_HEADERS
+    }
+    query = [(key, value) for key, value in parse_qsl(environ.get("QUERY_STRING", ""), keep_blank_values=True)
+             if key != "async"]
+    environ["QUERY_STRING"] = urlencode(query)
+    environ["CONTENT_LENGTH"] = str(size)
+    return environ, body_path
+
+
+def run_request_job(app, environ: dict, body_path: str) -> StoredResponse:
+    """Dispatches a spooled request through the app and returns its complete response."""
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"], started["headers"] = status, headers
+
+    with open(body_path, "rb") as body:
+        iterable = app.wsgi_app({**environ, "wsgi.input": body, "wsgi.errors": sys.stderr, JOB_ENVIRON_KEY: True}, start_response)
+        try:
+            content = b"".join(iterable)
+        finally:
+            if hasattr(iterable, "close"):
+                iterable.close()
+    headers = [(name, value) for name, value in started["headers"] if name.lower() not in DROPPED_RESPONSE_HEADERS]
+    return StoredResponse(int(started["status"].split(" ", 1)[0]), headers, content)
+
+
+def submit_request_job():
+    """before_request hook queueing ?async=1 requests to views decorated with @background_job."""
+    if not is_async_requested() or request.endpoint is None:
+        return None
+    view = current_app.view_functions[request.endpoint]
+    priority = getattr(view, "background_job_priority", None)
+    if priority is None:
+        return jsonify({"error": f"{request.path} cannot be run as a background job"}), 400
+
+    environ, body_path = spool_request(current_app.config["JOB_ROOT"])
+    app = current_app._get_current_object()
+    try:
+        job = get_job_queue(app).submit(
+            run_request_job, app, environ, body_path,
+            name=f"{request.method} {request.path}",
+            priority=priority,
+            cleanup=lambda: os.remove(body_path),
+        )
+    except JobQueueFull:
+        os.remove(body_path)
+        response = jsonify({"error": "Too many background jobs are waiting, try again later"})
+        response.status_code = 503
+        response.headers["Retry-After"] = str(JOB_RETRY_AFTER_SECONDS)
+        return response
+    response = jsonify(job.to_dict())
+    response.status_code = 202
+    response.headers["Location"] = url_for("get_job", job_id=job.id)
+    return response
+
+
+def install_background_jobs(app, process_pool: Callable[[], Executor] | None = None) -> None:
+    """Registers the hook turning ?async=1 requests into jobs. Installed after the
+    profiling and metrics hooks, which then cover the 202 response of the submission.
+
+    process_pool returns the executor for run_in_job_process and process jobs; it is
+    only called once such work comes up.
+    """
+    app.extensions["job_process_pool"] = process_pool
+    app.before_request(submit_request_job)
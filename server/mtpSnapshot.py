@@ -0,0 +1,402 @@
+"""Compact binary snapshots of parsed PEAs.
+
+A snapshot is a derived artifact of the MTP's content in the upload directory's blob
+store (``.blobs/derived/<sha256>.peasnap``), so that stored MTPs only have to be parsed
+from XML once, however many names they are uploaded under. The layout is columnar:
+a fixed header followed by typed columns, where every string is stored once in a
+string table and referenced by index.
+
+    header   magic "PEAS", format version, reserved, source size, source SHA-256
+    column   typecode (1 byte), item count (u32), little-endian item data
+
+Snapshots whose format version or source hash do not match are ignored and rebuilt
+from the XML on the next load.
+
+This is an eager binary cache: loading a snapshot copies its columns out of the map
+and builds every Instance, Procedure and Service up front. That is what the loaded
+PEA is kept in memory for (see load_or_parse_pea), so it is paid once per content
+and process rather than per request. The source is hashed once per load, and only
+re-read when its catalogue entry is stale, i.e. the file was changed outside the
+store.
+"""
+from __future__ import annotations
+
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+import mmap
+import os
+import struct
+import sys
+import threading
+
+from blobStore import BlobStore
+from MtpApi import PARAM_ELEM_TYPES, Instance, Pea, Procedure, Service, parse_mtp_aml, pea_to_dict
+
+
+SNAPSHOT_MAGIC = b"PEAS"
+SNAPSHOT_VERSION = 4
+SNAPSHOT_SUFFIX = ".peasnap"
+
+HEADER = struct.Struct("<4sHHq32s")
+COLUMN_HEADER = struct.Struct("<cI")
+NONE_REF = 0xFFFFFFFF
+
+PARAM_ELEM_NAMES = tuple(PARAM_ELEM_TYPES)
+PARAM_ELEM_POSITIONS = {name: position for position, name in enumerate(PARAM_ELEM_NAMES)}
+
+# Loaded PEAs kept in memory by upload directory and content hash, so that their process index survives across requests.
+PEA_CACHE_MAX_ENTRIES = 16
+_loaded_peas = OrderedDict()
+_loaded_peas_lock = threading.Lock()
+# Lookup counts of the in-memory PEAs and of the snapshot files, see get_pea_cache_stats.
+_pea_cache_counts = {"hits": 0, "misses": 0, "evictions": 0, "snapshotHits": 0, "snapshotMisses": 0}
+
+INSTANCE_HAS_MIN = 1
+INSTANCE_HAS_MAX = 2
+PROCEDURE_HAS_PROC_ID = 1
+
+# Column order of the format; reading and writing both follow this table.
+COLUMNS = (
+    ("string_lengths", "I"),
+    ("string_data", "B"),
+    ("pea_strings", "I"),
+    ("pea_nsid", "q"),
+    ("inst_name", "I"),
+    ("inst_id", "I"),
+    ("inst_refid", "I"),
+    ("inst_default", "I"),
+    ("inst_unit", "I"),
+    ("inst_category", "I"),
+    ("inst_flags", "B"),
+    ("inst_min", "d"),
+    ("inst_max", "d"),
+    ("inst_param_count", "H"),
+    ("inst_param_elem", "B"),
+    ("inst_param_id", "I"),
+    ("inst_param_default", "I"),
+    ("proc_name", "I"),
+    ("proc_id", "I"),
+    ("proc_compl", "I"),
+    ("proc_service_id", "I"),
+    ("proc_flags", "B"),
+    ("proc_proc_id", "q"),
+    ("proc_param_count", "I"),
+    ("proc_params", "I"),
+    ("serv_name", "I"),
+    ("serv_id", "I"),
+    ("serv_refid", "I"),
+    ("serv_param_count", "H"),
+    ("serv_param_elem", "B"),
+    ("serv_param_id", "I"),
+    ("serv_param_default", "I"),
+    ("serv_proc_count", "I"),
+    ("serv_procs", "I"),
+    ("sensacts", "I"),
+)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def get_snapshot_path(mtp_path) -> Path:
+    """Where the snapshot of the MTP file's content is kept, shared by all files with that content."""
+    store = BlobStore.for_file(mtp_path)
+    return store.derived_path(store.content_hash(mtp_path), SNAPSHOT_SUFFIX)
+
+
+def load_or_parse_pea(mtp_path) -> Pea:
+    """Returns the PEA of a stored MTP file, from memory or from the snapshot of its content.
+
+    The returned PEA is shared between callers and must not be modified.
+    """
+    store = BlobStore.for_file(mtp_path)
+    content_hash = store.content_hash(mtp_path)
+    cache_key = (store.directory, content_hash)
+    with _loaded_peas_lock:
+        cached = _loaded_peas.get(cache_key)
+        if cached is not None:
+            _loaded_peas.move_to_end(cache_key)
+            _pea_cache_counts["hits"] += 1
+            return cached
+        _pea_cache_counts["misses"] += 1
+
+    pea = load_pea_snapshot(mtp_path, content_hash)
+    with _loaded_peas_lock:
+        _pea_cache_counts["snapshotHits" if pea is not None else "snapshotMisses"] += 1
+    if pea is None:
+        pea = parse_mtp_aml(mtp_path)
+        try:
+            write_pea_snapshot(pea, mtp_path, content_hash)
+        except (OSError, SnapshotError):
+            pass
+
+    if pea is not None:
+        with _loaded_peas_lock:
+            _loaded_peas[cache_key] = pea
+            _loaded_peas.move_to_end(cache_key)
+            while len(_loaded_peas) > PEA_CACHE_MAX_ENTRIES:
+                _loaded_peas.popitem(last=False)
+                _pea_cache_counts["evictions"] += 1
+    return pea
+
+
+def describe_pea_file(mtp_path) -> dict:
+    """Catalogue metadata of a stored MTP file, loading its PEA on the way."""
+    pea = load_or_parse_pea(mtp_path)
+    if pea is None:
+        raise ValueError("The MTP file does not describe a PEA.")
+    return {"pea_name": pea.name, "opcua_url": pea.url}
+
+
+def get_pea_cache_stats() -> dict:
+    """Lookup statistics of the in-memory PEAs ("memory") and of the snapshot files ("snapshot")."""
+    with _loaded_peas_lock:
+        counts = dict(_pea_cache_counts)
+        entries = len(_loaded_peas)
+    memory_lookups = counts["hits"] + counts["misses"]
+    snapshot_lookups = counts["snapshotHits"] + counts["snapshotMisses"]
+    return {
+        "memory": {
+            "hits": counts["hits"],
+            "misses": counts["misses"],
+            "evictions": counts["evictions"],
+            "entries": entries,
+            "maxEntries": PEA_CACHE_MAX_ENTRIES,
+            "hitRatio": counts["hits"] / memory_lookups if memory_lookups else 0.0,
+        },
+        "snapshot": {
+            "hits": counts["snapshotHits"],
+            "misses": counts["snapshotMisses"],
+            "hitRatio": counts["snapshotHits"] / snapshot_lookups if snapshot_lookups else 0.0,
+        },
+    }
+
+
+def load_pea_file_to_dict(mtp_path, to_dict=pea_to_dict, include_categories: bool = False) -> dict:
+    """to_dict of the PEA of a stored MTP file; module-level so it can run on a process pool."""
+    return to_dict(load_or_parse_pea(mtp_path), include_categories=include_categories)
+
+
+def write_pea_snapshot(pea: Pea, mtp_path, content_hash: str | None = None) -> Path:
+    """Writes the snapshot of pea, parsed from the MTP file whose content has content_hash."""
+    if pea is None:
+        raise SnapshotError("There is no parsed PEA to snapshot.")
+
+    store = BlobStore.for_file(mtp_path)
+    content_hash = content_hash or store.content_hash(mtp_path)
+    columns = encode_pea_columns(pea)
+
+    chunks = [HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, os.path.getsize(mtp_path), bytes.fromhex(content_hash))]
+    for name, typecode in COLUMNS:
+        values = columns[name]
+        if sys.byteorder != "little":
+            values = array(typecode, values)
+            values.byteswap()
+        chunks.append(COLUMN_HEADER.pack(typecode.encode("ascii"), len(values)))
+        chunks.append(values.tobytes())
+    return store.write_derived(content_hash, SNAPSHOT_SUFFIX, b"".join(chunks))
+
+
+def load_pea_snapshot(mtp_path, content_hash: str | None = None) -> Pea | None:
+    """Loads the snapshot of an MTP file's content, or None if there is none or it is corrupt.
+
+    content_hash is the file's content hash if the caller has looked it up already.
+    The file is mapped, its columns are copied out of the map into arrays and the
+    whole PEA is built from them before the map is closed.
+    """
+    try:
+        store = BlobStore.for_file(mtp_path)
+        content_hash = content_hash or store.content_hash(mtp_path)
+        with open(store.derived_path(content_hash, SNAPSHOT_SUFFIX), "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    return decode_snapshot(view, content_hash)
+                finally:
+                    view.release()
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def decode_snapshot(view: memoryview, content_hash: str) -> Pea | None:
+    magic, version, _, _, source_hash = HEADER.unpack_from(view, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return None
+    if source_hash != bytes.fromhex(content_hash):
+        return None
+
+    columns = {}
+    offset = HEADER.size
+    for name, typecode in COLUMNS:
+        stored_typecode, count = COLUMN_HEADER.unpack_from(view, offset)
+        if stored_typecode != typecode.encode("ascii"):
+            raise SnapshotError(f"Snapshot column '{name}' has an unexpected type.")
+        offset += COLUMN_HEADER.size
+        values = array(typecode)
+        end = offset + count * values.itemsize
+        if end > len(view):
+            raise SnapshotError(f"Snapshot column '{name}' is truncated.")
+        values.frombytes(view[offset:end])
+        if sys.byteorder != "little":
+            values.byteswap()
+        columns[name] = values
+        offset = end
+
+    try:
+        return decode_pea_columns(columns)
+    except (IndexError, KeyError, ValueError) as exc:
+        # Column data that does not fit together, e.g. a string or instance index out of range.
+        raise SnapshotError(f"Snapshot is corrupt: {exc}") from exc
+
+
+def encode_pea_columns(pea: Pea) -> dict:
+    columns = {name: array(typecode) for name, typecode in COLUMNS}
+    strings = {}
+
+    def ref(value) -> int:
+        if value is None:
+            return NONE_REF
+        if not isinstance(value, str):
+            raise SnapshotError(f"Cannot snapshot non-string value {value!r}.")
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    instance_positions = {id(inst): position for position, inst in enumerate(pea.insts)}
+    procedure_positions = {id(proc): position for position, proc in enumerate(pea.procs)}
+
+    def position_of(positions, obj) -> int:
+        try:
+            return positions[id(obj)]
+        except KeyError:
+            raise SnapshotError("Snapshot references an object outside the PEA.") from None
+
+    columns["pea_strings"].extend([ref(pea.name), ref(pea.url), ref(pea.ns)])
+    if pea.nsid is not None:
+        columns["pea_nsid"].append(int(pea.nsid))
+
+    for inst in pea.insts:
+        columns["inst_name"].append(ref(inst.name))
+        columns["inst_id"].append(ref(inst.id))
+        columns["inst_refid"].append(ref(inst.refid))
+        columns["inst_default"].append(ref(inst.default))
+        columns["inst_unit"].append(ref(inst.unit))
+        columns["inst_category"].append(ref(inst.category))
+        columns["inst_flags"].append(
+            (INSTANCE_HAS_MIN if inst.min is not None else 0) | (INSTANCE_HAS_MAX if inst.max is not None else 0)
+        )
+        columns["inst_min"].append(inst.min if inst.min is not None else 0.0)
+        columns["inst_max"].append(inst.max if inst.max is not None else 0.0)
+        populated = [name for name in PARAM_ELEM_NAMES if inst.getParamId(name) is not None]
+        columns["inst_param_count"].append(len(populated))
+        for name in populated:
+            param_elem = inst.getParamElem(name)
+            columns["inst_param_elem"].append(PARAM_ELEM_POSITIONS[name])
+            columns["inst_param_id"].append(ref(param_elem["ID"]))
+            columns["inst_param_default"].append(ref(param_elem["Default"]))
+
+    for proc in pea.procs:
+        columns["proc_name"].append(ref(proc.name))
+        columns["proc_id"].append(ref(proc.id))
+        columns["proc_compl"].append(ref(proc.compl))
+        columns["proc_service_id"].append(ref(proc.serviceId))
+        columns["proc_flags"].append(PROCEDURE_HAS_PROC_ID if proc.procId is not None else 0)
+        columns["proc_proc_id"].append(proc.procId if proc.procId is not None else 0)
+        columns["proc_param_count"].append(len(proc.params))
+        columns["proc_params"].extend(position_of(instance_positions, param) for param in proc.params)
+
+    for serv in pea.servs:
+        columns["serv_name"].append(ref(serv.name))
+        columns["serv_id"].append(ref(serv.id))
+        columns["serv_refid"].append(ref(serv.refid))
+        columns["serv_param_count"].append(len(serv.paramElem))
+        for name, param_elem in serv.paramElem.items():
+            if name not in PARAM_ELEM_POSITIONS:
+                raise SnapshotError(f"Unknown service param elem '{name}'.")
+            columns["serv_param_elem"].append(PARAM_ELEM_POSITIONS[name])
+            columns["serv_param_id"].append(ref(param_elem["ID"]))
+            columns["serv_param_default"].append(ref(param_elem["Default"]))
+        columns["serv_proc_count"].append(len(serv.procs))
+        columns["serv_procs"].extend(position_of(procedure_positions, proc) for proc in serv.procs)
+
+    columns["sensacts"].extend(position_of(instance_positions, sensact) for sensact in pea.sensacts)
+
+    encoded_strings = [value.encode("utf-8") for value in strings]
+    columns["string_lengths"].extend(len(encoded) for encoded in encoded_strings)
+    columns["string_data"].frombytes(b"".join(encoded_strings))
+    return columns
+
+
+def decode_pea_columns(columns: dict) -> Pea:
+    string_data = columns["string_data"].tobytes()
+    strings = []
+    offset = 0
+    for length in columns["string_lengths"]:
+        strings.append(string_data[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    def text(index: int):
+        return None if index == NONE_REF else strings[index]
+
+    pea = Pea()
+    pea.name, pea.url, pea.ns = (text(index) for index in columns["pea_strings"])
+    pea.nsid = columns["pea_nsid"][0] if columns["pea_nsid"] else None
+
+    param_cursor = 0
+    for position in range(len(columns["inst_name"])):
+        inst = Instance(name=text(columns["inst_name"][position]), id=text(columns["inst_id"][position]))
+        inst.refid = text(columns["inst_refid"][position])
+        inst.default = text(columns["inst_default"][position])
+        inst.unit = text(columns["inst_unit"][position])
+        inst.category = text(columns["inst_category"][position])
+        flags = columns["inst_flags"][position]
+        if flags & INSTANCE_HAS_MIN:
+            inst.min = columns["inst_min"][position]
+        if flags & INSTANCE_HAS_MAX:
+            inst.max = columns["inst_max"][position]
+        for param_position in range(param_cursor, param_cursor + columns["inst_param_count"][position]):
+            inst.setParamElem(
+                PARAM_ELEM_NAMES[columns["inst_param_elem"][param_position]],
+                text(columns["inst_param_id"][param_position]),
+                text(columns["inst_param_default"][param_position]),
+            )
+        param_cursor += columns["inst_param_count"][position]
+        pea.insts.append(inst)
+
+    param_cursor = 0
+    for position in range(len(columns["proc_name"])):
+        proc = Procedure(name=text(columns["proc_name"][position]), id=text(columns["proc_id"][position]))
+        proc.compl = text(columns["proc_compl"][position])
+        proc.serviceId = text(columns["proc_service_id"][position])
+        if columns["proc_flags"][position] & PROCEDURE_HAS_PROC_ID:
+            proc.procId = columns["proc_proc_id"][position]
+        param_count = columns["proc_param_count"][position]
+        proc.params = [pea.insts[index] for index in columns["proc_params"][param_cursor:param_cursor + param_count]]
+        param_cursor += param_count
+        pea.procs.append(proc)
+
+    param_cursor = 0
+    proc_cursor = 0
+    for position in range(len(columns["serv_name"])):
+        serv = Service()
+        serv.name = text(columns["serv_name"][position])
+        serv.id = text(columns["serv_id"][position])
+        serv.refid = text(columns["serv_refid"][position])
+        for param_position in range(param_cursor, param_cursor + columns["serv_param_count"][position]):
+            name = PARAM_ELEM_NAMES[columns["serv_param_elem"][param_position]]
+            serv.paramElem[name] = {
+                'Type': PARAM_ELEM_TYPES[name],
+                'ID': text(columns["serv_param_id"][param_position]),
+                'Default': text(columns["serv_param_default"][param_position]),
+            }
+        param_cursor += columns["serv_param_count"][position]
+        proc_count = columns["serv_proc_count"][position]
+        serv.procs = [pea.procs[index] for index in columns["serv_procs"][proc_cursor:proc_cursor + proc_count]]
+        proc_cursor += proc_count
+        pea.servs.append(serv)
+
+    pea.sensacts = [pea.insts[index] for index in columns["sensacts"]]
+    return pea
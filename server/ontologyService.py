@@ -4,20 +4,34 @@ from dataclasses import dataclass
 from datetime import date
 from pathlib import Path
 from typing import Iterable
+import codecs
+import gzip
+import importlib
+import json
 import re
+import shutil
 import uuid
+import zlib
 
-import owlready2
-from django.utils.encoding import iri_to_uri
-from rdflib import Graph
 from werkzeug.datastructures import FileStorage
 
-from manchesterConverter import convert_manchester_to_rdfxml, is_probable_manchester
+from blobStore import BLOB_DIRECTORY, BlobStore
+from manchesterConverter import convert_manchester_to_rdfxml
+from ontologySniffer import SniffResult, sniff_ontology_file
+from serverMetrics import timed
+from uploadCatalogue import ListingQuery
 
 
 ONTOLOGY_CATEGORIES = ("processes", "materials")
 CANONICAL_FORMAT = "rdfxml"
 CANONICAL_EXTENSION = ".owl"
+# Suffix of the class trees kept in the blob store; bump the version when their shape changes.
+CLASS_TREE_SUFFIX = ".classtree.v1.json"
+UNPACK_CHUNK_SIZE = 1024 * 1024
+# Largest decompressed or re-encoded upload; the upload limit only covers the compressed bytes.
+ONTOLOGY_MAX_UNPACKED_BYTES = 512 * 1024 * 1024
+# Imported by warm_up; loading and converting ontologies import them on first use.
+WARM_UP_MODULES = ("owlready2", "rdflib", "django.utils.encoding")
 
 
 class OntologyServiceError(Exception):
@@ -45,6 +59,10 @@ class OntologyRequestError(OntologyServiceError):
     status_code = 400
 
 
+class UnpackedSizeExceeded(Exception):
+    pass
+
+
 @dataclass(frozen=True)
 class UploadOntologyResult:
     filename: str
@@ -67,12 +85,30 @@ def get_staging_directory(config: dict) -> Path:
     return staging_dir
 
 
-def list_ontologies(config: dict, category: str, logger=None) -> list[str]:
-    category_dir = get_category_directory(config, category)
-    available = []
-    for ontology_path in sorted(category_dir.glob(f"*{CANONICAL_EXTENSION}")):
+def list_ontologies(config: dict, category: str, logger=None, query: ListingQuery | None = None) -> tuple[list[dict], int]:
+    """Catalogue entries of the ontologies in a category, and their total without paging.
+
+    Unless the query filters on the status itself, only ontologies that have been loaded
+    successfully are listed: not those that failed, nor those still pending.
+    """
+    store = BlobStore(get_category_directory(config, category))
+    store.refresh_in_background((CANONICAL_EXTENSION,), get_ontology_describer(config, category, logger))
+    if query is None:
+        query = ListingQuery(equals=(("status", "ok"),))
+    return store.catalogue.query((CANONICAL_EXTENSION,), query)
+
+
+def refresh_ontology_catalogue(config: dict, category: str, logger=None) -> None:
+    """Catalogues and describes the ontologies of a category that were not uploaded, e.g. at startup."""
+    store = BlobStore(get_category_directory(config, category))
+    store.refresh((CANONICAL_EXTENSION,), get_ontology_describer(config, category, logger))
+
+
+def get_ontology_describer(config: dict, category: str, logger=None):
+    """The describe callback of a category's catalogue, logging ontologies that cannot be loaded."""
+    def describe(ontology_path: Path) -> dict:
         try:
-            load_ontology(config, category, ontology_path.name)
+            return describe_ontology(config, category, ontology_path)
         except OntologyServiceError as exc:
             if logger:
                 logger.warning(
@@ -82,9 +118,14 @@ def list_ontologies(config: dict, category: str, logger=None) -> list[str]:
                     exc.error,
                     exc.details,
                 )
-            continue
-        available.append(ontology_path.name)
-    return available
+            raise
+    return describe
+
+
+def describe_ontology(config: dict, category: str, ontology_path: Path) -> dict:
+    """Catalogue metadata of a stored ontology; raises if it cannot be loaded."""
+    ontology = load_ontology(config, category, Path(ontology_path).name)
+    return {"class_count": len(get_sorted_ontology_classes(ontology))}
 
 
 def upload_ontology(file_storage: FileStorage, category: str, config: dict) -> UploadOntologyResult:
@@ -100,35 +141,48 @@ def upload_ontology(file_storage: FileStorage, category: str, config: dict) -> U
     upload_suffix = Path(file_storage.filename).suffix or ".upload"
     staged_upload = staging_dir / f"{stage_id}{upload_suffix}"
     staged_canonical = staging_dir / f"{stage_id}{CANONICAL_EXTENSION}"
+    staged_unpacked = staging_dir / f"{stage_id}.unpacked{Path(Path(file_storage.filename).stem).suffix}"
 
     try:
         file_storage.save(staged_upload)
-        detected_format = detect_ontology_format(staged_upload)
+        sniffed = sniff_ontology(staged_upload)
         actual_format = normalize_ontology_to_rdfxml(
-            staged_upload,
+            unpack_staged_upload(staged_upload, sniffed, staged_unpacked, config["ONTOLOGY_MAX_UNPACKED_BYTES"]),
             staged_canonical,
             config=config,
-            detected_format=detected_format,
+            detected_format=sniffed.format,
+            ranked_formats=[candidate.format for candidate in sniffed.candidates],
         )
         final_path = allocate_final_path(config, category, file_storage.filename)
-        final_path.parent.mkdir(parents=True, exist_ok=True)
-        final_path.write_bytes(staged_canonical.read_bytes())
+        store = BlobStore(final_path.parent)
+        store.add_file(staged_canonical, final_path.name)
+        store.describe(final_path, lambda path: describe_ontology(config, category, path))
         return UploadOntologyResult(
             filename=final_path.name,
             category=category,
             detected_format=actual_format,
         )
     finally:
-        cleanup_paths([staged_upload, staged_canonical])
+        cleanup_paths([staged_upload, staged_unpacked, staged_canonical])
 
 
 def delete_ontology(config: dict, category: str, filename: str) -> Path:
     ontology_path = resolve_ontology_path(config, category, filename)
     ontology_path.unlink()
+    BlobStore(ontology_path.parent).forget(ontology_path.name)
     return ontology_path
 
 
+def warm_up() -> None:
+    """Imports owlready2, rdflib and Django ahead of the first ontology request."""
+    for module in WARM_UP_MODULES:
+        importlib.import_module(module)
+
+
+@timed("ontology_load")
 def load_ontology(config: dict, category: str, filename: str):
+    import owlready2
+
     ontology_path = resolve_ontology_path(config, category, filename)
     world = owlready2.World()
     configure_onto_path(config)
@@ -156,8 +210,21 @@ def get_ontology_classes(config: dict, category: str, filename: str) -> list[str
 
 
 def get_ontology_class_tree(config: dict, category: str, filename: str) -> dict:
-    ontology = load_ontology(config, category, filename)
-    return build_normalized_ontology_class_graph(ontology)
+    """Returns the class tree of an ontology, built once per ontology content."""
+    ontology_path = resolve_ontology_path(config, category, filename)
+    store = BlobStore.for_file(ontology_path)
+    content_hash = store.content_hash(ontology_path)
+    try:
+        return json.loads(store.derived_path(content_hash, CLASS_TREE_SUFFIX).read_bytes())
+    except (OSError, ValueError):
+        pass
+
+    class_tree = build_normalized_ontology_class_graph(load_ontology(config, category, filename))
+    try:
+        store.write_derived(content_hash, CLASS_TREE_SUFFIX, json.dumps(class_tree).encode("utf-8"))
+    except OSError:
+        pass
+    return class_tree
 
 
 def get_ontology_subclasses(
@@ -181,7 +248,7 @@ def get_ontology_subclasses(
 def resolve_ontology_path(config: dict, category: str, filename: str) -> Path:
     category_dir = get_category_directory(config, category).resolve()
     candidate = (category_dir / Path(filename).name).resolve()
-    if candidate.parent != category_dir or not candidate.exists():
+    if candidate.parent != category_dir or candidate.name == BLOB_DIRECTORY or not candidate.exists():
         raise OntologyNotFoundError(
             f"Ontology '{filename}' was not found in category '{category}'."
         )
@@ -197,23 +264,54 @@ def validate_category(category: str) -> str:
     return category
 
 
-def detect_ontology_format(path: Path) -> str:
-    preview = path.read_bytes()[:2048]
-    if not preview:
+def sniff_ontology(path: Path) -> SniffResult:
+    """Ranked format candidates of an uploaded ontology, from a bounded prefix of the file."""
+    try:
+        sniffed = sniff_ontology_file(path)
+    except ValueError as exc:
+        raise OntologyValidationError("Uploaded ontology could not be decompressed.", str(exc)) from exc
+    if sniffed.empty:
         raise OntologyValidationError("Uploaded ontology file is empty.")
+    return sniffed
+
+
+def detect_ontology_format(path: Path) -> str:
+    return sniff_ontology(path).format
 
-    text = preview.decode("utf-8", errors="ignore").lstrip()
-    if is_probable_manchester(text):
-        return "manchester"
-    if text.startswith("@prefix") or text.startswith("@base"):
-        return "turtle"
-    if "<rdf:RDF" in text or (text.startswith("<?xml") and "<rdf:RDF" in text):
-        return "rdfxml"
-    if "<Ontology" in text or "<!DOCTYPE Ontology" in text or "<!DOCTYPE owl:Ontology" in text:
-        return "owlxml"
-    if looks_like_ntriples(text):
-        return "ntriples"
-    return "unknown"
+
+def unpack_staged_upload(
+    staged_upload: Path, sniffed: SniffResult, target: Path, max_size: int = ONTOLOGY_MAX_UNPACKED_BYTES
+) -> Path:
+    """The staged upload, or a copy of it at target that is decompressed and re-encoded as
+    UTF-8 as far as the parsers of the sniffed format need it.
+
+    Copies of more than max_size bytes (characters when re-encoding) are deleted and
+    rejected, so a small gzip bomb cannot fill the disk.
+    """
+    if sniffed.compression is None and not sniffed.needs_transcoding:
+        return staged_upload
+    opener = gzip.open if sniffed.compression == "gzip" else open
+    try:
+        with opener(staged_upload, "rb") as source, target.open("wb") as output:
+            if sniffed.needs_transcoding:
+                source.read(sniffed.bom_length)
+                source = codecs.getreader(sniffed.encoding)(source)
+                output = codecs.getwriter("utf-8")(output)
+            size = 0
+            while chunk := source.read(UNPACK_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UnpackedSizeExceeded()
+                output.write(chunk)
+    except UnpackedSizeExceeded:
+        target.unlink(missing_ok=True)
+        raise OntologyValidationError(
+            "Uploaded ontology is too large once decompressed.",
+            f"Ontologies may be at most {max_size} bytes after decompression.",
+        ) from None
+    except (OSError, EOFError, zlib.error, UnicodeDecodeError) as exc:
+        raise OntologyValidationError("Uploaded ontology could not be decompressed or decoded.", str(exc)) from exc
+    return target
 
 
 def normalize_ontology_to_rdfxml(
@@ -222,8 +320,9 @@ def normalize_ontology_to_rdfxml(
     *,
     config: dict,
     detected_format: str,
+    ranked_formats: Iterable[str] = (),
 ) -> str:
-    candidate_formats = build_candidate_formats(detected_format)
+    candidate_formats = build_candidate_formats(detected_format, ranked_formats)
     failures = []
 
     for candidate_format in candidate_formats:
@@ -245,13 +344,14 @@ def normalize_ontology_to_rdfxml(
     )
 
 
-def build_candidate_formats(detected_format: str) -> list[str]:
+def build_candidate_formats(detected_format: str, ranked_formats: Iterable[str] = ()) -> list[str]:
     ordered = []
+    ranked_formats = list(ranked_formats)
     fallback_formats = ["rdfxml", "owlxml", "ntriples", "turtle"]
-    if detected_format == "manchester":
+    if "manchester" in (detected_format, *ranked_formats):
         fallback_formats.append("manchester")
 
-    for fmt in [detected_format, *fallback_formats]:
+    for fmt in [detected_format, *ranked_formats, *fallback_formats]:
         if fmt and fmt not in ordered and fmt != "unknown":
             ordered.append(fmt)
     if not ordered:
@@ -260,12 +360,16 @@ def build_candidate_formats(detected_format: str) -> list[str]:
 
 
 def canonicalize_with_rdflib(source_path: Path, canonical_path: Path) -> None:
+    from rdflib import Graph
+
     graph = Graph()
     graph.parse(source_path.as_posix(), format="turtle")
     graph.serialize(destination=canonical_path.as_posix(), format="xml")
 
 
 def canonicalize_with_owlready2(source_path: Path, canonical_path: Path, config: dict, input_format: str) -> None:
+    import owlready2
+
     world = owlready2.World()
     configure_onto_path(config)
     with source_path.open("rb") as fileobj:
@@ -278,6 +382,8 @@ def canonicalize_with_owlready2(source_path: Path, canonical_path: Path, config:
 
 
 def validate_canonical_ontology(canonical_path: Path, config: dict) -> None:
+    import owlready2
+
     world = owlready2.World()
     configure_onto_path(config)
     with canonical_path.open("rb") as fileobj:
@@ -289,6 +395,8 @@ def validate_canonical_ontology(canonical_path: Path, config: dict) -> None:
 
 
 def configure_onto_path(config: dict) -> None:
+    import owlready2
+
     root = Path(config["ONTOLOGY_UPLOAD_ROOT"])
     candidate_paths = [
         root,
@@ -335,15 +443,6 @@ def cleanup_paths(paths: Iterable[Path]) -> None:
             continue
 
 
-def looks_like_ntriples(text: str) -> bool:
-    for line in text.splitlines():
-        stripped = line.strip()
-        if not stripped or stripped.startswith("#"):
-            continue
-        return stripped.startswith("<") and stripped.endswith(".")
-    return False
-
-
 def build_temp_ontology_iri(stem: str) -> str:
     return f"http://recipe-editor.local/ontology/{uuid.uuid4().hex}/{stem}"
 
@@ -386,6 +485,8 @@ def get_direct_named_parents(cls, classes_or_class_set: Iterable[object]) -> lis
 
 
 def build_ontology_class_other_information(cls) -> list[dict]:
+    from django.utils.encoding import iri_to_uri
+
     return [{
         "otherInfoID": "SemanticDescription",
         "description": ["URI referencing the Ontology Class definition"],
@@ -587,6 +688,8 @@ def get_ontology_class_display_name(cls) -> str:
 
 
 def normalize_ontology_class_iri(value: str | None) -> str:
+    from django.utils.encoding import iri_to_uri
+
     normalized = (value or "").strip()
     return iri_to_uri(normalized) if normalized else ""
 
@@ -0,0 +1,157 @@
+"""Format sniffing of uploaded ontologies from a bounded prefix of the file.
+
+Only the first SNIFF_PREFIX_SIZE bytes are read, after decompressing gzip uploads on
+the fly, so sniffing a multi-hundred-MB ontology costs the same as sniffing a small
+one. The prefix is decoded according to its byte order mark; UTF-16 without a BOM is
+recognised by its zero bytes. Every format whose markers appear in the prefix is
+returned as a candidate with a confidence between 0 and 1, best first, for the
+upload to try in that order.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import codecs
+import gzip
+import re
+import zlib
+
+from manchesterConverter import is_probable_manchester
+
+
+SNIFF_PREFIX_SIZE = 8192
+GZIP_MAGIC = b"\x1f\x8b"
+XML_FORMATS = ("rdfxml", "owlxml")
+# Checked in this order, as the UTF-32 LE mark starts with the UTF-16 LE one.
+BYTE_ORDER_MARKS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+RDF_NAMESPACE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+OWL_NAMESPACE = "http://www.w3.org/2002/07/owl#"
+SPARQL_PREFIX_PATTERN = re.compile(r"^\s*(PREFIX|BASE)\s+\S*\s*<", re.IGNORECASE | re.MULTILINE)
+# An XML declaration, doctype, comment or start tag, but not an N-Triples IRI such as <http://...>.
+XML_START_PATTERN = re.compile(r"<(\?xml|!|[A-Za-z_][\w.:-]*(\s|/?>))")
+TURTLE_STATEMENT_PATTERN = re.compile(r"^\s*\S+:\S*\s+(a|rdf:type|rdfs:subClassOf)\s", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class FormatCandidate:
+    format: str
+    confidence: float
+
+
+@dataclass(frozen=True)
+class SniffResult:
+    candidates: tuple
+    encoding: str
+    bom_length: int
+    compression: str | None
+    empty: bool
+
+    @property
+    def format(self) -> str:
+        """The most likely format, or "unknown"."""
+        return self.candidates[0].format if self.candidates else "unknown"
+
+    @property
+    def needs_transcoding(self) -> bool:
+        """Whether the top candidate's parser needs the content re-encoded as UTF-8.
+
+        XML parsers honour byte order marks and encoding declarations themselves.
+        """
+        return self.encoding != "utf-8" and self.format not in XML_FORMATS
+
+
+def sniff_ontology_file(path, prefix_size: int = SNIFF_PREFIX_SIZE) -> SniffResult:
+    """Sniffs the format of the ontology file at path; raises ValueError for broken gzip files."""
+    prefix, compression = read_prefix(Path(path), prefix_size)
+    encoding, bom_length = detect_encoding(prefix)
+    text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(prefix[bom_length:], final=False)
+    return SniffResult(
+        candidates=rank_formats(text.lstrip()),
+        encoding=encoding,
+        bom_length=bom_length,
+        compression=compression,
+        empty=not prefix,
+    )
+
+
+def read_prefix(path: Path, prefix_size: int) -> tuple[bytes, str | None]:
+    """Up to prefix_size bytes of the file's content, decompressed if it is gzip-compressed."""
+    with path.open("rb") as f:
+        prefix = f.read(prefix_size)
+        if not prefix.startswith(GZIP_MAGIC):
+            return prefix, None
+        f.seek(0)
+        try:
+            with gzip.GzipFile(fileobj=f) as decompressed:
+                return decompressed.read(prefix_size), "gzip"
+        except (OSError, EOFError, zlib.error) as exc:
+            raise ValueError(f"Uploaded ontology is not a valid gzip file: {exc}") from exc
+
+
+def detect_encoding(prefix: bytes) -> tuple[str, int]:
+    """The encoding of the content and the length of its byte order mark."""
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if prefix.startswith(bom):
+            return encoding, len(bom)
+    # Ontologies start with ASCII markup or keywords, so UTF-16 shows as alternating zero bytes.
+    if len(prefix) >= 4:
+        if prefix[0] == 0 and prefix[1] != 0 and prefix[2] == 0:
+            return "utf-16-be", 0
+        if prefix[0] != 0 and prefix[1] == 0 and prefix[3] == 0:
+            return "utf-16-le", 0
+    return "utf-8", 0
+
+
+def rank_formats(text: str) -> tuple:
+    """Candidate formats for the decoded beginning of an ontology, most likely first."""
+    scores = {}
+
+    def score(fmt: str, confidence: float) -> None:
+        scores[fmt] = max(scores.get(fmt, 0.0), confidence)
+
+    if is_probable_manchester(text):
+        score("manchester", 0.9)
+    if text.startswith("@prefix") or text.startswith("@base"):
+        score("turtle", 0.95)
+    elif SPARQL_PREFIX_PATTERN.search(text):
+        score("turtle", 0.85)
+    elif TURTLE_STATEMENT_PATTERN.search(text):
+        score("turtle", 0.4)
+
+    is_xml = XML_START_PATTERN.match(text) is not None
+    if "<rdf:RDF" in text:
+        score("rdfxml", 0.95)
+    elif is_xml and RDF_NAMESPACE in text:
+        score("rdfxml", 0.7)
+    if "<Ontology" in text or "<!DOCTYPE Ontology" in text or "<!DOCTYPE owl:Ontology" in text:
+        score("owlxml", 0.5 if "rdfxml" in scores else 0.9)
+    elif is_xml and OWL_NAMESPACE in text and "rdfxml" not in scores:
+        score("owlxml", 0.5)
+    if is_xml:
+        score("rdfxml", 0.3)
+        score("owlxml", 0.2)
+
+    if looks_like_ntriples(text):
+        score("ntriples", 0.8)
+        # N-Triples is a subset of Turtle.
+        score("turtle", 0.5)
+
+    return tuple(
+        FormatCandidate(fmt, confidence)
+        for fmt, confidence in sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    )
+
+
+def looks_like_ntriples(text: str) -> bool:
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        return stripped.startswith("<") and stripped.endswith(".")
+    return False
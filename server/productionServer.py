@@ -0,0 +1,166 @@
+"""Production entry point serving the Recipe Editor with waitress.
+
+    python productionServer.py [--port 8080] [--threads 8] [--workers 4]
+
+With --workers > 1 the listening socket is bound once and shared by that many forked
+worker processes, each running its own waitress server, so that CPU-bound parsing and
+validation run on several cores instead of behind one GIL. The app is created (and by
+default warmed up) before forking, so the workers share the loaded modules. Platforms
+without os.fork (Windows) always run a single process.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from admissionControl import build_admission_gates, divide_admission_limits
+from server import create_app, refresh_upload_catalogues, warm_up
+
+
+# Seconds to wait before replacing a worker that exited unexpectedly.
+WORKER_RESTART_DELAY = 1.0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Recipe Editor with waitress.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--threads", type=int, default=8, help="request threads per process")
+    parser.add_argument("--workers", type=int, default=1, help="processes sharing the listening socket")
+    parser.add_argument("--connection-limit", type=int, default=100, help="open connections per process")
+    parser.add_argument("--channel-timeout", type=int, default=120, help="seconds before an inactive connection is closed")
+    parser.add_argument(
+        "--max-request-body-size", type=int, default=1024 * 1024 * 1024, help="largest accepted request body in bytes"
+    )
+    parser.add_argument("--backlog", type=int, default=1024, help="pending connections queued by the OS")
+    parser.add_argument(
+        "--warm-up",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="load all subsystem dependencies before accepting requests",
+    )
+    parser.add_argument("--no-apidocs", dest="apidocs", action="store_false", help="do not serve /apidocs")
+    args = parser.parse_args(argv)
+    if args.workers > 1 and not hasattr(os, "fork"):
+        print("Multiple workers need os.fork, which this platform lacks; running a single process.")
+        args.workers = 1
+    return args
+
+
+def waitress_options(args) -> dict:
+    return {
+        "threads": args.threads,
+        "connection_limit": args.connection_limit,
+        "channel_timeout": args.channel_timeout,
+        "max_request_body_size": args.max_request_body_size,
+        "backlog": args.backlog,
+    }
+
+
+def build_app(args, config: dict | None = None):
+    """The app to serve, with config applied over its defaults and its upload catalogues refreshed."""
+    app = create_app()
+    app.config.update(config or {})
+    # The parse pool of each worker gets its share of the cores.
+    app.config["MTP_PARSE_WORKERS"] = max(1, app.config["MTP_PARSE_WORKERS"] // args.workers)
+    # So do the admission gates, which create_app built for a single process.
+    app.config["ADMISSION_LIMITS"] = divide_admission_limits(app.config["ADMISSION_LIMITS"], args.workers)
+    if "admission_gates" in app.extensions:
+        app.extensions["admission_gates"] = build_admission_gates(app.config["ADMISSION_LIMITS"])
+    if args.apidocs:
+        from flasgger import Swagger
+        Swagger(app)
+    if args.warm_up and not app.config["WARM_UP_ON_STARTUP"]:
+        warm_up()
+    # Before forking, so that the workers' listings find the stored files described.
+    refresh_upload_catalogues(app)
+    return app
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    return socket.create_server((host, port), family=family, backlog=backlog)
+
+
+def spawn_worker(app, sock, options: dict) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    exit_code = 0
+    try:
+        from waitress import serve
+        serve(app, sockets=[sock], **options)
+    except BaseException:
+        traceback.print_exc()
+        exit_code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(exit_code)
+
+
+def run_workers(app, sock, workers: int, options: dict) -> None:
+    """Forks the workers and replaces those that exit until SIGINT/SIGTERM is received."""
+    children = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous_handlers = {signum: signal.signal(signum, stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+    try:
+        for worker_id in range(workers):
+            children[spawn_worker(app, sock, options)] = worker_id
+        print(f"Serving on {sock.getsockname()} with {workers} worker processes (pids {sorted(children)})")
+
+        while children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            worker_id = children.pop(pid, None)
+            if worker_id is None or stopping:
+                continue
+            print(f"Worker {worker_id} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(WORKER_RESTART_DELAY)
+            if not stopping:
+                children[spawn_worker(app, sock, options)] = worker_id
+    finally:
+        for signum, handler in previous_handlers.items():
+            signal.signal(signum, handler)
+        sock.close()
+
+
+def serve_app(app, args) -> None:
+    """Serves app with the waitress options and worker count of args until interrupted."""
+    options = waitress_options(args)
+
+    if args.workers <= 1:
+        from waitress import serve
+        serve(app, host=args.host, port=args.port, **options)
+        return
+
+    run_workers(app, bind_socket(args.host, args.port, args.backlog), args.workers, options)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    serve_app(build_app(args), args)
+
+
+if __name__ == "__main__":
+    main()
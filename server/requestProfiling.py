@@ -0,0 +1,121 @@
+"""Opt-in cProfile profiling of individual requests.
+
+With PROFILING_ENABLED set, a request carrying ``?profile=1`` or an ``X-Profile: 1``
+header is run under cProfile and the stats are written as a pstats file to
+PROFILE_UPLOAD_ROOT (``upload/profiles``). When PROFILING_TOKEN is configured the
+request must also carry it in the ``X-Profile-Token`` header. The response names the
+file in ``X-Profile-Id``; ``/profiles`` lists the stored files, which can be opened
+with ``python -m pstats`` or snakeviz.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from pathlib import Path
+import cProfile
+import hmac
+import io
+import pstats
+import re
+import uuid
+
+from flask import current_app, g, request
+
+
+PROFILE_SUFFIX = ".prof"
+PROFILE_MAX_FILES = 100
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SORT_KEYS = ("cumulative", "tottime", "calls")
+
+
+def is_profiling_authorized() -> bool:
+    """Whether profiling is enabled and the request carries the configured token, if any."""
+    if not current_app.config["PROFILING_ENABLED"]:
+        return False
+    token = current_app.config["PROFILING_TOKEN"]
+    if not token:
+        return True
+    return hmac.compare_digest(request.headers.get(PROFILE_TOKEN_HEADER, ""), token)
+
+
+def is_profile_requested() -> bool:
+    return request.args.get("profile") == "1" or request.headers.get(PROFILE_HEADER) == "1"
+
+
+def build_profile_name() -> str:
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    endpoint = re.sub(r"[^A-Za-z0-9_]+", "_", request.endpoint or "unmatched")
+    return f"{timestamp}-{endpoint}-{uuid.uuid4().hex[:8]}{PROFILE_SUFFIX}"
+
+
+def start_request_profile():
+    if not is_profile_requested() or not is_profiling_authorized():
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # another profiler is already active in this thread
+        return
+    g.request_profiler = profiler
+
+
+def stop_request_profile(response):
+    profiler = g.pop("request_profiler", None)
+    if profiler is None:
+        return response
+    profiler.disable()
+    profile_dir = Path(current_app.config["PROFILE_UPLOAD_ROOT"])
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_name = build_profile_name()
+    profiler.dump_stats(profile_dir / profile_name)
+    prune_profiles(profile_dir, current_app.config["PROFILE_MAX_FILES"])
+    response.headers[PROFILE_ID_HEADER] = profile_name
+    return response
+
+
+def discard_request_profile(exc):
+    # the request failed before stop_request_profile ran
+    profiler = g.pop("request_profiler", None)
+    if profiler is not None:
+        profiler.disable()
+
+
+def list_profiles(profile_dir) -> list[dict]:
+    """Stored profiles, newest first."""
+    profile_dir = Path(profile_dir)
+    if not profile_dir.is_dir():
+        return []
+    profiles = []
+    for path in profile_dir.glob(f"*{PROFILE_SUFFIX}"):
+        stat = path.stat()
+        profiles.append({
+            "name": path.name,
+            "size": stat.st_size,
+            "created": datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat(),
+        })
+    profiles.sort(key=lambda profile: profile["created"], reverse=True)
+    return profiles
+
+
+def prune_profiles(profile_dir, max_files: int) -> None:
+    """Deletes the oldest profiles beyond max_files."""
+    for profile in list_profiles(profile_dir)[max_files:]:
+        (Path(profile_dir) / profile["name"]).unlink(missing_ok=True)
+
+
+def format_profile_summary(profile_path, sort_key: str = "cumulative", limit: int = 40) -> str:
+    """The pstats table of a stored profile, as printed by python -m pstats."""
+    output = io.StringIO()
+    stats = pstats.Stats(str(profile_path), stream=output)
+    stats.strip_dirs().sort_stats(sort_key).print_stats(limit)
+    return output.getvalue()
+
+
+def install_request_profiling(app) -> None:
+    """Registers the profiling hooks. Installed before all other hooks, so the profile
+    covers them as well as the view function."""
+    app.before_request(start_request_profile)
+    app.after_request(stop_request_profile)
+    app.teardown_request(discard_request_profile)
@@ -0,0 +1,186 @@
+"""Cache of encoded JSON responses derived from stored upload files.
+
+Parsing a stored MTP or AAS file and serialising the result is repeated for every
+request although the file rarely changes. Responses are therefore cached as encoded
+bytes, keyed by the source file's content hash plus the request and a variant, and
+served with a strong ETag so that clients can revalidate with If-None-Match.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import hashlib
+import threading
+
+from flask import Response, current_app, request
+
+from blobStore import BlobStore
+
+
+RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# Content codings a cached body may be compressed with, see responseCompression.
+CONTENT_CODINGS = ("zstd", "br", "gzip")
+
+
+@dataclass
+class CachedBody:
+    body: bytes
+    etag: str
+    mimetype: str = "application/json"
+    # Compressed copies of the body by content coding, filled in lazily.
+    encoded: dict = field(default_factory=dict)
+
+    @property
+    def size(self) -> int:
+        return len(self.body) + sum(len(data) for data in self.encoded.values())
+
+
+class ResponseCache:
+    """LRU cache of CachedBody entries, bounded by the total number of cached bytes."""
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry: CachedBody) -> None:
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+            if entry.size > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._size += entry.size
+            self._evict()
+
+    def add_encoding(self, entry: CachedBody, coding: str, data: bytes) -> None:
+        """Stores a compressed copy of a cached body, accounting for its size."""
+        with self._lock:
+            if coding in entry.encoded:
+                return
+            entry.encoded[coding] = data
+            if any(cached is entry for cached in self._entries.values()):
+                self._size += len(data)
+                self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "maxBytes": self.max_bytes,
+                "hitRatio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def get_response_cache(app=None) -> ResponseCache:
+    app = app or current_app
+    cache = app.extensions.get("response_cache")
+    if cache is None:
+        cache = app.extensions.setdefault("response_cache", ResponseCache(app.config["RESPONSE_CACHE_MAX_BYTES"]))
+    return cache
+
+
+def parse_fields(value: str | None) -> tuple:
+    """Parses ?fields=a,b.c into a sorted tuple of dotted paths."""
+    if not value:
+        return ()
+    return tuple(sorted({path.strip() for path in value.split(",") if path.strip()}))
+
+
+def project_fields(data, fields: tuple):
+    """Keeps only the given top-level or dotted fields; lists are projected element-wise."""
+    if not fields:
+        return data
+    tree = {}
+    for path in fields:
+        node = tree
+        for part in path.split("."):
+            node = node.setdefault(part, {})
+    return _project(data, tree)
+
+
+def _project(data, tree: dict):
+    if not tree:
+        return data
+    if isinstance(data, list):
+        return [_project(item, tree) for item in data]
+    if isinstance(data, dict):
+        return {key: _project(data[key], subtree) for key, subtree in tree.items() if key in data}
+    return data
+
+
+def cached_json_response(source_path, build, variant=()):
+    """Returns the JSON response built by build() for a stored file, cached per file content.
+
+    build is only called on a cache miss; errors it raises are not cached. The
+    ?fields= projection is applied before encoding and is part of the cache key.
+    The view arguments stay in the key too, as bodies name the file they came from.
+    """
+    fields = parse_fields(request.args.get("fields"))
+    key = (
+        BlobStore.for_file(source_path).content_hash(source_path),
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        variant,
+        fields,
+    )
+
+    cache = get_response_cache()
+    entry = cache.get(key)
+    if entry is None:
+        body = current_app.json.response(project_fields(build(), fields)).get_data()
+        entry = CachedBody(body=body, etag=hashlib.sha256(body).hexdigest())
+        cache.put(key, entry)
+
+    return make_cached_response(entry)
+
+
+def encoded_etag(etag: str, coding: str) -> str:
+    """The strong ETag of a compressed representation of a body."""
+    return f"{etag}-{coding}"
+
+
+def make_cached_response(entry: CachedBody) -> Response:
+    known_etags = [entry.etag] + [encoded_etag(entry.etag, coding) for coding in CONTENT_CODINGS]
+    matched_etag = next((etag for etag in known_etags if request.if_none_match.contains(etag)), None)
+    if matched_etag is not None:
+        response = Response(status=304, mimetype=entry.mimetype)
+        response.set_etag(matched_etag)
+    else:
+        response = Response(entry.body, mimetype=entry.mimetype)
+        # lets responseCompression store compressed copies in the cache entry
+        response.cached_body = entry
+        response.set_etag(entry.etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
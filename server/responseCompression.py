@@ -0,0 +1,103 @@
+"""Negotiated compression of API responses.
+
+Responses above COMPRESSION_MIN_SIZE bytes with a compressible mimetype are compressed
+with the best coding the client accepts: zstd and brotli when the optional
+``zstandard``/``brotli`` packages are installed, gzip otherwise. Bodies served from the
+response cache keep their compressed copies in the cache entry, so repeated requests
+are not compressed again.
+"""
+from __future__ import annotations
+
+import gzip
+
+from flask import current_app, request
+
+from responseCache import encoded_etag, get_response_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSIBLE_MIMETYPES = frozenset({
+    "application/json",
+    "application/xml",
+    "text/xml",
+    "text/html",
+    "text/plain",
+})
+
+
+def _compress_zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+
+def _compress_brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=5)
+
+
+def _compress_gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def available_codings() -> dict:
+    """Supported content codings in server preference order."""
+    codings = {}
+    if zstandard is not None:
+        codings["zstd"] = _compress_zstd
+    if brotli is not None:
+        codings["br"] = _compress_brotli
+    codings["gzip"] = _compress_gzip
+    return codings
+
+
+CODINGS = available_codings()
+
+
+def choose_coding(codings=CODINGS) -> str | None:
+    return request.accept_encodings.best_match(list(codings))
+
+
+def compress_response(response):
+    """after_request hook compressing eligible responses."""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+
+    if (
+        response.status_code != 200
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    coding = choose_coding()
+    if coding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config["COMPRESSION_MIN_SIZE"]:
+        return response
+
+    cached_body = getattr(response, "cached_body", None)
+    compressed = cached_body.encoded.get(coding) if cached_body is not None else None
+    if compressed is None:
+        compressed = CODINGS[coding](data)
+        if cached_body is not None:
+            get_response_cache().add_encoding(cached_body, coding, compressed)
+    if len(compressed) >= len(data):
+        return response
+
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = coding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, coding), weak=weak)
+    return response
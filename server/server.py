@@ -1,22 +1,58 @@
 # webserver
-from flask import Flask, jsonify, send_from_directory, make_response, redirect, request, flash
-from waitress import serve #this is for the production server
-from flasgger import Swagger
+from flask import Flask, Response, jsonify, send_from_directory, make_response, redirect, request, flash
 from zipfile import ZipFile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import atexit
+import json
+import multiprocessing
 import os
+import threading
 
 # utils
 import mimetypes
 mimetypes.add_type('application/javascript', '.js')
 mimetypes.add_type('text/css', '.css')
 
+import AasAPI
+import RecipeAPI
+import ontologyService
 from RecipeAPI import recipe_api, get_all_recipe_capabilities
 from OntologyAPI import ontology_api
-from AasAPI import aas_api, get_all_aasx_capabilities, get_all_aas_capabilities, get_aasx_id, parse_aas_equipment_info
-from MtpApi import parse_mtp_aml, pea_to_dict, get_filtered_equipment_info, get_master_recipe_equipment_info
+from AasAPI import aas_api, describe_aas_file, get_all_aasx_capabilities, get_all_aas_capabilities, get_aasx_id, parse_aas_equipment_info
+from MtpApi import parse_mtp_file_to_dict, pea_to_dict, pea_to_normalized_dict, get_filtered_equipment_info, get_master_recipe_equipment_info
+from mtpSnapshot import describe_pea_file, get_pea_cache_stats, load_or_parse_pea, load_pea_file_to_dict
+from responseCache import RESPONSE_CACHE_MAX_BYTES, cached_json_response, get_response_cache
+from responseCompression import COMPRESSION_MIN_SIZE, compress_response
+from requestProfiling import PROFILE_MAX_FILES, PROFILE_SORT_KEYS, format_profile_summary, install_request_profiling, is_profiling_authorized, list_profiles
+from serverMetrics import METRICS_CONTENT_TYPE, REGISTRY, collect_cache_metrics, install_request_metrics
+from staticAssets import STATIC_ASSET_MAX_AGE, get_static_assets
 from AASxmlCapabilityParser import parse_capabilities_robust_from_bytes
-from Functions import allowed_file, delete_uploaded_file, save_uploaded_file
+from admissionControl import admission_class, collect_admission_metrics, default_admission_limits, install_admission_control
+from blobStore import BlobStore
+from jobQueue import (
+    BATCH_JOB_PRIORITY,
+    DONE,
+    JOB_QUEUE_MAX_SIZE,
+    JOB_RESULT_TTL_SECONDS,
+    JOB_THREAD_WORKERS,
+    background_job,
+    get_job_queue,
+    install_background_jobs,
+    is_background_job,
+    run_in_job_process,
+)
+from Functions import allowed_file, delete_uploaded_file, resolve_safe_file_path, save_uploaded_file
 from manchesterConverter import get_default_robot_converter_command
+from streamingUploads import (
+    DEFAULT_UPLOAD_MAX_CONTENT_LENGTHS,
+    UploadRequest,
+    handle_request_entity_too_large,
+    mapped_upload,
+    streamed_upload,
+    upload_path,
+)
+from uploadCatalogue import listing_response, parse_listing_args
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 
 ontologies = {}
@@ -29,12 +65,79 @@ AAS_FOLDER = "aasx/"
 MTP_FOLDER = "mtp/"
 RECIPE_FOLDER = "recipes/"
 MTP_ALLOWED_EXTENSIONS = {"mtp", "aml"}
+PEA_RESPONSE_FORMATS = {"full": pea_to_dict, "normalized": pea_to_normalized_dict}
 AAS_ALLOWED_EXTENSIONS = {"aasx", "xml"}
+MTP_LISTED_SUFFIXES = (".mtp", ".aml")
+AAS_LISTED_SUFFIXES = (".xml",)
+
+# Imported once by the fork server, so that parse workers forked from it start with the parser loaded.
+MTP_PARSE_PRELOAD_MODULES = ["mtpSnapshot"]
+
+_mtp_parse_pool_lock = threading.Lock()
 
 def extract_zip(input_zip):
     input_zip=ZipFile(input_zip)
     return {name: input_zip.read(name) for name in input_zip.namelist()}
 
+def get_mtp_parse_context():
+    """The multiprocessing context of the parse pool. Forking a process whose threads may
+    hold locks can deadlock the child, so workers come from a fork server, or are spawned
+    where there is none."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(MTP_PARSE_PRELOAD_MODULES)
+        return context
+    return multiprocessing.get_context("spawn")
+
+def get_mtp_parse_pool(app):
+    """Returns the app's process pool for MTP parsing, creating it on first use."""
+    with _mtp_parse_pool_lock:
+        pool = app.extensions.get("mtp_parse_pool")
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=app.config["MTP_PARSE_WORKERS"], mp_context=get_mtp_parse_context())
+            app.extensions["mtp_parse_pool"] = pool
+            atexit.register(pool.shutdown, wait=False, cancel_futures=True)
+        return pool
+
+def iter_mtp_batch_results(app, mtp_paths, in_process: bool = False):
+    """Parses the given {filename: path} MTP files and yields (filename, pea_dict, error) as they finish.
+
+    With in_process, the files are parsed on the process pool however few there are.
+    """
+    if not in_process and (app.config["MTP_PARSE_WORKERS"] <= 1 or len(mtp_paths) <= 1):
+        for filename, mtp_path in mtp_paths.items():
+            try:
+                yield filename, load_pea_file_to_dict(mtp_path), None
+            except Exception as e:
+                yield filename, None, f"Failed to parse file {filename}: {e}"
+        return
+
+    pool = get_mtp_parse_pool(app)
+    futures = {pool.submit(load_pea_file_to_dict, mtp_path): filename for filename, mtp_path in mtp_paths.items()}
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except Exception as e:
+            yield futures[future], None, f"Failed to parse file {futures[future]}: {e}"
+
+def warm_up():
+    """Loads the heavy dependencies of every subsystem, which are otherwise imported on first use."""
+    AasAPI.warm_up()
+    ontologyService.warm_up()
+    RecipeAPI.warm_up()
+
+def refresh_upload_catalogues(app):
+    """Catalogues and describes the stored files that were not uploaded through the app, so
+    that listings, which never parse files themselves, find them described. Run at startup."""
+    for root, suffixes, describe in (
+        (app.config["MTP_UPLOAD_ROOT"], MTP_LISTED_SUFFIXES, describe_pea_file),
+        (app.config["AAS_UPLOAD_ROOT"], AAS_LISTED_SUFFIXES, describe_aas_file),
+    ):
+        os.makedirs(root, exist_ok=True)
+        BlobStore(root).refresh(suffixes, describe)
+    for category in ontologyService.ONTOLOGY_CATEGORIES:
+        ontologyService.refresh_ontology_catalogue(app.config, category, app.logger)
+
 def create_app():
     app = Flask(__name__)
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
@@ -48,8 +151,28 @@ def create_app():
         get_default_robot_converter_command(app.root_path),
     )
     app.config.setdefault("ONTOLOGY_CONVERTER_TIMEOUT_SECONDS", 60)
+    app.config.setdefault("ONTOLOGY_MAX_UNPACKED_BYTES", ontologyService.ONTOLOGY_MAX_UNPACKED_BYTES)
     app.config.setdefault("MTP_UPLOAD_ROOT", os.path.join(app.root_path, "upload", "mtp"))
     app.config.setdefault("AAS_UPLOAD_ROOT", os.path.join(app.root_path, "upload", "aasx"))
+    app.config.setdefault("MTP_PARSE_WORKERS", os.cpu_count() or 1)
+    app.config.setdefault("RESPONSE_CACHE_MAX_BYTES", RESPONSE_CACHE_MAX_BYTES)
+    app.config.setdefault("COMPRESSION_MIN_SIZE", COMPRESSION_MIN_SIZE)
+    app.config.setdefault("STATIC_ASSET_MAX_AGE", STATIC_ASSET_MAX_AGE)
+    app.config.setdefault("WARM_UP_ON_STARTUP", os.environ.get("WARM_UP_ON_STARTUP", "").lower() in ("1", "true"))
+    app.config.setdefault("METRICS_ENABLED", True)
+    app.config.setdefault("PROFILING_ENABLED", False)
+    app.config.setdefault("PROFILING_TOKEN", None)
+    app.config.setdefault("PROFILE_UPLOAD_ROOT", os.path.join(app.root_path, "upload", "profiles"))
+    app.config.setdefault("PROFILE_MAX_FILES", PROFILE_MAX_FILES)
+    app.config.setdefault("UPLOAD_MAX_CONTENT_LENGTHS", dict(DEFAULT_UPLOAD_MAX_CONTENT_LENGTHS))
+    app.config.setdefault("JOB_ROOT", os.path.join(app.root_path, "upload", "jobs"))
+    app.config.setdefault("JOB_QUEUE_MAX_SIZE", JOB_QUEUE_MAX_SIZE)
+    app.config.setdefault("JOB_THREAD_WORKERS", JOB_THREAD_WORKERS)
+    app.config.setdefault("JOB_RESULT_TTL_SECONDS", JOB_RESULT_TTL_SECONDS)
+    app.config.setdefault("ADMISSION_CONTROL_ENABLED", True)
+    app.config.setdefault("ADMISSION_LIMITS", default_admission_limits())
+    app.request_class = UploadRequest
+    app.register_error_handler(RequestEntityTooLarge, handle_request_entity_too_large)
     app.secret_key = 'super secret key'
     app.config['SESSION_TYPE'] = 'filesystem'
     app.config['SWAGGER'] = {
@@ -92,7 +215,7 @@ def create_app():
             examples:
               rgb: ['red', 'green', 'blue']
         """
-        return app.send_static_file("index.html")
+        return get_static_assets(app).serve("index.html")
 
 
     @app.route("/master-recipe-editor")
@@ -107,10 +230,13 @@ def create_app():
             examples:
               rgb: ['red', 'green', 'blue']
         """
-        return app.send_static_file("index.html")
+        return get_static_assets(app).serve("index.html")
 
 
     @app.route('/parse-mtp', methods=['POST'])
+    @admission_class("parse")
+    @background_job()
+    @streamed_upload()
     def parse_mtp_endpoint():
       
       file = request.files.get("file")
@@ -118,15 +244,18 @@ def create_app():
           return jsonify({"error": "No file uploaded"}), 400
 
       try:
-          content = file.read()
-          pea = parse_mtp_aml(content)
-          result = pea_to_dict(pea)
+          with upload_path(file) as mtp_path:
+              result = run_in_job_process(
+                  parse_mtp_file_to_dict, str(mtp_path), include_categories=request.args.get("categories") in ("1", "true")
+              )
           return jsonify(result)
       except Exception as e:
           return jsonify({"error": f"Failed to parse file {file.filename}: {str(e)}"}), 400
 
 
     @app.route('/parse-aas', methods=['POST'])
+    @admission_class("parse")
+    @streamed_upload()
     def parse_aas_endpoint():
         if 'file' not in request.files:
             return jsonify({"error": "No file uploaded"}), 400
@@ -136,8 +265,8 @@ def create_app():
             return jsonify({"error": "Empty filename"}), 400
         
         try:
-            content = file.read()  # bytes
-            capabilities = parse_capabilities_robust_from_bytes(content)
+            with mapped_upload(file) as content:
+                capabilities = parse_capabilities_robust_from_bytes(content)
             return jsonify(capabilities)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -146,24 +275,64 @@ def create_app():
     @app.route('/mtp', methods=['GET'])
     def list_mtp_files():
         """Endpoint to get list of available MTP files on the server.
+            The list comes from the upload catalogue and can be filtered, sorted and paged.
         ---
         tags:
           - MTP
+        parameters:
+          - in: query
+            name: name
+            type: string
+            description: Only files whose name contains this text (case-insensitive).
+          - in: query
+            name: status
+            type: string
+            enum: [ok, error, pending]
+            description: Only files that parsed (ok), failed to parse (error) or have not been parsed yet (pending).
+          - in: query
+            name: pea_name
+            type: string
+          - in: query
+            name: opcua_url
+            type: string
+          - in: query
+            name: sort
+            type: string
+            description: Catalogue field to sort by, prefixed with - for descending order, e.g. -uploaded.
+          - in: query
+            name: limit
+            type: integer
+          - in: query
+            name: offset
+            type: integer
+          - in: query
+            name: details
+            type: boolean
+            description: Return the catalogue entries (size, hash, upload time, parse status, PEA name, OPC UA URL) instead of names.
         responses:
           "200":
-            description: List of MTP files
+            description: List of MTP files; the X-Total-Count header holds the number of matches before paging.
+          "400":
+            description: Invalid sort field or pagination parameter.
         """
+        try:
+            query = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         try:
             mtp_path = app.config["MTP_UPLOAD_ROOT"]
             if not os.path.exists(mtp_path):
                 os.makedirs(mtp_path)
-            
-            files = [f for f in os.listdir(mtp_path) if f.endswith(('.mtp', '.aml'))]
-            return jsonify(files)
+
+            store = BlobStore(mtp_path)
+            store.refresh_in_background(MTP_LISTED_SUFFIXES, describe_pea_file)
+            return listing_response(*store.catalogue.query(MTP_LISTED_SUFFIXES, query), query)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route('/mtp', methods=['POST'])
+    @admission_class("parse")
+    @streamed_upload(lambda: BlobStore(app.config["MTP_UPLOAD_ROOT"]).root)
     def upload_mtp():
         """Endpoint to upload a new MTP file to the server.
         ---
@@ -188,7 +357,9 @@ def create_app():
         if file and allowed_file(file.filename, MTP_ALLOWED_EXTENSIONS):
             filename = secure_filename(file.filename)
             mtp_path = app.config["MTP_UPLOAD_ROOT"]
-            save_uploaded_file(file, mtp_path, filename)
+            saved_path = save_uploaded_file(file, mtp_path, filename)
+            # The file is stored even if it does not parse; the catalogue records the error.
+            BlobStore(mtp_path).describe(saved_path, describe_pea_file)
             return jsonify({"message": "MTP file uploaded successfully"}), 200
         
         return jsonify({"error": "File type not allowed"}), 400
@@ -229,6 +400,8 @@ def create_app():
             return jsonify({"error": str(e)}), 500
 
     @app.route('/mtp/<filename>/parse', methods=['GET'])
+    @admission_class("parse")
+    @background_job()
     def parse_stored_mtp(filename):
         """Endpoint to parse a stored MTP file.
         ---
@@ -239,25 +412,112 @@ def create_app():
             in: path
             type: string
             required: true
+          - name: categories
+            in: query
+            type: string
+            required: false
+            description: Set to 1 to tag every instance with its category (parameter, service-owned, sensor or actuator)
+          - name: fields
+            in: query
+            type: string
+            required: false
+            description: Comma-separated top-level or dotted fields to return, e.g. name,equipment_info.instances
+          - name: format
+            in: query
+            type: string
+            required: false
+            description: full (default) or normalized, where instances, procedures and services appear once, keyed by id
         responses:
           "200":
             description: Parsed MTP data
+          "304":
+            description: Not modified since the ETag given in If-None-Match
         """
         try:
             mtp_path = os.path.join(app.config["MTP_UPLOAD_ROOT"], filename)
             if not os.path.exists(mtp_path):
                 return jsonify({"error": "File not found"}), 404
             
-            with open(mtp_path, 'rb') as f:
-                content = f.read()
-            
-            pea = parse_mtp_aml(content)
-            result = pea_to_dict(pea)
-            return jsonify(result)
+            include_categories = request.args.get("categories") in ("1", "true")
+            response_format = request.args.get("format", "full")
+            if response_format not in PEA_RESPONSE_FORMATS:
+                return jsonify({"error": f"Unknown format '{response_format}', expected one of {sorted(PEA_RESPONSE_FORMATS)}"}), 400
+            to_dict = PEA_RESPONSE_FORMATS[response_format]
+            return cached_json_response(
+                mtp_path,
+                lambda: run_in_job_process(load_pea_file_to_dict, mtp_path, to_dict, include_categories),
+                variant=(include_categories, response_format),
+            )
         except Exception as e:
             return jsonify({"error": f"Failed to parse file {filename}: {str(e)}"}), 400
 
+    @app.route('/mtp/parse-batch', methods=['POST'])
+    @admission_class("parse")
+    @background_job(priority=BATCH_JOB_PRIORITY)
+    def parse_mtp_batch():
+        """Endpoint to parse several stored MTP files concurrently on a process pool.
+        ---
+        tags:
+          - MTP
+        parameters:
+          - name: payload
+            in: body
+            required: true
+            description: '{"files": ["a.aml", "b.aml"]} or {"files": "*"} for all stored files. Set "stream": true (or ?stream=1) to receive one NDJSON line per PEA as soon as it is parsed.'
+        responses:
+          "200":
+            description: Combined parse results, or NDJSON lines when streaming
+          "400":
+            description: Missing or malformed file list
+        """
+        payload = request.get_json(silent=True) or {}
+        requested = payload.get("files")
+        mtp_root = app.config["MTP_UPLOAD_ROOT"]
+
+        if requested == "*":
+            os.makedirs(mtp_root, exist_ok=True)
+            filenames = sorted(f for f in os.listdir(mtp_root) if f.endswith(('.mtp', '.aml')))
+        elif isinstance(requested, list) and requested and all(isinstance(name, str) for name in requested):
+            filenames = list(dict.fromkeys(requested))
+        else:
+            return jsonify({"error": "Expected 'files' to be a non-empty list of filenames or '*'"}), 400
+
+        mtp_paths = {}
+        errors = []
+        for filename in filenames:
+            mtp_path = resolve_safe_file_path(mtp_root, filename)
+            if mtp_path.name != filename or not mtp_path.is_file():
+                errors.append({"filename": filename, "error": "File not found"})
+            else:
+                mtp_paths[filename] = str(mtp_path)
+
+        # A background job keeps the parsing off this process's GIL.
+        in_process = is_background_job()
+        stream = payload.get("stream") is True or request.args.get("stream") in ("1", "true", "ndjson")
+        if stream:
+            def generate_ndjson():
+                for error in errors:
+                    yield json.dumps(error) + "\n"
+                for filename, pea, error in iter_mtp_batch_results(app, mtp_paths, in_process):
+                    line = {"filename": filename, "error": error} if error else {"filename": filename, "pea": pea}
+                    yield json.dumps(line) + "\n"
+
+            return Response(generate_ndjson(), mimetype="application/x-ndjson")
+
+        parsed = {}
+        for filename, pea, error in iter_mtp_batch_results(app, mtp_paths, in_process):
+            if error:
+                errors.append({"filename": filename, "error": error})
+            else:
+                parsed[filename] = pea
+
+        return jsonify({
+            "peas": [{"filename": filename, "pea": parsed[filename]} for filename in filenames if filename in parsed],
+            "errors": errors,
+        })
+
     @app.route('/mtp/<filename>/equipment-info', methods=['GET'])
+    @admission_class("parse")
     def get_mtp_equipment_info(filename):
         """Endpoint to get equipment information from a stored MTP file.
         ---
@@ -268,33 +528,46 @@ def create_app():
             in: path
             type: string
             required: true
+          - name: categories
+            in: query
+            type: string
+            required: false
+            description: Set to 1 to tag every instance with its category (parameter, service-owned, sensor or actuator)
+          - name: fields
+            in: query
+            type: string
+            required: false
+            description: Comma-separated top-level or dotted fields to return, e.g. name,equipment_info.instances
         responses:
           "200":
             description: Equipment information from MTP file
+          "304":
+            description: Not modified since the ETag given in If-None-Match
         """
         try:
             mtp_path = os.path.join(app.config["MTP_UPLOAD_ROOT"], filename)
             if not os.path.exists(mtp_path):
                 return jsonify({"error": "File not found"}), 404
             
-            with open(mtp_path, 'rb') as f:
-                content = f.read()
-            
-            pea = parse_mtp_aml(content)
-            result = pea_to_dict(pea)
-            
-            # Extract equipment info for PropertyWindow display
-            equipment_info = {
-                "source_file": filename,
-                "source_type": "MTP",
-                "equipment_data": result.get("equipment_info", {})
-            }
+            include_categories = request.args.get("categories") in ("1", "true")
+
+            def build_equipment_info():
+                pea = load_or_parse_pea(mtp_path)
+                result = pea_to_dict(pea, include_categories=include_categories)
+                
+                # Extract equipment info for PropertyWindow display
+                return {
+                    "source_file": filename,
+                    "source_type": "MTP",
+                    "equipment_data": result.get("equipment_info", {})
+                }
             
-            return jsonify(equipment_info)
+            return cached_json_response(mtp_path, build_equipment_info, variant=(include_categories,))
         except Exception as e:
             return jsonify({"error": f"Failed to get equipment info from file {filename}: {str(e)}"}), 400
 
     @app.route('/mtp/<filename>/equipment-info/<process_name>', methods=['GET'])
+    @admission_class("parse")
     def get_mtp_filtered_equipment_info(filename, process_name):
         """Endpoint to get filtered equipment information for a specific process from a stored MTP file.
         ---
@@ -309,34 +582,40 @@ def create_app():
             in: path
             type: string
             required: true
+          - name: fields
+            in: query
+            type: string
+            required: false
+            description: Comma-separated top-level or dotted fields to return, e.g. name,equipment_info.instances
         responses:
           "200":
             description: Filtered equipment information for specific process
+          "304":
+            description: Not modified since the ETag given in If-None-Match
         """
         try:
             mtp_path = os.path.join(app.config["MTP_UPLOAD_ROOT"], filename)
             if not os.path.exists(mtp_path):
                 return jsonify({"error": "File not found"}), 404
             
-            with open(mtp_path, 'rb') as f:
-                content = f.read()
-            
-            pea = parse_mtp_aml(content)
-            filtered_equipment = get_filtered_equipment_info(pea, process_name)
+            def build_equipment_info():
+                pea = load_or_parse_pea(mtp_path)
+                filtered_equipment = get_filtered_equipment_info(pea, process_name)
+                
+                # Structure the response for PropertyWindow
+                return {
+                    "source_file": filename,
+                    "source_type": "MTP",
+                    "equipment_data": filtered_equipment,
+                    "target_process": process_name
+                }
             
-            # Structure the response for PropertyWindow
-            equipment_info = {
-                "source_file": filename,
-                "source_type": "MTP",
-                "equipment_data": filtered_equipment,
-                "target_process": process_name
-            }
-            
-            return jsonify(equipment_info)
+            return cached_json_response(mtp_path, build_equipment_info)
         except Exception as e:
             return jsonify({"error": f"Failed to get filtered equipment info from file {filename}: {str(e)}"}), 400
 
     @app.route('/mtp/<filename>/master-recipe-equipment/<process_name>', methods=['GET'])
+    @admission_class("parse")
     def get_mtp_master_recipe_equipment_info(filename, process_name):
         """Endpoint to get master recipe specific equipment information for a specific process.
         ---
@@ -351,30 +630,35 @@ def create_app():
             in: path
             type: string
             required: true
+          - name: fields
+            in: query
+            type: string
+            required: false
+            description: Comma-separated top-level or dotted fields to return, e.g. name,equipment_info.instances
         responses:
           "200":
             description: Master recipe specific equipment information
+          "304":
+            description: Not modified since the ETag given in If-None-Match
         """
         try:
             mtp_path = os.path.join(app.config["MTP_UPLOAD_ROOT"], filename)
             if not os.path.exists(mtp_path):
                 return jsonify({"error": "File not found"}), 404
             
-            with open(mtp_path, 'rb') as f:
-                content = f.read()
+            def build_equipment_info():
+                pea = load_or_parse_pea(mtp_path)
+                master_recipe_equipment = get_master_recipe_equipment_info(pea, process_name)
+                
+                # Structure the response for PropertyWindow
+                return {
+                    "source_file": filename,
+                    "source_type": "MTP",
+                    "equipment_data": master_recipe_equipment,
+                    "target_process": process_name
+                }
             
-            pea = parse_mtp_aml(content)
-            master_recipe_equipment = get_master_recipe_equipment_info(pea, process_name)
-            
-            # Structure the response for PropertyWindow
-            equipment_info = {
-                "source_file": filename,
-                "source_type": "MTP",
-                "equipment_data": master_recipe_equipment,
-                "target_process": process_name
-            }
-            
-            return jsonify(equipment_info)
+            return cached_json_response(mtp_path, build_equipment_info)
         except Exception as e:
             return jsonify({"error": f"Failed to get master recipe equipment info from file {filename}: {str(e)}"}), 400
 
@@ -382,24 +666,61 @@ def create_app():
     @app.route('/aas', methods=['GET'])
     def list_aas_files():
         """Endpoint to get list of available AAS files on the server.
+            The list comes from the upload catalogue and can be filtered, sorted and paged.
         ---
         tags:
           - AAS
+        parameters:
+          - in: query
+            name: name
+            type: string
+            description: Only files whose name contains this text (case-insensitive).
+          - in: query
+            name: status
+            type: string
+            enum: [ok, error, pending]
+          - in: query
+            name: aas_id
+            type: string
+            description: Only files containing the shell with this id.
+          - in: query
+            name: sort
+            type: string
+            description: Catalogue field to sort by, prefixed with - for descending order, e.g. -capability_count.
+          - in: query
+            name: limit
+            type: integer
+          - in: query
+            name: offset
+            type: integer
+          - in: query
+            name: details
+            type: boolean
+            description: Return the catalogue entries (size, hash, upload time, parse status, AAS ids, capability count) instead of names.
         responses:
           "200":
-            description: List of AAS files
+            description: List of AAS files; the X-Total-Count header holds the number of matches before paging.
+          "400":
+            description: Invalid sort field or pagination parameter.
         """
+        try:
+            query = parse_listing_args(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         try:
             aas_path = app.config["AAS_UPLOAD_ROOT"]
             if not os.path.exists(aas_path):
                 os.makedirs(aas_path)
-            
-            files = [f for f in os.listdir(aas_path) if f.endswith('.xml')]
-            return jsonify(files)
+
+            store = BlobStore(aas_path)
+            store.refresh_in_background(AAS_LISTED_SUFFIXES, describe_aas_file)
+            return listing_response(*store.catalogue.query(AAS_LISTED_SUFFIXES, query), query)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
     @app.route('/aas', methods=['POST'])
+    @admission_class("parse")
+    @streamed_upload(lambda: BlobStore(app.config["AAS_UPLOAD_ROOT"]).root)
     def upload_aas():
         """Endpoint to upload a new AAS file to the server.
         ---
@@ -424,7 +745,8 @@ def create_app():
         if file and allowed_file(file.filename, AAS_ALLOWED_EXTENSIONS):
             filename = secure_filename(file.filename)
             aas_path = app.config["AAS_UPLOAD_ROOT"]
-            save_uploaded_file(file, aas_path, filename)
+            saved_path = save_uploaded_file(file, aas_path, filename)
+            BlobStore(aas_path).describe(saved_path, describe_aas_file)
             return jsonify({"message": "AAS file uploaded successfully"}), 200
         
         return jsonify({"error": "File type not allowed"}), 400
@@ -465,6 +787,7 @@ def create_app():
             return jsonify({"error": str(e)}), 500
 
     @app.route('/aas/<filename>/parse', methods=['GET'])
+    @admission_class("parse")
     def parse_stored_aas(filename):
         """Endpoint to parse a stored AAS file.
         ---
@@ -475,24 +798,31 @@ def create_app():
             in: path
             type: string
             required: true
+          - name: fields
+            in: query
+            type: string
+            required: false
+            description: Comma-separated top-level or dotted fields to return, e.g. name,equipment_info.instances
         responses:
           "200":
             description: Parsed AAS data
+          "304":
+            description: Not modified since the ETag given in If-None-Match
         """
         try:
             aas_path = os.path.join(app.config["AAS_UPLOAD_ROOT"], filename)
             if not os.path.exists(aas_path):
                 return jsonify({"error": "File not found"}), 404
             
-            with open(aas_path, 'rb') as f:
-                content = f.read()
+            def build_capabilities():
+                return parse_capabilities_robust_from_bytes(aas_path)
             
-            capabilities = parse_capabilities_robust_from_bytes(content)
-            return jsonify(capabilities)
+            return cached_json_response(aas_path, build_capabilities)
         except Exception as e:
             return jsonify({"error": f"Failed to parse file {filename}: {str(e)}"}), 400
 
     @app.route('/aas/<filename>/equipment-info', methods=['GET'])
+    @admission_class("parse")
     def get_aas_equipment_info(filename):
         """Endpoint to get equipment information from a stored AAS file.
         ---
@@ -503,32 +833,216 @@ def create_app():
             in: path
             type: string
             required: true
+          - name: fields
+            in: query
+            type: string
+            required: false
+            description: Comma-separated top-level or dotted fields to return, e.g. name,equipment_info.instances
         responses:
           "200":
             description: Equipment information from AAS file
+          "304":
+            description: Not modified since the ETag given in If-None-Match
         """
         try:
             aas_path = os.path.join(app.config["AAS_UPLOAD_ROOT"], filename)
             if not os.path.exists(aas_path):
                 return jsonify({"error": "File not found"}), 404
             
-            with open(aas_path, 'rb') as f:
-                content = f.read()
+            def build_equipment_info():
+                # Get equipment info using the new function
+                equipment_data = parse_aas_equipment_info(aas_path)
+                
+                # Structure the response for PropertyWindow
+                return {
+                    "source_file": filename,
+                    "source_type": "AAS",
+                    "equipment_data": equipment_data
+                }
             
-            # Get equipment info using the new function
-            equipment_data = parse_aas_equipment_info(content)
-            
-            # Structure the response for PropertyWindow
-            equipment_info = {
-                "source_file": filename,
-                "source_type": "AAS",
-                "equipment_data": equipment_data
-            }
-            
-            return jsonify(equipment_info)
+            return cached_json_response(aas_path, build_equipment_info)
         except Exception as e:
             return jsonify({"error": f"Failed to get equipment info from file {filename}: {str(e)}"}), 400
 
+    @app.route('/metrics')
+    def metrics():
+        """Endpoint exposing request, subsystem and cache metrics in the Prometheus text format.
+        ---
+        tags:
+          - Monitoring
+        responses:
+          "200":
+            description: Metrics of this server process.
+          "404":
+            description: Metrics are disabled by the METRICS_ENABLED config.
+        """
+        if not app.config["METRICS_ENABLED"]:
+            return make_response("Metrics are disabled.", 404)
+        pea_cache_stats = get_pea_cache_stats()
+        cache_stats = {
+            "response": get_response_cache(app).stats(),
+            "validation": RecipeAPI.validation_cache.stats(),
+            "pea_memory": pea_cache_stats["memory"],
+            "pea_snapshot": pea_cache_stats["snapshot"],
+        }
+        collectors = [lambda: collect_cache_metrics(cache_stats)]
+        if "admission_gates" in app.extensions:
+            collectors.append(lambda: collect_admission_metrics(app.extensions["admission_gates"]))
+        body = REGISTRY.render(*collectors)
+        return Response(body, content_type=METRICS_CONTENT_TYPE)
+
+    @app.route('/profiles')
+    def list_request_profiles():
+        """Endpoint listing the stored request profiles, newest first.
+            Requests are profiled when PROFILING_ENABLED is set and they carry ?profile=1 or an X-Profile: 1 header.
+        ---
+        tags:
+          - Monitoring
+        parameters:
+          - name: X-Profile-Token
+            in: header
+            type: string
+            required: false
+            description: Required when PROFILING_TOKEN is configured.
+        responses:
+          "200":
+            description: Name, size and creation time of every stored profile.
+          "404":
+            description: Profiling is disabled or the token does not match.
+        """
+        if not is_profiling_authorized():
+            return make_response("Profiling is disabled.", 404)
+        return jsonify(list_profiles(app.config["PROFILE_UPLOAD_ROOT"]))
+
+    @app.route('/profiles/<filename>')
+    def get_request_profile(filename):
+        """Endpoint to download a stored request profile as pstats file or as text summary.
+        ---
+        tags:
+          - Monitoring
+        parameters:
+          - name: filename
+            in: path
+            type: string
+            required: true
+          - name: format
+            in: query
+            type: string
+            enum: [pstats, text]
+            required: false
+          - name: sort
+            in: query
+            type: string
+            enum: [cumulative, tottime, calls]
+            required: false
+        responses:
+          "200":
+            description: The pstats file or its summary table.
+          "404":
+            description: Profiling is disabled or the profile does not exist.
+        """
+        if not is_profiling_authorized():
+            return make_response("Profiling is disabled.", 404)
+        try:
+            profile_path = resolve_safe_file_path(app.config["PROFILE_UPLOAD_ROOT"], filename)
+        except FileNotFoundError:
+            return make_response("Profile not found.", 404)
+        if not profile_path.is_file():
+            return make_response("Profile not found.", 404)
+        if request.args.get("format") == "text":
+            sort_key = request.args.get("sort", "cumulative")
+            if sort_key not in PROFILE_SORT_KEYS:
+                return make_response(f"sort must be one of {', '.join(PROFILE_SORT_KEYS)}.", 400)
+            return Response(format_profile_summary(profile_path, sort_key), mimetype="text/plain")
+        return send_from_directory(profile_path.parent, profile_path.name, as_attachment=True)
+
+    @app.route('/jobs')
+    def list_jobs():
+        """Endpoint listing the background jobs of all server processes, newest first.
+            Long-running endpoints are run as background jobs when called with ?async=1; they then answer 202 with the job's URL in Location.
+        ---
+        tags:
+          - Jobs
+        responses:
+          "200":
+            description: Id, name, status, priority and timestamps of every job.
+        """
+        return jsonify([job.to_dict() for job in get_job_queue(app).jobs()])
+
+    @app.route('/jobs/<job_id>')
+    def get_job(job_id):
+        """Endpoint to get the status of a background job.
+        ---
+        tags:
+          - Jobs
+        parameters:
+          - name: job_id
+            in: path
+            type: string
+            required: true
+        responses:
+          "200":
+            description: The job's status (queued, running, done, failed or cancelled) and, once done, the status code of its response.
+          "404":
+            description: Unknown job, or its result has expired.
+        """
+        job = get_job_queue(app).get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/jobs/<job_id>/result')
+    def get_job_result(job_id):
+        """Endpoint to get the response of a finished background job, as the endpoint sent it.
+        ---
+        tags:
+          - Jobs
+        parameters:
+          - name: job_id
+            in: path
+            type: string
+            required: true
+        responses:
+          "200":
+            description: The stored response, with the status code and headers it was sent with.
+          "404":
+            description: Unknown job, or its result has expired.
+          "409":
+            description: The job has not finished, or failed or was cancelled.
+        """
+        job = get_job_queue(app).get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        if job.status != DONE:
+            return jsonify(job.to_dict()), 409
+        result = get_job_queue(app).response(job_id)
+        if result is None:
+            return jsonify({"error": "Job not found"}), 404
+        return Response(result.body, status=result.status, headers=result.headers)
+
+    @app.route('/jobs/<job_id>', methods=['DELETE'])
+    def cancel_job(job_id):
+        """Endpoint to cancel a background job.
+            A queued job never runs; the result of a running job is discarded when it finishes.
+        ---
+        tags:
+          - Jobs
+        parameters:
+          - name: job_id
+            in: path
+            type: string
+            required: true
+        responses:
+          "200":
+            description: The job's status after the cancellation.
+          "404":
+            description: Unknown job, or its result has expired.
+        """
+        job = get_job_queue(app).cancel(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job.to_dict())
+
     # Make the other static files availible.
     # When index.html is opened from the "editor endpoint" the javascript and css and logo etc can get loaded by the client
     @app.route('/<path:filename>')
@@ -550,10 +1064,7 @@ def create_app():
             examples:
               rgb: ['red', 'green', 'blue']
         """
-        response = make_response(send_from_directory(app.static_folder, filename))
-        mimetype, _ = mimetypes.guess_type(filename)
-        response.headers['Content-Type'] = mimetype
-        return response
+        return get_static_assets(app).serve(filename)
 
     '''
     @app.route('/CapabilityMatching/AAS/basic', methods=['POST'])
@@ -613,6 +1124,9 @@ def create_app():
     '''
     
     @app.route('/CapabilityMatching/AAS', methods=['POST'])
+    @admission_class("match")
+    @background_job()
+    @streamed_upload()
     def check_capabilities_complex():
         """Endpoint to match Capabilities of a zip file with ".xml" AAS files and a general Recipe.
         ---
@@ -641,8 +1155,8 @@ def create_app():
           flash('No file part')
           return make_response(request.url, 400)
         recipe = request.files['recipe']
-        recipe_content = recipe.read()
-        recipe_capabilities = get_all_recipe_capabilities(recipe_content)
+        with mapped_upload(recipe) as recipe_content:
+            recipe_capabilities = get_all_recipe_capabilities(recipe_content)
         unique_recipe_capabilities = set(item['IRI'] for item in recipe_capabilities)
         
         if 'aas' not in request.files:
@@ -680,6 +1194,9 @@ def create_app():
             return make_response(string, 200)
           
     @app.route('/CapabilityMatching/AASX', methods=['POST'])
+    @admission_class("match")
+    @background_job()
+    @streamed_upload()
     def capability_Matching_AASX():
         """Endpoint to Match Capabilities of an AASX and a General Recipe.
         ---
@@ -708,8 +1225,8 @@ def create_app():
           flash('No file part')
           return make_response(request.url, 400)
         recipe = request.files['recipe']
-        recipe_content = recipe.read()
-        recipe_capabilities = get_all_recipe_capabilities(recipe_content)
+        with mapped_upload(recipe) as recipe_content:
+            recipe_capabilities = get_all_recipe_capabilities(recipe_content)
         unique_recipe_capabilities = set(item['IRI'] for item in recipe_capabilities)
         
         if 'aasx' not in request.files:
@@ -749,6 +1266,15 @@ def create_app():
     app.register_blueprint(ontology_api)
     app.register_blueprint(recipe_api)
     app.register_blueprint(aas_api)
+    install_request_profiling(app)
+    if app.config["METRICS_ENABLED"]:
+        install_request_metrics(app)
+    install_background_jobs(app, process_pool=lambda: get_mtp_parse_pool(app))
+    if app.config["ADMISSION_CONTROL_ENABLED"]:
+        install_admission_control(app)
+    app.after_request(compress_response)
+    if app.config["WARM_UP_ON_STARTUP"]:
+        warm_up()
     return app
 
 
@@ -761,7 +1287,9 @@ def create_app():
 # debug is for testing to make this production ready read:
 # https://zhangtemplar.github.io/flask/
 if __name__ == '__main__':
+    from flasgger import Swagger
     app = create_app()
     swagger = Swagger(app)
-    #serve(app, host='0.0.0.0', port=8080) #this starts the production server
+    refresh_upload_catalogues(app)
+    # the production server (waitress, optionally several worker processes) is started by productionServer.py
     app.run(debug=True, port=5000) #this starts the development server
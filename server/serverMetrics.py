@@ -0,0 +1,294 @@
+"""Request and subsystem metrics in Prometheus text format.
+
+Metrics are kept in memory per process in REGISTRY and rendered on ``/metrics``:
+
+- per-route request latency, request/response sizes, status and error counts and the
+  number of requests in flight, recorded by the hooks of install_request_metrics;
+- durations of MTP parsing, XSD validation, ontology loading, AAS parsing and the AAS
+  compliance check, recorded with timed()/observe_duration();
+- hit ratios of the response, validation and PEA caches, read when rendering.
+
+When the production server runs several worker processes, every worker reports its
+own metrics.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from functools import wraps
+import math
+import threading
+import time
+
+from flask import g, request
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = tuple(256 * 4 ** exponent for exponent in range(10))  # 256 B .. 64 MiB
+# route label of requests that did not match any URL rule
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(labelnames: tuple, labelvalues: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labelvalues, value in items:
+            lines.extend(self.render_sample(labelvalues, value))
+        return lines
+
+    def render_sample(self, labelvalues: tuple, value) -> list:
+        return [f"{self.name}{format_labels(self.labelnames, labelvalues)} {format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, labelvalues: tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, labelvalues: tuple = ()) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labelvalues: tuple = (), amount: float = 1) -> None:
+        self.inc(labelvalues, -amount)
+
+    def set(self, value: float, labelvalues: tuple = ()) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labelvalues: tuple = ()) -> None:
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                # per-bucket (not cumulative) counts, sum, count
+                state = self._values[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][position] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def get_count(self, labelvalues: tuple = ()) -> int:
+        with self._lock:
+            state = self._values.get(labelvalues)
+            return state[2] if state is not None else 0
+
+    def render_sample(self, labelvalues: tuple, state) -> list:
+        bucket_counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            cumulative += bucket_count
+            labels = format_labels(self.labelnames, labelvalues, f'le="{format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = format_labels(self.labelnames, labelvalues, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Metric {name} is already registered as a {metric.type}.")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collect) -> None:
+        """Registers collect(), called on every render and returning freshly filled metrics."""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self, *collectors) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors) + list(collectors)
+        for collect in collectors:
+            metrics.extend(collect())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "recipe_editor_http_requests_total", "HTTP requests by method, route and status code.", ("method", "route", "status")
+)
+HTTP_REQUEST_ERRORS = REGISTRY.counter(
+    "recipe_editor_http_request_errors_total",
+    "HTTP requests answered with a 5xx status or an unhandled exception.",
+    ("method", "route"),
+)
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "recipe_editor_http_request_duration_seconds", "Time spent handling HTTP requests.", ("method", "route")
+)
+HTTP_REQUEST_SIZE = REGISTRY.histogram(
+    "recipe_editor_http_request_size_bytes", "Declared sizes of HTTP request bodies.", ("route",), SIZE_BUCKETS
+)
+HTTP_RESPONSE_SIZE = REGISTRY.histogram(
+    "recipe_editor_http_response_size_bytes",
+    "Sizes of HTTP response bodies as sent, excluding streamed responses.",
+    ("route",),
+    SIZE_BUCKETS,
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.gauge("recipe_editor_http_requests_in_flight", "HTTP requests being handled.")
+SUBSYSTEM_DURATION = REGISTRY.histogram(
+    "recipe_editor_subsystem_duration_seconds",
+    "Time spent in MTP parsing, XSD validation, ontology loading, AAS parsing and AAS compliance checks.",
+    ("subsystem", "outcome"),
+)
+
+
+@contextmanager
+def observe_duration(subsystem: str):
+    """Records the duration of the enclosed block in SUBSYSTEM_DURATION."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        SUBSYSTEM_DURATION.observe(time.perf_counter() - started, (subsystem, outcome))
+
+
+def timed(subsystem: str):
+    """Decorator recording every call of the function with observe_duration."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with observe_duration(subsystem):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def collect_cache_metrics(cache_stats: dict) -> list:
+    """Metrics of {cache name: stats()} for caches reporting hits, misses and entries."""
+    hits = Counter("recipe_editor_cache_hits_total", "Cache lookups answered from the cache.", ("cache",))
+    misses = Counter("recipe_editor_cache_misses_total", "Cache lookups that missed.", ("cache",))
+    evictions = Counter("recipe_editor_cache_evictions_total", "Entries evicted to respect the cache bound.", ("cache",))
+    entries = Gauge("recipe_editor_cache_entries", "Entries currently held by the cache.", ("cache",))
+    hit_ratio = Gauge("recipe_editor_cache_hit_ratio", "Share of cache lookups answered from the cache.", ("cache",))
+    for name, stats in cache_stats.items():
+        labels = (name,)
+        hits.inc(labels, stats["hits"])
+        misses.inc(labels, stats["misses"])
+        evictions.inc(labels, stats.get("evictions", 0))
+        entries.set(stats.get("entries", stats.get("size", 0)), labels)
+        hit_ratio.set(stats["hitRatio"], labels)
+    return [hits, misses, evictions, entries, hit_ratio]
+
+
+def get_route_label() -> str:
+    return request.url_rule.rule if request.url_rule is not None else UNMATCHED_ROUTE
+
+
+def start_request_metrics():
+    g.metrics_started = time.perf_counter()
+    g.metrics_recorded = False
+    HTTP_REQUESTS_IN_FLIGHT.inc()
+
+
+def record_request_metrics(response):
+    started = g.get("metrics_started")
+    if started is None:
+        return response
+    route = get_route_label()
+    HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, (request.method, route))
+    HTTP_REQUESTS.inc((request.method, route, str(response.status_code)))
+    if response.status_code >= 500:
+        HTTP_REQUEST_ERRORS.inc((request.method, route))
+    if request.content_length is not None:
+        HTTP_REQUEST_SIZE.observe(request.content_length, (route,))
+    if not response.is_streamed and response.content_length is not None:
+        HTTP_RESPONSE_SIZE.observe(response.content_length, (route,))
+    g.metrics_recorded = True
+    return response
+
+
+def finish_request_metrics(exc):
+    started = g.get("metrics_started")
+    if started is None:
+        return
+    g.metrics_started = None
+    HTTP_REQUESTS_IN_FLIGHT.dec()
+    if not g.get("metrics_recorded"):
+        # the request ended with an exception before a response was built
+        route = get_route_label()
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, (request.method, route))
+        HTTP_REQUESTS.inc((request.method, route, "500"))
+        HTTP_REQUEST_ERRORS.inc((request.method, route))
+
+
+def install_request_metrics(app) -> None:
+    """Registers the request hooks. after_request hooks run in reverse order, so installing
+    these before the compression hook records the compressed response sizes."""
+    app.before_request(start_request_metrics)
+    app.after_request(record_request_metrics)
+    app.teardown_request(finish_request_metrics)
@@ -0,0 +1,190 @@
+"""Serving of the Vite build in static/ with precompressed variants and cache headers.
+
+Asset metadata (size, mtime, sha256 ETag, mimetype) is kept in an in-memory table that
+is filled on first request and refreshed when a file changes on disk. Content-hashed
+file names (``index-<hash>.js``) are served as immutable. Compressed variants come from
+``.br``/``.gz`` sidecar files when present, built with
+
+    python -m staticAssets [static_dir]
+
+and are otherwise compressed once in memory.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from io import BytesIO
+from pathlib import Path
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import abort, current_app, request, send_file
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+STATIC_ASSET_MAX_AGE = 365 * 24 * 60 * 60
+# Vite appends an 8 character content hash to the names of built assets.
+HASHED_ASSET_PATTERN = re.compile(r"-[0-9a-f]{8,}\.[A-Za-z0-9]+$")
+COMPRESSIBLE_SUFFIXES = frozenset({".js", ".mjs", ".css", ".html", ".json", ".svg", ".ico", ".txt", ".map"})
+# content coding -> sidecar suffix, in server preference order
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def compress_asset(data: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def available_asset_codings() -> list:
+    return [coding for coding in SIDECAR_SUFFIXES if coding != "br" or brotli is not None]
+
+
+@dataclass
+class StaticAsset:
+    path: Path
+    size: int
+    mtime_ns: int
+    etag: str
+    mimetype: str
+    immutable: bool
+    compressible: bool
+    # content coding -> sidecar path, or compressed bytes when there is no sidecar
+    variants: dict = field(default_factory=dict)
+
+
+class StaticAssetTable:
+    def __init__(self, root):
+        self.root = str(root)
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, filename: str) -> StaticAsset | None:
+        path = safe_join(self.root, filename)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        asset = self._assets.get(path)
+        if asset is None or asset.size != stat.st_size or asset.mtime_ns != stat.st_mtime_ns:
+            asset = self._load(Path(path), stat)
+            with self._lock:
+                self._assets[path] = asset
+        return asset
+
+    def _load(self, path: Path, stat) -> StaticAsset:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        asset = StaticAsset(
+            path=path,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            etag=digest.hexdigest(),
+            mimetype=mimetypes.guess_type(path.name)[0] or "application/octet-stream",
+            immutable=bool(HASHED_ASSET_PATTERN.search(path.name)),
+            compressible=path.suffix.lower() in COMPRESSIBLE_SUFFIXES,
+        )
+        for coding, suffix in SIDECAR_SUFFIXES.items():
+            sidecar = path.with_name(path.name + suffix)
+            try:
+                if sidecar.stat().st_mtime_ns >= stat.st_mtime_ns:
+                    asset.variants[coding] = sidecar
+            except OSError:
+                pass
+        return asset
+
+    def get_variant(self, asset: StaticAsset, coding: str):
+        """Returns the sidecar path or compressed bytes of an asset, compressing on first use."""
+        variant = asset.variants.get(coding)
+        if variant is None:
+            variant = compress_asset(asset.path.read_bytes(), coding)
+            with self._lock:
+                variant = asset.variants.setdefault(coding, variant)
+        return variant
+
+    def choose_coding(self, asset: StaticAsset) -> str | None:
+        if not asset.compressible or asset.size < current_app.config["COMPRESSION_MIN_SIZE"]:
+            return None
+        compressors = available_asset_codings()
+        codings = [coding for coding in SIDECAR_SUFFIXES if coding in asset.variants or coding in compressors]
+        return request.accept_encodings.best_match(codings)
+
+    def serve(self, filename: str):
+        asset = self.lookup(filename)
+        if asset is None:
+            abort(404)
+
+        coding = self.choose_coding(asset)
+        if coding is None:
+            response = send_file(
+                asset.path, mimetype=asset.mimetype, etag=asset.etag, last_modified=asset.mtime_ns / 1e9, conditional=True
+            )
+        else:
+            variant = self.get_variant(asset, coding)
+            source = variant if isinstance(variant, Path) else BytesIO(variant)
+            response = send_file(
+                source,
+                mimetype=asset.mimetype,
+                etag=f"{asset.etag}-{coding}",
+                last_modified=asset.mtime_ns / 1e9,
+                conditional=True,
+            )
+            response.headers["Content-Encoding"] = coding
+
+        if asset.compressible:
+            response.vary.add("Accept-Encoding")
+        if asset.immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config["STATIC_ASSET_MAX_AGE"]
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+
+def get_static_assets(app=None) -> StaticAssetTable:
+    app = app or current_app
+    table = app.extensions.get("static_assets")
+    if table is None:
+        table = app.extensions.setdefault("static_assets", StaticAssetTable(app.static_folder))
+    return table
+
+
+def precompress_static_assets(static_dir) -> list:
+    """Writes .br/.gz sidecars next to every compressible asset; returns the written paths."""
+    written = []
+    for path in sorted(Path(static_dir).rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in COMPRESSIBLE_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        for coding in available_asset_codings():
+            sidecar = path.with_name(path.name + SIDECAR_SUFFIXES[coding])
+            compressed = compress_asset(data, coding)
+            if len(compressed) < len(data):
+                sidecar.write_bytes(compressed)
+                written.append(sidecar)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompress the static assets of the Recipe Editor.")
+    parser.add_argument("static_dir", nargs="?", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    args = parser.parse_args()
+    for sidecar in precompress_static_assets(args.static_dir):
+        print(sidecar)
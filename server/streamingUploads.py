@@ -0,0 +1,206 @@
+"""Streaming of uploaded files to disk, with per-endpoint size limits and incremental hashing.
+
+By default Werkzeug keeps file parts of up to 500 KB in memory and spools larger ones
+to anonymous temporary files, and the upload endpoints then read them completely
+before doing anything with them. For views decorated with @streamed_upload, every
+file part is instead written to a named file in a spool directory as it arrives, and
+its SHA-256 is computed on the way:
+
+- uploads that are stored spool into the blob store of their upload directory, so
+  storing them is a rename, and they are not hashed a second time;
+- parsers get the spooled file memory-mapped (mapped_upload) or by path
+  (upload_path) instead of a copy of its content;
+- the request body is limited to the endpoint's entry in the app config's
+  UPLOAD_MAX_CONTENT_LENGTHS (MAX_CONTENT_LENGTH for endpoints without one), and
+  larger requests are rejected with 413 before their body is read where the
+  Content-Length allows it.
+
+Peak memory therefore no longer grows with the size of the uploads being received.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from pathlib import Path
+import functools
+import hashlib
+import os
+import tempfile
+
+from flask import Request, current_app, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from xmlInput import mapped_file
+
+
+MIB = 1024 * 1024
+# Request body limits of the upload endpoints, in bytes.
+DEFAULT_UPLOAD_MAX_CONTENT_LENGTHS = {
+    "upload_mtp": 256 * MIB,
+    "parse_mtp_endpoint": 256 * MIB,
+    "upload_aas": 64 * MIB,
+    "parse_aas_endpoint": 64 * MIB,
+    "check_capabilities_complex": 256 * MIB,
+    "capability_Matching_AASX": 256 * MIB,
+    "aas_api.get_aasx_capabilities": 256 * MIB,
+    "aas_api.get_aas_capabilities": 256 * MIB,
+    "aas_api.validate_aasx": 256 * MIB,
+    "aas_api.validate_aas": 64 * MIB,
+}
+SPOOL_SUFFIX = ".part"
+
+
+class SpooledUpload:
+    """A file part written to a named file as it is received, hashing what is written.
+
+    The file is deleted when the upload is closed, unless it has been claimed.
+    """
+
+    def __init__(self, directory):
+        fd, path = tempfile.mkstemp(dir=directory, suffix=SPOOL_SUFFIX)
+        self.path = Path(path)
+        self.size = 0
+        self.claimed = False
+        self._file = os.fdopen(fd, "w+b")
+        self._digest = hashlib.sha256()
+
+    @property
+    def name(self) -> str:
+        return str(self.path)
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def write(self, data) -> int:
+        if self._digest is not None and self._file.tell() == self.size:
+            self._digest.update(data)
+        else:
+            # Only a sequentially written content can be hashed on the way.
+            self._digest = None
+        written = self._file.write(data)
+        self.size = max(self.size, self._file.tell())
+        return written
+
+    def hexdigest(self) -> str | None:
+        """SHA-256 of the content, or None if it was not written sequentially."""
+        return self._digest.hexdigest() if self._digest is not None else None
+
+    def claim(self) -> Path:
+        """Closes the upload and hands its file over to the caller, who becomes responsible for it."""
+        self._file.close()
+        self.claimed = True
+        return self.path
+
+    def read(self, size: int = -1) -> bytes:
+        return self._file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self._file.readline(size)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self._file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def close(self) -> None:
+        self._file.close()
+        if not self.claimed:
+            self.path.unlink(missing_ok=True)
+
+
+class UploadRequest(Request):
+    """Request whose file parts are spooled to upload_spool_directory, when one is set."""
+
+    upload_spool_directory: Path | None = None
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if self.upload_spool_directory is None:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        self.upload_spool_directory.mkdir(parents=True, exist_ok=True)
+        return SpooledUpload(self.upload_spool_directory)
+
+
+def limit_request_body() -> None:
+    """Limits the current request's body to its endpoint's UPLOAD_MAX_CONTENT_LENGTHS entry.
+
+    Raises RequestEntityTooLarge right away if the declared Content-Length is larger.
+    """
+    limit = current_app.config["UPLOAD_MAX_CONTENT_LENGTHS"].get(
+        request.endpoint, current_app.config["MAX_CONTENT_LENGTH"]
+    )
+    request.max_content_length = limit
+    if limit is not None and request.content_length is not None and request.content_length > limit:
+        raise RequestEntityTooLarge()
+
+
+def streamed_upload(spool_directory=None):
+    """Streams the file parts of the decorated view's requests to disk and limits their size.
+
+    spool_directory is a callable returning the directory to spool to; it should be on
+    the file system the uploads are stored on. Without it, parts go to the system's
+    temporary directory.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            limit_request_body()
+            request.upload_spool_directory = Path(spool_directory() if spool_directory else tempfile.gettempdir())
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def handle_request_entity_too_large(error):
+    limit = request.max_content_length
+    message = "Request body too large"
+    if limit is not None:
+        message += f"; this endpoint accepts at most {limit} bytes"
+    return jsonify({"error": message}), 413
+
+
+@contextmanager
+def mapped_upload(file_storage):
+    """The content of an uploaded file, memory-mapped when it was spooled to disk."""
+    stream = file_storage.stream
+    if not isinstance(stream, SpooledUpload):
+        yield file_storage.read()
+        return
+    stream.flush()
+    with mapped_file(stream.path) as mapped:
+        yield mapped
+
+
+@contextmanager
+def upload_path(file_storage):
+    """A path to the uploaded file on disk, written to a temporary file if it was not spooled."""
+    stream = file_storage.stream
+    if isinstance(stream, SpooledUpload):
+        stream.flush()
+        yield stream.path
+        return
+    fd, temp_path = tempfile.mkstemp(suffix=SPOOL_SUFFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            file_storage.save(f)
+        yield Path(temp_path)
+    finally:
+        os.remove(temp_path)
@@ -1,9 +1,11 @@
-from server import create_app
+from server import create_app, refresh_upload_catalogues
 import pytest
 import io
 from pathlib import Path
 import sys
 import textwrap
+import threading
+from blobStore import BlobStore
 
 PROCESS_RDFXML = """<?xml version="1.0"?>
 <rdf:RDF xmlns="http://example.com/process#"
@@ -192,12 +194,15 @@ def app(tmp_path):
         ONTOLOGY_CONVERTER_TIMEOUT_SECONDS=10,
         MTP_UPLOAD_ROOT=str(mtp_root),
         AAS_UPLOAD_ROOT=str(aas_root),
+        PROFILE_UPLOAD_ROOT=str(tmp_path / "profiles"),
+        JOB_ROOT=str(tmp_path / "jobs"),
     )
 
     write_ontology(ontology_root / "processes" / "ProcessOntology.owl", PROCESS_RDFXML)
     write_ontology(ontology_root / "materials" / "MaterialOntology.owl", MATERIAL_RDFXML)
     write_ontology(mtp_root / "plant.mtp", "<mtp />")
     write_ontology(aas_root / "robot.xml", "<aas />")
+    refresh_upload_catalogues(app)
     print(app.url_map)
     return app
 
@@ -468,6 +473,98 @@ def test_post_onto_manchester_without_converter_returns_422(client, app):
     assert "conversion is not configured" in payload["details"].lower()
 
 
+def test_post_onto_accepts_gzip_and_utf16_uploads(client):
+    import gzip
+
+    response = client.post(
+        '/onto/materials',
+        data={'file': (io.BytesIO(gzip.compress(MATERIAL_TURTLE.encode('utf-8'))), 'Copper.ttl.gz')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+    payload = response.get_json()
+    assert payload["detectedFormat"] == "turtle"
+    assert client.get(f'/onto/materials/{payload["filename"]}/classes').get_json() == ["Copper", "MaterialRoot"]
+
+    response = client.post(
+        '/onto/materials',
+        data={'file': (io.BytesIO(MATERIAL_TURTLE.encode('utf-16')), 'Utf16.ttl')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+    assert response.get_json()["detectedFormat"] == "turtle"
+
+    utf16_rdfxml = PROCESS_RDFXML.replace('<?xml version="1.0"?>', '<?xml version="1.0" encoding="UTF-16"?>')
+    response = client.post(
+        '/onto/processes',
+        data={'file': (io.BytesIO(utf16_rdfxml.encode('utf-16')), 'Utf16.owl')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 201
+    assert response.get_json()["detectedFormat"] == "rdfxml"
+
+    response = client.post(
+        '/onto/materials',
+        data={'file': (io.BytesIO(b'\x1f\x8bnot gzip'), 'broken.owl.gz')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 422
+
+
+def test_post_onto_rejects_gzip_uploads_over_the_unpacked_limit(client, app):
+    import gzip
+
+    app.config["ONTOLOGY_MAX_UNPACKED_BYTES"] = 1024 * 1024
+    bomb = gzip.compress(MATERIAL_TURTLE.encode('utf-8') + b"#" * (8 * 1024 * 1024))
+    assert len(bomb) < 64 * 1024
+
+    response = client.post(
+        '/onto/materials',
+        data={'file': (io.BytesIO(bomb), 'Bomb.ttl.gz')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 422
+    assert "too large" in response.get_json()["error"]
+    assert list(Path(app.config["ONTOLOGY_STAGING_ROOT"]).iterdir()) == []
+    assert client.get('/onto/materials').get_json() == ["MaterialOntology.owl"]
+
+
+def test_ontology_sniffer_ranks_candidates_from_a_bounded_prefix(tmp_path, monkeypatch):
+    import codecs
+    from ontologyService import detect_ontology_format
+    from ontologySniffer import sniff_ontology_file
+
+    def fail_read_bytes(path):
+        raise AssertionError(f"{path} was read completely")
+
+    monkeypatch.setattr(Path, "read_bytes", fail_read_bytes)
+    large = tmp_path / "large.owl"
+    with large.open("w", encoding="utf-8") as f:
+        f.write(PROCESS_RDFXML.replace("</rdf:RDF>", ""))
+        f.write("<!-- padding -->\n" * 100_000)
+        f.write("</rdf:RDF>\n")
+    assert detect_ontology_format(large) == "rdfxml"
+
+    samples = {
+        "turtle.ttl": (MATERIAL_TURTLE.encode("utf-8"), "turtle", "utf-8"),
+        "manchester.omn": (MANCHESTER_MATERIAL.encode("utf-8"), "manchester", "utf-8"),
+        "bom.owl": (codecs.BOM_UTF8 + PROCESS_RDFXML.encode("utf-8"), "rdfxml", "utf-8"),
+        "utf16be.ttl": (MATERIAL_TURTLE.encode("utf-16-be"), "turtle", "utf-16-be"),
+        "triples.nt": (b'<http://example.com/a> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://www.w3.org/2002/07/owl#Class> .\n', "ntriples", "utf-8"),
+        "plain.txt": (b"not an ontology", "unknown", "utf-8"),
+    }
+    for name, (content, expected_format, expected_encoding) in samples.items():
+        path = tmp_path / name
+        path.write_bytes(content)
+        sniffed = sniff_ontology_file(path)
+        assert (sniffed.format, sniffed.encoding) == (expected_format, expected_encoding), name
+        confidences = [candidate.confidence for candidate in sniffed.candidates]
+        assert confidences == sorted(confidences, reverse=True)
+        assert all(0 < confidence <= 1 for confidence in confidences)
+
+    triples = sniff_ontology_file(tmp_path / "triples.nt")
+    assert [candidate.format for candidate in triples.candidates] == ["ntriples", "turtle"]
+
 def test_delete_mtp_file(client, app):
     mtp_path = Path(app.config["MTP_UPLOAD_ROOT"]) / "plant.mtp"
 
@@ -497,6 +594,113 @@ def test_get_onto_skips_invalid_files(client, app):
     assert response.get_json() == ['ProcessOntology.owl']
 
 
+def test_get_onto_lists_catalogue_details_including_invalid_files_on_request(client, app):
+    ontology_root = Path(app.config["ONTOLOGY_UPLOAD_ROOT"])
+    write_ontology(ontology_root / "processes" / "broken.owl", "not an ontology")
+    refresh_catalogue_in_background(client, '/onto/processes', ontology_root / "processes")
+
+    response = client.get('/onto/processes?details=1&status=error')
+    assert response.status_code == 200
+    [entry] = response.get_json()
+    assert entry["name"] == "broken.owl"
+    assert entry["parse_status"] == "error"
+
+    details = client.get('/onto/processes?details=1').get_json()
+    assert [(entry["name"], entry["parse_status"]) for entry in details] == [("ProcessOntology.owl", "ok")]
+    assert details[0]["class_count"] > 0
+
+
+def test_list_mtp_and_aas_files_filter_sort_and_page_from_catalogue(client, app, monkeypatch):
+    from benchmarks.workloads import generate_aas_v3_xml
+
+    mtp_root = Path(app.config["MTP_UPLOAD_ROOT"])
+    write_ontology(mtp_root / "broken.mtp", "not an MTP")
+    refresh_catalogue_in_background(client, '/mtp', mtp_root)
+    hc30 = BUNDLED_HC30_MTP.read_bytes()
+    for name in ("b_hc30.aml", "a_hc30.aml"):
+        response = client.post('/mtp', data={'file': (io.BytesIO(hc30), name)}, content_type='multipart/form-data')
+        assert response.status_code == 200
+    response = client.post(
+        '/aas',
+        data={'file': (io.BytesIO(generate_aas_v3_xml(capabilities=3, name="Cell")), 'cell.xml')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+
+    response = client.get('/mtp')
+    assert response.get_json() == ["a_hc30.aml", "b_hc30.aml", "broken.mtp", "plant.mtp"]
+    assert response.headers["X-Total-Count"] == "4"
+    assert client.get('/aas').get_json() == ["cell.xml", "robot.xml"]
+
+    described = []
+    monkeypatch.setattr("server.describe_pea_file", described.append)
+    monkeypatch.setattr("server.describe_aas_file", described.append)
+
+    page = client.get('/mtp?status=ok&sort=-name&limit=2&offset=1')
+    assert page.get_json() == ["b_hc30.aml", "a_hc30.aml"]
+    assert page.headers["X-Total-Count"] == "3"
+
+    [entry] = client.get('/mtp?name=B_HC&details=1').get_json()
+    assert entry["size"] == len(hc30)
+    assert entry["parse_status"] == "ok"
+    assert entry["pea_name"]
+    assert entry["opcua_url"]
+    assert entry["uploaded"]
+    assert client.get(f'/mtp?pea_name={entry["pea_name"]}').get_json() == ["a_hc30.aml", "b_hc30.aml"]
+    assert client.get('/mtp?status=error').get_json() == ["broken.mtp"]
+
+    aas_entries = client.get('/aas?details=1&sort=-capability_count').get_json()
+    assert [(entry["name"], entry["capability_count"]) for entry in aas_entries] == [("cell.xml", 3), ("robot.xml", 0)]
+    assert client.get(f'/aas?aas_id={aas_entries[0]["aas_ids"][0]}').get_json() == ["cell.xml"]
+
+    assert client.get('/mtp?sort=color').status_code == 400
+    assert client.get('/mtp?limit=-1').status_code == 400
+
+    assert client.delete('/mtp/a_hc30.aml').status_code == 200
+    (mtp_root / "broken.mtp").unlink()
+    refresh_catalogue_in_background(client, '/mtp', mtp_root)
+    assert client.get('/mtp').get_json() == ["b_hc30.aml", "plant.mtp"]
+    assert described == []
+
+
+def test_listings_answer_from_the_catalogue_while_new_files_are_described_in_the_background(client, app, monkeypatch):
+    import shutil
+    import time
+    from server import describe_pea_file
+
+    mtp_root = Path(app.config["MTP_UPLOAD_ROOT"])
+    release = threading.Event()
+    describing_threads = []
+
+    def describe_slowly(mtp_path):
+        describing_threads.append(threading.current_thread())
+        release.wait(10)
+        return describe_pea_file(mtp_path)
+
+    monkeypatch.setattr("server.describe_pea_file", describe_slowly)
+    shutil.copy(BUNDLED_HC30_MTP, mtp_root / "dropped.aml")
+
+    deadline = time.monotonic() + 10
+    while "dropped.aml" not in client.get('/mtp').get_json():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    [entry] = client.get('/mtp?name=dropped&details=1').get_json()
+    assert entry["parse_status"] == "pending" and entry["pea_name"] is None
+    assert client.get('/mtp?status=pending').get_json() == ["dropped.aml"]
+    assert describing_threads and threading.current_thread() not in describing_threads
+
+    release.set()
+    BlobStore(mtp_root).wait_for_refresh()
+    [entry] = client.get('/mtp?name=dropped&details=1').get_json()
+    assert entry["parse_status"] == "ok" and entry["pea_name"]
+
+
+def refresh_catalogue_in_background(client, listing_url, directory):
+    """Lets a listing start the background refresh of directory's catalogue and waits for it."""
+    client.get(listing_url)
+    BlobStore(directory).wait_for_refresh()
+
+
 def test_collision_adds_date_prefix(client, app):
     ontology_root = Path(app.config["ONTOLOGY_UPLOAD_ROOT"])
     write_ontology(ontology_root / "processes" / "duplicate.owl", PROCESS_RDFXML)
@@ -805,3 +1009,996 @@ def test_create_master_recipe_includes_transitions_links_and_pretty_print(client
     assert '<b2mml:Condition>Step 001:Heat Step is Completed</b2mml:Condition>' in xml_text
     assert '<b2mml:Description>Imported condition</b2mml:Description>' in xml_text
     assert '<b2mml:ID>ProcHeat</b2mml:ID>' in xml_text
+
+
+def test_validation_cache_reuses_verdict_for_equivalent_documents(client):
+    from RecipeAPI import validation_cache
+    validation_cache.clear()
+
+    first = client.get('/grecipe/validate', query_string={'xml_string': EMPTY_GENERAL_RECIPE_XML})
+    # Same document with a different declaration and whitespace outside the root canonicalizes identically.
+    equivalent_xml = EMPTY_GENERAL_RECIPE_XML.split("?>", 1)[1].strip()
+    second = client.get('/grecipe/validate', query_string={'xml_string': equivalent_xml})
+    repeated = client.get('/grecipe/validate', query_string={'xml_string': equivalent_xml})
+
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert repeated.status_code == 200
+
+    stats = client.get('/validate/cache').get_json()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 2
+    # The canonical form's verdict, and that of each document's raw bytes.
+    assert stats["size"] == 3
+
+
+def test_validation_errors_name_the_lines_of_the_validated_document(monkeypatch):
+    from lxml import etree
+    from RecipeAPI import RECIPE_SCHEMAS, validate, validation_cache
+    validation_cache.clear()
+
+    invalid_xml = EMPTY_GENERAL_RECIPE_XML.replace("</", "<Bogus/></", 1)
+    # Canonicalizes like invalid_xml, but the invalid element is on the second line instead of the third.
+    equivalent_xml = invalid_xml.split("?>", 1)[1].strip()
+
+    invalid_verdict = validate(invalid_xml, RECIPE_SCHEMAS[0])
+    assert not invalid_verdict[0] and invalid_verdict[1].endswith("line 3")
+    equivalent_verdict = validate(equivalent_xml, RECIPE_SCHEMAS[0])
+    assert not equivalent_verdict[0] and equivalent_verdict[1].endswith("line 2")
+    assert validation_cache.stats()["size"] == 2
+
+    # Resubmitted bytes get their own error back from the cache, without being parsed again.
+    def fail_to_parse(*args, **kwargs):
+        raise AssertionError("parsed a cached document")
+
+    monkeypatch.setattr(etree, "fromstring", fail_to_parse)
+    assert validate(invalid_xml, RECIPE_SCHEMAS[0]) == invalid_verdict
+    assert validate(equivalent_xml, RECIPE_SCHEMAS[0]) == equivalent_verdict
+    assert validation_cache.stats()["hits"] == 2
+
+
+def test_validation_cache_is_bounded():
+    from RecipeAPI import ValidationResultCache
+
+    cache = ValidationResultCache(max_entries=2)
+    for index in range(3):
+        cache.put((f"hash-{index}", "schema.xsd", 0), (True, ""))
+
+    assert cache.get(("hash-0", "schema.xsd", 0)) is None
+    assert cache.get(("hash-2", "schema.xsd", 0)) == (True, "")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_mtp_instance_stores_param_elems_sparsely():
+    from MtpApi import Instance, PARAM_ELEM_TYPES, instance_to_dict
+
+    inst = Instance(name="HC30_T001", id="inst-1")
+    inst.setParamElem("V", "ns=3;s=HC30.T001.V", "21.5")
+
+    assert not hasattr(inst, "__dict__")
+    param_elem = instance_to_dict(inst)["paramElem"]
+    assert list(param_elem) == list(PARAM_ELEM_TYPES)
+    assert param_elem["V"] == {"Type": "REAL", "ID": "ns=3;s=HC30.T001.V", "Default": "21.5"}
+    assert param_elem["WQC"] == {"Type": "BYTE", "ID": None, "Default": None}
+    assert inst.getParamId("Ctrl") is None
+
+
+def test_external_interface_index_keeps_first_interface_per_id():
+    import xml.etree.ElementTree as ET
+    from MtpApi import NAMESPACE, build_external_interface_index
+
+    root = ET.fromstring(
+        f'<CAEXFile xmlns="{NAMESPACE[1:-1]}">'
+        '<ExternalInterface ID="a"><Attribute Name="Identifier"><Value>ns=1;s=A</Value></Attribute></ExternalInterface>'
+        '<InternalElement><ExternalInterface ID="a"><Attribute Name="Identifier"><Value>ns=1;s=Other</Value></Attribute></ExternalInterface></InternalElement>'
+        '<ExternalInterface ID="b"/>'
+        '</CAEXFile>'
+    )
+
+    index = build_external_interface_index(root)
+    assert index["a"] == "ns=1;s=A"
+    assert index["b"] is None
+
+
+BUNDLED_HC30_MTP = Path(__file__).resolve().parent / "upload" / "mtp" / "2025-11-05-HC30.aml"
+
+
+def test_parse_mtp_batch_combines_results(client, app):
+    import shutil
+    import server
+    mtp_root = Path(app.config["MTP_UPLOAD_ROOT"])
+    shutil.copy(BUNDLED_HC30_MTP, mtp_root / "hc30_a.aml")
+    shutil.copy(BUNDLED_HC30_MTP, mtp_root / "hc30_b.aml")
+    (mtp_root / "broken.aml").write_text("<CAEXFile", encoding="utf-8")
+    app.config["MTP_PARSE_WORKERS"] = 2
+
+    response = client.post('/mtp/parse-batch', json={"files": "*"})
+
+    assert response.status_code == 200
+    payload = response.get_json()
+    assert [entry["filename"] for entry in payload["peas"]] == ["hc30_a.aml", "hc30_b.aml", "plant.mtp"]
+    assert payload["peas"][0]["pea"] == payload["peas"][1]["pea"]
+    assert [error["filename"] for error in payload["errors"]] == ["broken.aml"]
+    # the request threads may hold locks, so the pool must not fork the server process
+    assert server.get_mtp_parse_context().get_start_method() in ("forkserver", "spawn")
+
+
+def test_parse_mtp_batch_streams_ndjson(client, app):
+    import json
+    import shutil
+    mtp_root = Path(app.config["MTP_UPLOAD_ROOT"])
+    shutil.copy(BUNDLED_HC30_MTP, mtp_root / "hc30.aml")
+
+    response = client.post('/mtp/parse-batch?stream=1', json={"files": ["hc30.aml", "missing.aml"]})
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert {"filename": "missing.aml", "error": "File not found"} in lines
+    assert any(line["filename"] == "hc30.aml" and "pea" in line for line in lines)
+
+
+def test_parse_mtp_batch_requires_file_list(client):
+    response = client.post('/mtp/parse-batch', json={})
+    assert response.status_code == 400
+
+
+def test_mtp_upload_writes_snapshot_used_by_parse_endpoints(client, app, monkeypatch):
+    from MtpApi import parse_mtp_aml, pea_to_dict
+    from mtpSnapshot import get_snapshot_path
+
+    response = client.post(
+        '/mtp',
+        data={'file': (io.BytesIO(BUNDLED_HC30_MTP.read_bytes()), 'hc30.aml')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+    mtp_path = Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml"
+    snapshot_path = get_snapshot_path(mtp_path)
+    assert snapshot_path.is_file()
+
+    def fail_parse(content):
+        raise AssertionError("stored MTP was parsed from XML again")
+
+    monkeypatch.setattr("mtpSnapshot.parse_mtp_aml", fail_parse)
+    parsed = client.get('/mtp/hc30.aml/parse')
+    equipment = client.get('/mtp/hc30.aml/equipment-info')
+
+    assert parsed.status_code == 200
+    assert equipment.status_code == 200
+    assert parsed.get_json() == pea_to_dict(parse_mtp_aml(BUNDLED_HC30_MTP.read_bytes()))
+
+    assert client.delete('/mtp/hc30.aml').status_code == 200
+    assert not snapshot_path.exists()
+
+
+def test_uploads_are_spooled_into_the_store_hashed_once_and_size_limited(client, app, monkeypatch):
+    import hashlib
+
+    def fail_hash(path):
+        raise AssertionError(f"{path} was hashed after it was received")
+
+    monkeypatch.setattr("blobStore.hash_file", fail_hash)
+    content = BUNDLED_HC30_MTP.read_bytes()
+    response = client.post('/mtp', data={'file': (io.BytesIO(content), 'hc30.aml')}, content_type='multipart/form-data')
+    assert response.status_code == 200
+
+    store = BlobStore(app.config["MTP_UPLOAD_ROOT"])
+    assert store.lookup("hc30.aml") == hashlib.sha256(content).hexdigest()
+    assert not list(store.root.glob("*.part"))
+    assert store.catalogue.is_described(store.lookup("hc30.aml"))
+
+    app.config["UPLOAD_MAX_CONTENT_LENGTHS"]["upload_mtp"] = 1024
+    response = client.post('/mtp', data={'file': (io.BytesIO(content), 'big.aml')}, content_type='multipart/form-data')
+    assert response.status_code == 413
+    assert "1024 bytes" in response.get_json()["error"]
+    assert not (Path(app.config["MTP_UPLOAD_ROOT"]) / "big.aml").exists()
+    assert not list(store.root.glob("*.part"))
+
+    parsed = client.post('/parse-mtp', data={'file': (io.BytesIO(content), 'hc30.aml')}, content_type='multipart/form-data')
+    assert parsed.status_code == 200
+    assert parsed.get_json()["name"] == client.get('/mtp/hc30.aml/parse').get_json()["name"]
+
+
+def test_mtp_and_aas_parsers_accept_paths_files_and_memory_maps(tmp_path):
+    from AasAPI import get_aas_ids, parse_aas_equipment_info
+    from AASxmlCapabilityParser import parse_capabilities_robust_from_bytes
+    from benchmarks.workloads import generate_aas_v3_xml
+    from MtpApi import parse_mtp_aml, pea_to_dict
+    from xmlInput import mapped_file
+
+    aas_path = tmp_path / "cell.xml"
+    aas_path.write_bytes(generate_aas_v3_xml(capabilities=4, name="Cell"))
+    expected_pea = pea_to_dict(parse_mtp_aml(BUNDLED_HC30_MTP.read_bytes()))
+    expected_capabilities = parse_capabilities_robust_from_bytes(aas_path.read_bytes())
+
+    assert pea_to_dict(parse_mtp_aml(BUNDLED_HC30_MTP)) == expected_pea
+    assert pea_to_dict(parse_mtp_aml(str(BUNDLED_HC30_MTP))) == expected_pea
+    with open(BUNDLED_HC30_MTP, "rb") as f:
+        assert pea_to_dict(parse_mtp_aml(f)) == expected_pea
+    with mapped_file(BUNDLED_HC30_MTP) as mapped:
+        assert pea_to_dict(parse_mtp_aml(mapped)) == expected_pea
+        # parsing must neither move nor keep hold of the map
+        assert pea_to_dict(parse_mtp_aml(mapped)) == expected_pea
+
+    assert parse_capabilities_robust_from_bytes(aas_path) == expected_capabilities
+    with mapped_file(aas_path) as mapped:
+        assert parse_capabilities_robust_from_bytes(mapped) == expected_capabilities
+        assert get_aas_ids(mapped) == ["https://example.com/aas/Cell"]
+        assert parse_aas_equipment_info(mapped) == parse_aas_equipment_info(aas_path)
+
+
+def test_aas_and_mtp_parsers_accept_xml_text():
+    from AasAPI import get_aasx_id, get_all_aas_capabilities
+    from benchmarks.workloads import generate_aas_v2_xml
+    from MtpApi import parse_mtp_aml, pea_to_dict
+
+    v2 = generate_aas_v2_xml(3)
+    text = "\ufeff" + v2.decode("utf-8")
+    assert get_aasx_id(text) == get_aasx_id(v2)
+    assert len(get_aasx_id(text)) == 1
+    assert get_all_aas_capabilities(text) == get_all_aas_capabilities(v2)
+    # like ET.fromstring, the declared encoding of text is ignored
+    declared = '<?xml version="1.0" encoding="ISO-8859-1"?>' + v2.decode("utf-8").split("?>", 1)[-1]
+    assert get_aasx_id(declared) == get_aasx_id(v2)
+
+    content = BUNDLED_HC30_MTP.read_bytes()
+    assert pea_to_dict(parse_mtp_aml(content.decode("utf-8"))) == pea_to_dict(parse_mtp_aml(content))
+
+
+
+def wait_for_job(client, location, timeout=30):
+    import time
+
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(location).get_json()
+        if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def test_async_requests_run_as_background_jobs_with_the_same_response(client):
+    import shutil
+
+    shutil.copy(BUNDLED_HC30_MTP, Path(client.application.config["MTP_UPLOAD_ROOT"]) / "hc30.aml")
+    expected = client.get('/mtp/hc30.aml/parse?format=normalized').get_json()
+
+    submitted = client.get('/mtp/hc30.aml/parse?format=normalized&async=1')
+    assert submitted.status_code == 202
+    location = submitted.headers["Location"]
+    assert location == f"/jobs/{submitted.get_json()['id']}"
+    job = wait_for_job(client, location)
+    assert job["status"] == "done"
+    assert job["response_status"] == 200
+    result = client.get(f"{location}/result")
+    assert result.status_code == 200
+    assert result.get_json() == expected
+
+    content = BUNDLED_HC30_MTP.read_bytes()
+    submitted = client.post(
+        '/parse-mtp?async=1', data={'file': (io.BytesIO(content), 'hc30.aml')}, content_type='multipart/form-data'
+    )
+    assert submitted.status_code == 202
+    location = submitted.headers["Location"]
+    assert wait_for_job(client, location)["status"] == "done"
+    assert client.get(f"{location}/result").get_json()["name"] == expected["name"]
+
+    assert {job["id"] for job in client.get('/jobs').get_json()} >= {submitted.get_json()["id"]}
+    assert client.get('/mtp?async=1').status_code == 400
+    assert client.get('/jobs/unknown').status_code == 404
+
+
+def test_job_queue_orders_bounds_cancels_and_expires_jobs(tmp_path):
+    import math
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    from jobQueue import JobQueue, JobQueueFull, JobStore, StoredResponse
+
+    pool = ProcessPoolExecutor(max_workers=1)
+    queue = JobQueue(
+        JobStore(tmp_path / "jobs.sqlite3"), max_size=3, thread_workers=1, result_ttl=60, process_pool=lambda: pool
+    )
+
+    def status(job):
+        return queue.get(job.id).status
+
+    release = threading.Event()
+    order = []
+    cleaned = []
+    blocker = queue.submit(release.wait, 10, name="blocker")
+    while status(blocker) != "running":
+        time.sleep(0.01)
+    low = queue.submit(order.append, "low", priority=20)
+    high = queue.submit(order.append, "high", priority=5, cleanup=lambda: cleaned.append("high"))
+    doomed = queue.submit(order.append, "doomed", cleanup=lambda: cleaned.append("doomed"))
+    with pytest.raises(JobQueueFull):
+        queue.submit(order.append, "overflow")
+
+    assert queue.cancel(doomed.id).status == "cancelled"
+    assert cleaned == ["doomed"]
+    running = queue.cancel(blocker.id)
+    assert running.status == "running" and running.cancel_requested
+    release.set()
+    while status(low) != "done":
+        time.sleep(0.01)
+    assert status(high) == "done"
+    assert order == ["high", "low"]
+    assert cleaned == ["doomed", "high"]
+    assert status(blocker) == "cancelled" and queue.response(blocker.id) is None
+
+    answered = queue.submit(lambda: StoredResponse(201, [("Content-Type", "text/plain")], b"made"))
+    while status(answered) != "done":
+        time.sleep(0.01)
+    assert queue.get(answered.id).response_status == 201
+    assert queue.response(answered.id) == StoredResponse(201, [("Content-Type", "text/plain")], b"made")
+
+    failed = queue.submit(math.factorial, -1)
+    while status(failed) in ("queued", "running"):
+        time.sleep(0.01)
+    assert "negative" in queue.get(failed.id).error
+    assert queue.get(failed.id).status == "failed"
+
+    elsewhere = queue.submit(StoredResponse, 200, [], b"parsed elsewhere", executor="process")
+    crashed = queue.submit(math.factorial, -1, executor="process")
+    while status(crashed) in ("queued", "running"):
+        time.sleep(0.01)
+    assert queue.response(elsewhere.id).body == b"parsed elsewhere"
+    assert queue.get(crashed.id).status == "failed" and "negative" in queue.get(crashed.id).error
+
+    queue.result_ttl = 0
+    assert queue.get(failed.id) is None
+    assert queue.jobs() == []
+    queue.shutdown()
+    pool.shutdown()
+
+
+def test_background_jobs_run_cpu_bound_work_on_the_process_pool(app, client):
+    import os
+    from benchmarks.workloads import generate_aas_v2_xml
+    from jobQueue import JOB_ENVIRON_KEY, run_in_job_process
+
+    with app.test_request_context('/'):
+        assert run_in_job_process(os.getpid) == os.getpid()
+        assert "mtp_parse_pool" not in app.extensions
+    with app.test_request_context('/', environ_overrides={JOB_ENVIRON_KEY: True}):
+        assert run_in_job_process(os.getpid) != os.getpid()
+    assert "mtp_parse_pool" in app.extensions
+
+    content = generate_aas_v2_xml(2)
+    inline = client.post('/AAS/validate', data={'file': (io.BytesIO(content), 'cell.xml')}, content_type='multipart/form-data')
+    submitted = client.post(
+        '/AAS/validate?async=1', data={'file': (io.BytesIO(content), 'cell.xml')}, content_type='multipart/form-data'
+    )
+    assert submitted.status_code == 202
+    assert wait_for_job(client, submitted.headers["Location"])["status"] == "done"
+    result = client.get(f'{submitted.headers["Location"]}/result')
+    assert (result.status_code, result.get_data()) == (inline.status_code, inline.get_data())
+
+
+def test_jobs_are_shared_by_the_worker_processes_of_the_production_server(app, client):
+    import shutil
+    import time
+    from jobQueue import JobStore, JOB_STORE_NAME
+
+    # A second app on the same job root stands in for another worker process behind the same socket.
+    other = create_app()
+    other.config.update(app.config)
+    other_client = other.test_client()
+    shutil.copy(BUNDLED_HC30_MTP, Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml")
+
+    submitted = client.get('/mtp/hc30.aml/parse?format=normalized&async=1')
+    assert submitted.status_code == 202
+    location = submitted.headers["Location"]
+    job = wait_for_job(other_client, location)
+    assert job["status"] == "done"
+    assert other_client.get(f"{location}/result").get_json() == client.get(f"{location}/result").get_json()
+    assert submitted.get_json()["id"] in {job["id"] for job in other_client.get('/jobs').get_json()}
+
+    release = threading.Event()
+    queue = app.extensions["job_queue"]
+    blockers = [queue.submit(release.wait, 10) for _ in range(app.config["JOB_THREAD_WORKERS"])]
+    queued = queue.submit(release.wait, 10)
+    while any(other_client.get(f"/jobs/{job.id}").get_json()["status"] != "running" for job in blockers):
+        time.sleep(0.01)
+    assert other_client.delete(f"/jobs/{queued.id}").get_json()["status"] == "cancelled"
+    release.set()
+    while any(client.get(f"/jobs/{job.id}").get_json()["status"] == "running" for job in blockers):
+        time.sleep(0.01)
+    assert client.get(f"/jobs/{queued.id}").get_json()["status"] == "cancelled"
+
+    # Unfinished jobs of a worker process that exited are failed instead of staying queued forever.
+    store = JobStore(Path(app.config["JOB_ROOT"]) / JOB_STORE_NAME)
+    orphan = store.add("orphan", "GET /mtp/hc30.aml/parse", 10)
+    with store._transaction() as db:
+        db.execute("UPDATE jobs SET owner_pid = ? WHERE id = ?", (2 ** 22 + 1, orphan.id))
+    job = other_client.get('/jobs/orphan').get_json()
+    assert job["status"] == "failed" and "exited" in job["error"]
+
+
+def test_admission_control_rejects_overload_with_retry_after_and_reports_waits(app, client):
+    import time
+    from admissionControl import AdmissionGate, AdmissionRejected
+
+    gate = AdmissionGate("parse", concurrency=1, queue=1, timeout=5, retry_after=7)
+    app.extensions["admission_gates"]["parse"] = gate
+    assert gate.acquire() == 0.0
+    waits = []
+    waiter = threading.Thread(target=lambda: waits.append(gate.acquire()))
+    waiter.start()
+    while gate.waiting == 0:
+        time.sleep(0.01)
+
+    response = client.get('/mtp/plant.mtp/parse')
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert client.get('/mtp').status_code == 200
+    submitted = client.get('/mtp/plant.mtp/parse?async=1')
+    assert submitted.status_code == 202
+
+    gate.release()
+    waiter.join(5)
+    assert waits and waits[0] > 0
+    gate.release()
+    assert wait_for_job(client, submitted.headers["Location"])["response_status"] == 200
+    assert client.get('/mtp/plant.mtp/parse').status_code == 200
+    assert gate.active == 0
+
+    gate.timeout = 0.01
+    gate.acquire()
+    with pytest.raises(AdmissionRejected):
+        gate.acquire()
+    gate.release()
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'recipe_editor_admission_rejected_total{class="parse",reason="queue_full"}' in metrics
+    assert 'recipe_editor_admission_wait_seconds_count{class="parse",outcome="admitted"}' in metrics
+    assert 'recipe_editor_admission_active{class="parse"} 0' in metrics
+
+def test_mtp_snapshot_is_rebuilt_when_source_changes(app, monkeypatch):
+    import os
+    import shutil
+    import mtpSnapshot
+    from blobStore import hash_file
+    from mtpSnapshot import get_snapshot_path, load_or_parse_pea, load_pea_snapshot
+
+    mtp_path = Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml"
+    shutil.copy(BUNDLED_HC30_MTP, mtp_path)
+    pea = load_or_parse_pea(mtp_path)
+    old_snapshot_path = get_snapshot_path(mtp_path)
+    assert load_pea_snapshot(mtp_path) is not None
+
+    stat = mtp_path.stat()
+    os.utime(mtp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    # The stale catalogue entry has the source hashed again, but only once per load.
+    hashed = []
+    monkeypatch.setattr("blobStore.hash_file", lambda path: hashed.append(path) or hash_file(path))
+    mtpSnapshot._loaded_peas.clear()
+    assert load_or_parse_pea(mtp_path).name == pea.name
+    assert hashed == [mtp_path]
+    assert load_pea_snapshot(mtp_path) is not None
+    monkeypatch.undo()
+
+    with open(mtp_path, "ab") as f:
+        f.write(b"<!-- edited -->")
+
+    assert load_pea_snapshot(mtp_path) is None
+    assert not old_snapshot_path.exists()
+    assert load_or_parse_pea(mtp_path).name == pea.name
+    assert load_pea_snapshot(mtp_path) is not None
+
+
+def test_corrupt_mtp_snapshot_falls_back_to_parsing(app):
+    import shutil
+    import mtpSnapshot
+    from MtpApi import parse_mtp_aml, pea_to_dict
+    from mtpSnapshot import get_snapshot_path, load_or_parse_pea, load_pea_snapshot
+
+    mtp_path = Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml"
+    shutil.copy(BUNDLED_HC30_MTP, mtp_path)
+    expected = pea_to_dict(parse_mtp_aml(mtp_path))
+    load_or_parse_pea(mtp_path)
+    snapshot_path = get_snapshot_path(mtp_path)
+    intact = snapshot_path.read_bytes()
+
+    # The last column references sensor/actuator instances; point one past the end of the instances.
+    snapshot_path.write_bytes(intact[:-4] + (0xFFFFFFF0).to_bytes(4, "little"))
+    assert load_pea_snapshot(mtp_path) is None
+    snapshot_path.write_bytes(intact[:len(intact) // 2])
+    assert load_pea_snapshot(mtp_path) is None
+
+    mtpSnapshot._loaded_peas.clear()
+    assert pea_to_dict(load_or_parse_pea(mtp_path)) == expected
+    assert snapshot_path.read_bytes() == intact
+
+
+def test_identical_mtp_uploads_share_one_object_and_snapshot(client, app):
+    import hashlib
+    from mtpSnapshot import get_snapshot_path
+
+    content = BUNDLED_HC30_MTP.read_bytes()
+    for name in ("first.aml", "second.aml"):
+        response = client.post(
+            '/mtp',
+            data={'file': (io.BytesIO(content), name)},
+            content_type='multipart/form-data'
+        )
+        assert response.status_code == 200
+
+    upload_dir = Path(app.config["MTP_UPLOAD_ROOT"])
+    store = BlobStore(upload_dir)
+    digest = store.lookup("first.aml")
+    assert digest == store.lookup("second.aml") == hashlib.sha256(content).hexdigest()
+    assert get_snapshot_path(upload_dir / "first.aml") == get_snapshot_path(upload_dir / "second.aml")
+    assert (upload_dir / "first.aml").samefile(store.object_path(digest))
+    assert {"first.aml", "second.aml"} <= set(client.get('/mtp').get_json())
+    assert ".blobs" not in client.get('/mtp').get_json()
+
+    snapshot_path = get_snapshot_path(upload_dir / "first.aml")
+    assert client.delete('/mtp/first.aml').status_code == 200
+    assert store.object_path(digest).is_file()
+    assert snapshot_path.is_file()
+    assert client.get('/mtp/second.aml/parse').status_code == 200
+
+    assert client.delete('/mtp/second.aml').status_code == 200
+    assert not store.object_path(digest).exists()
+    assert not snapshot_path.exists()
+
+
+def test_names_sharing_an_object_stay_independent(tmp_path):
+    import os
+    import stat
+
+    store = BlobStore(tmp_path)
+    first, digest = store.save(io.BytesIO(b"same content"), "first.txt")
+    second, _ = store.save(io.BytesIO(b"same content"), "second.txt")
+    assert first.samefile(second)
+    for path in (first, second, store.object_path(digest)):
+        assert stat.S_IMODE(path.stat().st_mode) == 0o444
+    if os.geteuid() != 0:
+        with pytest.raises(PermissionError):
+            first.open("r+b")
+
+    store.save(io.BytesIO(b"new content"), "first.txt")
+    assert first.read_bytes() == b"new content"
+    assert second.read_bytes() == b"same content"
+    assert not first.samefile(second)
+    assert store.lookup("second.txt") == digest
+    assert store.object_path(digest).read_bytes() == b"same content"
+
+
+def test_process_index_matches_first_procedure_in_service_order():
+    from MtpApi import Instance, Pea, Procedure, Service, get_filtered_equipment_info
+
+    pea = Pea()
+    tank = Instance("HC10_Tank", "tank")
+    setpoint = Instance("Param_Setpoint", "sp")
+    heater = Instance("Heating_Heater", "heater")
+    pea.insts = [tank, setpoint, heater]
+    dosing = Service()
+    dosing.name = "Dosing"
+    dosing.procs = [Procedure("Dosing_Fast", "p1"), Procedure("Mixing", "p2")]
+    dosing.procs[0].params = [setpoint]
+    heating = Service()
+    heating.name = "Heating"
+    heating.procs = [Procedure("mixing", "p3")]
+    pea.servs = [dosing, heating]
+
+    index = pea.getProcessIndex()
+    assert index.getEntry(index.find("MIXING"))[1].id == "p2"
+    assert index.getEntry(index.find("ing_fa"))[1].id == "p1"
+    assert index.getEntry(index.find("x"))[1].id == "p2"
+    assert index.find("Stirring") is None
+
+    filtered = get_filtered_equipment_info(pea, "Dosing_Fast")
+    assert filtered["target_service"] == "Dosing"
+    assert [inst["id"] for inst in filtered["instances"]] == ["tank", "sp"]
+    assert index.getRelevantPositions(index.find("Dosing_Fast"), ("dosing_fast",)) is index.getRelevantPositions(
+        index.find("Dosing_Fast"), ("dosing_fast",)
+    )
+
+
+def test_parse_stored_mtp_classifies_every_instance(client, app):
+    import shutil
+    shutil.copy(BUNDLED_HC30_MTP, Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml")
+
+    plain = client.get('/mtp/hc30.aml/parse').get_json()
+    tagged = client.get('/mtp/hc30.aml/parse?categories=1').get_json()
+
+    assert "category" not in plain["equipment_info"]["instances"][0]
+    categories = {inst["name"]: inst["category"] for inst in tagged["equipment_info"]["instances"]}
+    assert categories["PeaInformationLabel"] is None
+    assert categories["Stirring"] == "service-owned"
+    assert categories["HC30T13_DB.MTPAnaMon_Instance"] == "sensor"
+    assert categories["HC30Y17_DB.MTPMonAnaVlv_Instance"] == "actuator"
+    sensact_names = [sa["name"] for sa in tagged["sensacts"]]
+    assert {name for name, category in categories.items() if category in ("sensor", "actuator")} <= set(sensact_names)
+    # sensacts keep their former membership: the service matched by RefID only and the correctly spelled label.
+    assert {"Stirring", "PeaInformationLabel"} <= set(sensact_names)
+    assert [sa["name"] for sa in plain["sensacts"]] == sensact_names
+
+
+def test_classify_instances_boundary_cases():
+    from MtpApi import Instance, Pea, Procedure, Service, classify_instances
+
+    pea = Pea()
+    valve = Instance("Valve", "valve")
+    valve.setParamElem("Pos", "valve.Pos", "0.0")
+    valve.setParamElem("V", "valve.V", "0.0")
+    drive = Instance("Drive", "drive")
+    drive.setParamElem("WQC", "drive.WQC", "255")
+    bare = Instance("Bare", "bare")
+    indicator = Instance("Indicator", "indicator")
+    indicator.setParamElem("VOut", "indicator.VOut", "0.0")
+    setpoint = Instance("Setpoint", "setpoint")
+    setpoint.setParamElem("V", "setpoint.V", "0.0")
+    control = Instance("Dosing", "dosing-control")
+    control.refid = "dosing"
+    label = Instance("PeaInforamtionLabel", "label")
+    pea.insts = [valve, drive, bare, indicator, setpoint, control, label]
+    proc = Procedure("Dosing_Fast", "dosing-fast")
+    proc.params = [setpoint]
+    serv = Service()
+    serv.id = "dosing"
+    serv.procs = [proc]
+    pea.procs = [proc]
+    pea.servs = [serv]
+
+    classify_instances(pea)
+    # Matching both rows: the first, Pos/Ctrl, wins.
+    assert valve.category == "actuator"
+    # Only param elems outside the table: the fallback. No linked interface at all: no category.
+    assert drive.category == "actuator"
+    assert bare.category is None
+    assert indicator.category == "sensor"
+    assert setpoint.category == "parameter"
+    assert control.category == "service-owned"
+    assert label.category is None
+    assert pea.sensacts == [valve, drive, bare, indicator, control]
+
+
+def test_parse_stored_mtp_serves_cached_json_with_etag(client, app):
+    import os
+    import shutil
+    mtp_path = Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml"
+    shutil.copy(BUNDLED_HC30_MTP, mtp_path)
+
+    first = client.get('/mtp/hc30.aml/parse')
+    etag = first.headers["ETag"]
+    assert first.status_code == 200
+    assert not first.headers["ETag"].startswith("W/")
+
+    revalidated = client.get('/mtp/hc30.aml/parse', headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b""
+    assert app.extensions["response_cache"].stats()["hits"] == 1
+
+    stat = mtp_path.stat()
+    os.utime(mtp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    touched = client.get('/mtp/hc30.aml/parse', headers={"If-None-Match": etag})
+    # the cache is keyed by content, so only the hash is checked again
+    assert app.extensions["response_cache"].stats()["misses"] == 1
+    assert touched.status_code == 304
+
+    with open(mtp_path, "ab") as f:
+        f.write(b"<!-- edited -->")
+    edited = client.get('/mtp/hc30.aml/parse', headers={"If-None-Match": etag})
+    # the file is parsed again, but the ETag only depends on the response body
+    assert app.extensions["response_cache"].stats()["misses"] == 2
+    assert edited.status_code == 304
+
+
+def test_parse_stored_mtp_projects_requested_fields(client, app):
+    import shutil
+    shutil.copy(BUNDLED_HC30_MTP, Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml")
+
+    response = client.get('/mtp/hc30.aml/parse?fields=name,equipment_info.instances.name,missing')
+    payload = response.get_json()
+
+    assert set(payload) == {"name", "equipment_info"}
+    assert set(payload["equipment_info"]) == {"instances"}
+    assert all(set(inst) == {"name"} for inst in payload["equipment_info"]["instances"])
+    assert response.headers["ETag"] != client.get('/mtp/hc30.aml/parse').headers["ETag"]
+
+
+def test_parse_stored_mtp_normalized_format_references_by_id(client, app):
+    import shutil
+    shutil.copy(BUNDLED_HC30_MTP, Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml")
+
+    full = client.get('/mtp/hc30.aml/parse').get_json()
+    normalized = client.get('/mtp/hc30.aml/parse?format=normalized').get_json()
+
+    assert normalized["format"] == "normalized"
+    assert normalized["instanceIds"] == [inst["id"] for inst in full["equipment_info"]["instances"]]
+    assert normalized["procedureIds"] == [proc["id"] for proc in full["procs"]]
+    for serv in full["servs"]:
+        normalized_serv = normalized["services"][serv["id"]]
+        assert normalized_serv["procs"] == [proc["id"] for proc in serv["procs"]]
+        for proc in serv["procs"]:
+            assert normalized["procedures"][proc["id"]]["params"] == [param["id"] for param in proc["params"]]
+    for inst in full["equipment_info"]["instances"]:
+        for name, elem in normalized["instances"][inst["id"]]["paramElem"].items():
+            assert inst["paramElem"][name] == dict(elem, Type=normalized["paramElemTypes"][name])
+
+    assert client.get('/mtp/hc30.aml/parse?format=xml').status_code == 400
+
+
+def test_large_json_responses_are_gzip_compressed_once(client, app, monkeypatch):
+    import gzip
+    import shutil
+    import responseCompression
+    shutil.copy(BUNDLED_HC30_MTP, Path(app.config["MTP_UPLOAD_ROOT"]) / "hc30.aml")
+    plain = client.get('/mtp/hc30.aml/parse')
+
+    compressed = client.get('/mtp/hc30.aml/parse', headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+    monkeypatch.setitem(responseCompression.CODINGS, "gzip", lambda data: pytest.fail("recompressed"))
+    again = client.get('/mtp/hc30.aml/parse', headers={"Accept-Encoding": "gzip"})
+    assert again.get_data() == compressed.get_data()
+
+    revalidated = client.get(
+        '/mtp/hc30.aml/parse',
+        headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["ETag"]},
+    )
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == compressed.headers["ETag"]
+
+
+def test_small_responses_are_not_compressed(client):
+    response = client.get('/mtp', headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.get_json() == ["plant.mtp"]
+
+
+def test_hashed_static_assets_are_immutable_and_precompressed(client):
+    import gzip
+    css = Path(__file__).resolve().parent / "static" / "assets" / "index-0b93cbb2.css"
+
+    response = client.get('/assets/index-0b93cbb2.css', headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.mimetype == "text/css"
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "immutable" in response.headers["Cache-Control"]
+    assert gzip.decompress(response.get_data()) == css.read_bytes()
+
+    revalidated = client.get(
+        '/assets/index-0b93cbb2.css',
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]},
+    )
+    assert revalidated.status_code == 304
+
+    favicon = client.get('/favicon.ico')
+    assert "immutable" not in favicon.headers["Cache-Control"]
+    assert client.get('/assets/missing-00000000.js').status_code == 404
+
+
+def test_static_assets_prefer_sidecar_files(app, client, tmp_path):
+    from staticAssets import StaticAssetTable
+    static_root = tmp_path / "static"
+    (static_root / "assets").mkdir(parents=True)
+    script = static_root / "assets" / "app-1234abcd.js"
+    script.write_text("console.log('recipe');" * 100, encoding="utf-8")
+    (static_root / "assets" / "app-1234abcd.js.gz").write_bytes(b"sidecar")
+    app.extensions["static_assets"] = StaticAssetTable(static_root)
+
+    response = client.get('/assets/app-1234abcd.js', headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.get_data() == b"sidecar"
+    assert client.get('/assets/app-1234abcd.js').get_data() == script.read_bytes()
+
+
+def test_importing_server_defers_heavy_subsystem_dependencies():
+    import subprocess
+    deferred = ["owlready2", "rdflib", "basyx", "aas_compliance_tool", "flasgger", "waitress", "lxml"]
+    script = (
+        "import sys, server; server.create_app(); "
+        f"print(','.join(name for name in {deferred!r} if name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=Path(__file__).parent, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_production_server_splits_parse_workers_between_processes(tmp_path):
+    import os
+    import productionServer
+    from admissionControl import default_admission_limits, divide_admission_limits
+    from benchmarks.loadtest import data_config
+    args = productionServer.parse_args(
+        ["--workers", "2", "--threads", "6", "--channel-timeout", "30", "--no-warm-up", "--no-apidocs"]
+    )
+
+    app = productionServer.build_app(args, data_config(tmp_path))
+
+    # platforms without fork fall back to a single worker
+    assert args.workers == (2 if hasattr(os, "fork") else 1)
+    assert app.config["MTP_PARSE_WORKERS"] == max(1, (os.cpu_count() or 1) // args.workers)
+    expected_limits = default_admission_limits()
+    for name, gate in app.extensions["admission_gates"].items():
+        assert gate.concurrency == max(1, expected_limits[name]["concurrency"] // args.workers)
+        assert gate.queue == max(1, expected_limits[name]["queue"] // args.workers)
+        assert gate.timeout == expected_limits[name]["timeout"]
+    assert app.config["ADMISSION_LIMITS"]["convert"]["concurrency"] == app.extensions["admission_gates"]["convert"].concurrency
+    assert divide_admission_limits(default_admission_limits(cpu_count=8), 3)["parse"] == {
+        "concurrency": 2, "queue": 5, "timeout": 10, "retry_after": 2,
+    }
+    assert divide_admission_limits(default_admission_limits(cpu_count=2), 4)["convert"]["concurrency"] == 1
+    assert productionServer.waitress_options(args) == {
+        "threads": 6,
+        "connection_limit": 100,
+        "channel_timeout": 30,
+        "max_request_body_size": 1024 * 1024 * 1024,
+        "backlog": 1024,
+    }
+
+
+def test_metrics_endpoint_reports_routes_subsystems_and_caches(client):
+    from serverMetrics import HTTP_REQUEST_DURATION, SUBSYSTEM_DURATION
+    route_labels = ("GET", "/grecipe/validate")
+    requests_before = HTTP_REQUEST_DURATION.get_count(route_labels)
+    validations_before = SUBSYSTEM_DURATION.get_count(("xsd_validation", "ok"))
+
+    client.get('/grecipe/validate', query_string={'xml_string': EMPTY_GENERAL_RECIPE_XML})
+    client.get('/does-not-exist.txt')
+    response = client.get('/metrics')
+    body = response.get_data(as_text=True)
+
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert HTTP_REQUEST_DURATION.get_count(route_labels) == requests_before + 1
+    assert SUBSYSTEM_DURATION.get_count(("xsd_validation", "ok")) == validations_before + 1
+    assert '# TYPE recipe_editor_http_request_duration_seconds histogram' in body
+    assert 'recipe_editor_http_request_duration_seconds_bucket{method="GET",route="/grecipe/validate",le="+Inf"}' in body
+    assert 'recipe_editor_http_requests_total{method="GET",route="/<path:filename>",status="404"}' in body
+    assert 'recipe_editor_subsystem_duration_seconds_count{subsystem="xsd_validation",outcome="ok"}' in body
+    assert 'recipe_editor_http_requests_in_flight 1' in body
+    for cache in ("response", "validation", "pea_memory", "pea_snapshot"):
+        assert f'recipe_editor_cache_hit_ratio{{cache="{cache}"}}' in body
+
+
+def test_metrics_can_be_disabled(app, client):
+    app.config["METRICS_ENABLED"] = False
+
+    assert client.get('/metrics').status_code == 404
+
+
+def test_profiled_request_stores_pstats_file(app, client):
+    app.config.update(PROFILING_ENABLED=True, PROFILING_TOKEN="secret")
+
+    unauthorized = client.get('/grecipe/validate', query_string={'xml_string': EMPTY_GENERAL_RECIPE_XML, 'profile': '1'})
+    profiled = client.get(
+        '/grecipe/validate',
+        query_string={'xml_string': EMPTY_GENERAL_RECIPE_XML, 'profile': '1'},
+        headers={"X-Profile-Token": "secret"},
+    )
+    profile_name = profiled.headers["X-Profile-Id"]
+    listing = client.get('/profiles', headers={"X-Profile-Token": "secret"})
+    summary = client.get(
+        f'/profiles/{profile_name}', query_string={'format': 'text'}, headers={"X-Profile-Token": "secret"}
+    )
+
+    assert "X-Profile-Id" not in unauthorized.headers
+    assert profiled.get_data(as_text=True) == 'valid!'
+    assert [profile["name"] for profile in listing.get_json()] == [profile_name]
+    assert "validate" in summary.get_data(as_text=True)
+    assert client.get('/profiles').status_code == 404
+
+
+def test_profiling_is_disabled_by_default(client):
+    response = client.get('/mtp', query_string={'profile': '1'}, headers={"X-Profile": "1"})
+
+    assert "X-Profile-Id" not in response.headers
+    assert client.get('/profiles').status_code == 404
+
+
+def test_benchmark_workloads_scale_mtp_and_build_valid_recipes():
+    from benchmarks.workloads import build_general_recipe_xml, build_material_information_xml, scale_mtp_aml
+    from MtpApi import PEA_INFORMATION_LABELS, parse_mtp_aml
+    from RecipeAPI import RECIPE_SCHEMAS, validate
+    original = parse_mtp_aml(BUNDLED_HC30_MTP.read_bytes())
+
+    scaled = parse_mtp_aml(scale_mtp_aml(BUNDLED_HC30_MTP.read_bytes(), 3))
+
+    def process_instances(pea):
+        return [inst for inst in pea.insts if inst.name not in PEA_INFORMATION_LABELS]
+
+    assert len(scaled.insts) - len(process_instances(scaled)) == len(original.insts) - len(process_instances(original)) == 1
+    assert len(process_instances(scaled)) == 3 * len(process_instances(original))
+    assert len(scaled.servs) == 3 * len(original.servs)
+    assert len({inst.id for inst in scaled.insts}) == len(scaled.insts)
+    assert sum(len(inst.getPopulatedParamElems()) for inst in process_instances(scaled)) == 3 * sum(
+        len(inst.getPopulatedParamElems()) for inst in process_instances(original)
+    )
+    # cloned services and procedures refer to the cloned instances
+    assert len(scaled.sensacts) - 1 == 3 * (len(original.sensacts) - 1)
+    assert sum(len(proc.params) for proc in scaled.procs) == 3 * sum(len(proc.params) for proc in original.procs)
+    assert validate(build_general_recipe_xml(5), RECIPE_SCHEMAS[0]) == (True, "")
+    assert validate(build_material_information_xml(5), RECIPE_SCHEMAS[1]) == (True, "")
+
+
+def test_workload_generators_produce_parseable_mtp_aas_and_recipes():
+    from AasAPI import get_aasx_id, get_all_aas_capabilities
+    from AASxmlCapabilityParser import parse_capabilities_robust_from_bytes
+    from benchmarks.workloads import (
+        build_master_recipe_xml,
+        generate_aas_v2_xml,
+        generate_aas_v3_xml,
+        generate_mtp_aml,
+    )
+    from MtpApi import parse_mtp_aml
+    from RecipeAPI import RECIPE_SCHEMAS, validate
+
+    content = generate_mtp_aml(
+        instances=60, services=3, procedures_per_service=2, parameters_per_procedure=2, interfaces_per_instance=5
+    )
+    pea = parse_mtp_aml(content)
+
+    assert generate_mtp_aml(60, 3) == generate_mtp_aml(60, 3)
+    assert len(pea.insts) == 60
+    assert len(pea.servs) == 3
+    assert len(pea.procs) == 6
+    assert all(len(proc.params) == 2 for proc in pea.procs)
+    assert [proc.procId for proc in pea.servs[0].procs] == [1, 2]
+    categories = [inst.category for inst in pea.insts]
+    assert categories.count("parameter") == 12
+    assert categories.count("service-owned") == 9
+    assert categories.count("sensor") + categories.count("actuator") == len(pea.sensacts) == 39
+    assert categories.count("sensor") > 0 and categories.count("actuator") > 0
+    assert all(len(inst.getPopulatedParamElems()) >= 5 for inst in pea.insts)
+    assert pea.url == "opc.tcp://localhost:4840"
+
+    v2 = generate_aas_v2_xml(7)
+    assert len(get_aasx_id(v2)) == 1
+    assert len(get_all_aas_capabilities(v2)) == 7
+    capabilities = parse_capabilities_robust_from_bytes(generate_aas_v3_xml(4, properties_per_capability=3))
+    assert len(capabilities) == 4
+    assert all(len(capability["properties"]) == 3 for capability in capabilities)
+    assert validate(build_master_recipe_xml(5), RECIPE_SCHEMAS[2]) == (True, "")
+
+
+def test_load_test_drives_every_scenario_against_waitress(app, tmp_path):
+    from waitress import create_server
+    from benchmarks.loadtest import build_report, build_scenarios, data_config, discover_files, prepare_data_dir, prime, run_load
+    from benchmarks.workloads import generate_mtp_aml
+
+    mtp_upload = generate_mtp_aml(100, services=2)
+    prepare_data_dir(tmp_path / "data", mtp_upload)
+    app.config.update(data_config(tmp_path / "data"))
+    refresh_upload_catalogues(app)
+    server = create_server(app, host="127.0.0.1", port=0, threads=4, clear_untrusted_proxy_headers=True)
+
+    def serve():
+        try:
+            server.run()
+        except OSError:
+            # server.close() below closes the socket under the loop
+            pass
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.effective_port}"
+    try:
+        ontologies, mtp_files = discover_files(base_url)
+        scenarios = build_scenarios(ontologies, mtp_files, mtp_upload, operations=5)
+        assert prime(base_url, scenarios) == []
+        results, elapsed = run_load(base_url, scenarios, concurrency=2, duration=0.5)
+    finally:
+        server.close()
+        thread.join(5)
+
+    report = build_report(results, elapsed)
+    assert "generated.aml" in mtp_files
+    assert {scenario.name for scenario in scenarios} == set(report["scenarios"]) >= {
+        "ontology_class_tree", "mtp_parse", "mtp_equipment_info", "master_recipe_create", "master_recipe_validate",
+        "capability_matching",
+    }
+    assert report["total"]["requests"] > 0
+    assert report["total"]["errors"] == 0
+    assert report["total"]["p50_ms"] <= report["total"]["p95_ms"] <= report["total"]["p99_ms"] <= report["total"]["max_ms"]
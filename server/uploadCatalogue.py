@@ -0,0 +1,315 @@
+"""SQLite catalogue of an upload directory's files and of what is known about their contents.
+
+The catalogue is kept in the directory's blob store (``.blobs/catalogue.sqlite3``):
+
+    files     file name -> content hash, size and mtime of the file, upload time
+    contents  content hash -> signature of the stored object, and the metadata
+              extracted from the content: parse status, PEA name and OPC UA URL,
+              AAS ids, capability count and ontology class count
+    state     the directory mtime at the last scan
+
+Metadata belongs to a content, so a file uploaded under several names is described
+once. The listing endpoints filter, sort and page on these tables instead of opening
+the files. Files are described when they are uploaded; files that got into the
+directory otherwise are scanned and described at startup or by a background refresh
+(see BlobStore.refresh_in_background) and are listed as "pending" until then.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+import json
+import sqlite3
+import threading
+
+from flask import jsonify
+
+
+METADATA_FIELDS = ("parse_status", "parse_error", "pea_name", "opcua_url", "aas_ids", "capability_count", "class_count")
+SORT_FIELDS = ("name", "size", "uploaded", "parse_status", "pea_name", "opcua_url", "capability_count", "class_count")
+# Listing query parameters that select files by equality on a catalogue column.
+PENDING_STATUS = "pending"
+PARSE_STATUS_COLUMN = f"coalesce(c.parse_status, '{PENDING_STATUS}')"
+EQUALITY_FILTERS = {"status": PARSE_STATUS_COLUMN, "pea_name": "c.pea_name", "opcua_url": "c.opcua_url", "hash": "f.hash"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    uploaded TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_by_hash ON files (hash);
+CREATE TABLE IF NOT EXISTS contents (
+    hash TEXT PRIMARY KEY,
+    object_size INTEGER,
+    object_mtime_ns INTEGER,
+    parse_status TEXT,
+    parse_error TEXT,
+    pea_name TEXT,
+    opcua_url TEXT,
+    aas_ids TEXT,
+    capability_count INTEGER,
+    class_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+# Catalogue files whose schema has been created by this process.
+_initialised = set()
+_initialised_lock = threading.Lock()
+
+
+def utc_timestamp(seconds: float | None = None) -> str:
+    if seconds is None:
+        return datetime.now(timezone.utc).isoformat()
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+@dataclass(frozen=True)
+class ListingQuery:
+    """Filter, order and page of a file listing, parsed from the request's query string."""
+
+    name: str | None = None
+    equals: tuple = ()
+    aas_id: str | None = None
+    sort: str = "name"
+    descending: bool = False
+    limit: int | None = None
+    offset: int = 0
+    details: bool = False
+
+
+def parse_listing_args(args, default_equals: dict | None = None) -> ListingQuery:
+    """Raises ValueError for unknown sort fields and malformed pagination parameters.
+
+    default_equals holds filters that apply unless the request sets the parameter itself.
+    """
+    sort = args.get("sort", "name")
+    descending = sort.startswith("-")
+    sort = sort.lstrip("-")
+    if sort not in SORT_FIELDS:
+        raise ValueError(f"Cannot sort by '{sort}', expected one of {', '.join(SORT_FIELDS)}")
+
+    equals = dict(default_equals or {})
+    equals.update((param, args[param]) for param in EQUALITY_FILTERS if param in args)
+    return ListingQuery(
+        name=args.get("name") or None,
+        equals=tuple(sorted(equals.items())),
+        aas_id=args.get("aas_id") or None,
+        sort=sort,
+        descending=descending,
+        limit=_non_negative_int(args, "limit"),
+        offset=_non_negative_int(args, "offset") or 0,
+        details=args.get("details", "").lower() in ("1", "true"),
+    )
+
+
+def _non_negative_int(args, param: str) -> int | None:
+    if param not in args:
+        return None
+    try:
+        value = int(args[param])
+    except ValueError:
+        raise ValueError(f"'{param}' must be a non-negative integer") from None
+    if value < 0:
+        raise ValueError(f"'{param}' must be a non-negative integer")
+    return value
+
+
+def listing_response(entries: list[dict], total: int, query: ListingQuery):
+    """File names, or their catalogue entries with ?details=1, and the total in X-Total-Count."""
+    response = jsonify(entries if query.details else [entry["name"] for entry in entries])
+    response.headers["X-Total-Count"] = str(total)
+    return response
+
+
+class UploadCatalogue:
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @contextmanager
+    def transaction(self, write: bool = True):
+        """A transaction on the catalogue; write transactions take the write lock up front."""
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            yield CatalogueTransaction(connection)
+            connection.execute("COMMIT")
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute("ROLLBACK")
+            raise
+        finally:
+            connection.close()
+
+    def file(self, name: str) -> dict | None:
+        with self.transaction(write=False) as tx:
+            return tx.file(name)
+
+    def names(self) -> set[str]:
+        with self.transaction(write=False) as tx:
+            return {row["name"] for row in tx.db.execute("SELECT name FROM files")}
+
+    def undescribed(self, suffixes: tuple) -> list[str]:
+        """Names of files whose content has not been described yet."""
+        suffix_clause, params = _suffix_clause(suffixes)
+        with self.transaction(write=False) as tx:
+            rows = tx.db.execute(
+                "SELECT f.name FROM files f JOIN contents c ON c.hash = f.hash"
+                f" WHERE c.parse_status IS NULL AND {suffix_clause} ORDER BY f.name",
+                params,
+            )
+            return [row["name"] for row in rows]
+
+    def is_described(self, digest: str) -> bool:
+        with self.transaction(write=False) as tx:
+            row = tx.db.execute("SELECT parse_status FROM contents WHERE hash = ?", (digest,)).fetchone()
+        return row is not None and row["parse_status"] is not None
+
+    def describe(self, digest: str, metadata: dict) -> None:
+        unknown = set(metadata) - set(METADATA_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown catalogue fields: {', '.join(sorted(unknown))}")
+        values = {field: metadata.get(field) for field in METADATA_FIELDS}
+        if values["aas_ids"] is not None:
+            values["aas_ids"] = json.dumps(values["aas_ids"])
+        with self.transaction() as tx:
+            tx.db.execute("INSERT OR IGNORE INTO contents (hash) VALUES (?)", (digest,))
+            tx.db.execute(
+                f"UPDATE contents SET {', '.join(f'{field} = ?' for field in METADATA_FIELDS)} WHERE hash = ?",
+                (*values.values(), digest),
+            )
+
+    def get_state(self, key: str):
+        with self.transaction(write=False) as tx:
+            row = tx.db.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row is not None else None
+
+    def set_state(self, key: str, value) -> None:
+        with self.transaction() as tx:
+            tx.db.execute("INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)", (key, value))
+
+    def query(self, suffixes: tuple, query: ListingQuery) -> tuple[list[dict], int]:
+        """The catalogue entries selected by query, and how many there are without paging."""
+        suffix_clause, params = _suffix_clause(suffixes)
+        conditions = [suffix_clause]
+        if query.name:
+            conditions.append("instr(lower(f.name), lower(?)) > 0")
+            params.append(query.name)
+        for param, value in query.equals:
+            conditions.append(f"{EQUALITY_FILTERS[param]} = ?")
+            params.append(value)
+        if query.aas_id:
+            conditions.append("EXISTS (SELECT 1 FROM json_each(c.aas_ids) WHERE json_each.value = ?)")
+            params.append(query.aas_id)
+        where = " AND ".join(conditions)
+        sort_column = {
+            "name": "f.name", "size": "f.size", "uploaded": "f.uploaded", "parse_status": PARSE_STATUS_COLUMN,
+        }.get(query.sort, f"c.{query.sort}")
+        direction = "DESC" if query.descending else "ASC"
+
+        with self.transaction(write=False) as tx:
+            total = tx.db.execute(
+                f"SELECT COUNT(*) FROM files f JOIN contents c ON c.hash = f.hash WHERE {where}", params
+            ).fetchone()[0]
+            rows = tx.db.execute(
+                "SELECT f.name, f.size, f.hash, f.uploaded, "
+                + ", ".join(
+                    f"{PARSE_STATUS_COLUMN} AS parse_status" if field == "parse_status" else f"c.{field}"
+                    for field in METADATA_FIELDS
+                )
+                + f" FROM files f JOIN contents c ON c.hash = f.hash WHERE {where}"
+                + f" ORDER BY {sort_column} {direction}, f.name {direction} LIMIT ? OFFSET ?",
+                (*params, -1 if query.limit is None else query.limit, query.offset),
+            ).fetchall()
+
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            if entry["aas_ids"] is not None:
+                entry["aas_ids"] = json.loads(entry["aas_ids"])
+            entries.append(entry)
+        return entries, total
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        key = str(self.path)
+        fresh = key not in _initialised or not self.path.exists()
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+        if fresh:
+            with _initialised_lock:
+                connection.execute("PRAGMA journal_mode=WAL")
+                connection.executescript(SCHEMA)
+                _initialised.add(key)
+        return connection
+
+
+class CatalogueTransaction:
+    """The bookkeeping of the blob store, within one catalogue transaction."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def file(self, name: str) -> dict | None:
+        row = self.db.execute("SELECT hash, size, mtime_ns, uploaded FROM files WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def put_file(self, name: str, digest: str, stat_result, uploaded: str | None = None) -> None:
+        """Records name's content; without an upload time, a known name keeps its own."""
+        self.db.execute("INSERT OR IGNORE INTO contents (hash) VALUES (?)", (digest,))
+        self.db.execute(
+            "INSERT INTO files (name, hash, size, mtime_ns, uploaded) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (name) DO UPDATE SET hash = excluded.hash, size = excluded.size,"
+            " mtime_ns = excluded.mtime_ns, uploaded = coalesce(?, files.uploaded)",
+            (
+                name,
+                digest,
+                stat_result.st_size,
+                stat_result.st_mtime_ns,
+                uploaded or utc_timestamp(stat_result.st_mtime),
+                uploaded,
+            ),
+        )
+
+    def remove_file(self, name: str) -> str | None:
+        """Removes name, returning the hash it referred to."""
+        row = self.db.execute("SELECT hash FROM files WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("DELETE FROM files WHERE name = ?", (name,))
+        return row["hash"]
+
+    def object_signature(self, digest: str) -> dict | None:
+        row = self.db.execute(
+            "SELECT object_size, object_mtime_ns FROM contents WHERE hash = ?", (digest,)
+        ).fetchone()
+        if row is None or row["object_size"] is None:
+            return None
+        return {"size": row["object_size"], "mtime_ns": row["object_mtime_ns"]}
+
+    def set_object_signature(self, digest: str, stat_result) -> None:
+        self.db.execute("INSERT OR IGNORE INTO contents (hash) VALUES (?)", (digest,))
+        self.db.execute(
+            "UPDATE contents SET object_size = ?, object_mtime_ns = ? WHERE hash = ?",
+            (stat_result.st_size, stat_result.st_mtime_ns, digest),
+        )
+
+    def is_referenced(self, digest: str) -> bool:
+        return self.db.execute("SELECT 1 FROM files WHERE hash = ? LIMIT 1", (digest,)).fetchone() is not None
+
+    def remove_content(self, digest: str) -> None:
+        self.db.execute("DELETE FROM contents WHERE hash = ?", (digest,))
+
+
+def _suffix_clause(suffixes: tuple) -> tuple[str, list]:
+    if not suffixes:
+        return "1", []
+    return "(" + " OR ".join("f.name GLOB ?" for _ in suffixes) + ")", [f"*{suffix}" for suffix in suffixes]
@@ -0,0 +1,71 @@
+"""XML input for the MTP and AAS parsers without copies of the document in memory.
+
+The parsers accept a path, the XML text itself, an open binary file or a bytes-like
+object, including a memory map. Paths and files are parsed incrementally as they are read; bytes-like
+objects are fed to the parser in chunks straight from their buffer, so a mapped
+multi-hundred-MB AML export is never copied into Python bytes.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+import io
+import mmap
+import os
+import xml.etree.ElementTree as ET
+
+
+# What may precede the first tag of XML text: a byte order mark and whitespace.
+XML_TEXT_LEADING_CHARACTERS = "\ufeff \t\r\n"
+
+
+class BufferReader(io.RawIOBase):
+    """A read-only binary file over a bytes-like object, reading from its buffer without copying it."""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), len(self._view) - self._position)
+        target[:count] = self._view[self._position:self._position + count]
+        self._position += count
+        return count
+
+    def close(self) -> None:
+        # The view has to go before a memory map it was taken from can be closed.
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def parse_xml(source, parse=ET.parse, fromstring=ET.fromstring) -> ET.ElementTree:
+    """Parses an XML document from a path, an open binary file or a bytes-like object.
+
+    A str starting with "<" is the document itself and is parsed like ET.fromstring,
+    which ignores the encoding in its XML declaration; any other str is a path.
+    parse and fromstring are the ElementTree-compatible functions to use, e.g. defusedxml's.
+    """
+    if isinstance(source, str):
+        if source.lstrip(XML_TEXT_LEADING_CHARACTERS).startswith("<"):
+            return ET.ElementTree(fromstring(source))
+        return parse(source)
+    # Checked first, as memory maps have a read() method, too, which would move their position.
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        with BufferReader(source) as reader:
+            return parse(reader)
+    return parse(source)
+
+
+@contextmanager
+def mapped_file(path):
+    """The content of a file as a read-only memory map (empty bytes for an empty file)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files cannot be mapped.
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped